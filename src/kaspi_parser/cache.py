@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+from src.kaspi_parser import config, transactions
+
+
+def _default(value):
+    if isinstance(value, transactions.TransactionTable):
+        return value.to_columns()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(statement_data: dict) -> bytes:
+    """
+    Serialises a parsed statement for the cache. A columnar "Details" is written
+    as a JSON object of its columns.
+
+    Args:
+        statement_data (dict): The parsed statement.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return orjson.dumps(
+        statement_data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+def loads(value: bytes) -> dict:
+    """
+    Deserialises a parsed statement written by `dumps`, rebuilding a columnar
+    "Details" as a `transactions.TransactionTable`.
+
+    Args:
+        value (bytes): The UTF-8 encoded JSON.
+
+    Returns:
+        dict: The parsed statement.
+    """
+    statement_data = orjson.loads(value)
+    if isinstance(statement_data.get("Details"), dict):
+        statement_data["Details"] = transactions.TransactionTable.from_columns(
+            statement_data["Details"]
+        )
+    return statement_data
+
+
+class ParseCache:
+    """
+    A two-tier cache of parsed statements keyed by the content hash of the PDF
+    and the parser version.
+
+    The first tier is a bounded in-process LRU. The optional second tier is a
+    local SQLite file shared by every worker on the host. Both tiers evict by
+    total size and expire entries after a TTL. Values are stored as JSON, so
+    every hit returns a fresh copy of the parsed statement, and a cache file
+    written by another process can only ever yield data, never run code.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = config.PARSE_CACHE_MAX_BYTES,
+        ttl: float = config.PARSE_CACHE_TTL,
+        db_path: str = config.PARSE_CACHE_DB_PATH,
+        disk_max_bytes: int = config.PARSE_CACHE_DISK_MAX_BYTES,
+    ) -> None:
+        """
+        Initializes a new instance of the ParseCache class.
+
+        Args:
+            max_bytes (int): The maximum total size of the in-process tier. 0 disables it.
+            ttl (float): The number of seconds an entry stays valid.
+            db_path (str): The path of the SQLite file of the on-disk tier. Empty disables it.
+            disk_max_bytes (int): The maximum total size of the on-disk tier.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.db_path = db_path
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.db = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.db.commit()
+
+    @staticmethod
+    def make_key(digest: str, parser_version: str) -> str:
+        """
+        Builds a cache key.
+
+        Args:
+            digest (str): The SHA-256 hex digest of the PDF content.
+            parser_version (str): The version of the parser that produced the value.
+
+        Returns:
+            str: The cache key.
+        """
+        return f"{digest}:{parser_version}"
+
+    def get(self, key: str):
+        """
+        Looks up a parsed statement, first in memory and then on disk.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict | None: The parsed statement, or None on a miss.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return loads(value)
+                self._discard(key)
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, created_at FROM parse_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    try:
+                        statement_data = loads(row[0])
+                    except orjson.JSONDecodeError:
+                        # Pickled by an earlier version of the cache.
+                        self.db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                        self.db.commit()
+                    else:
+                        self.db.execute(
+                            "UPDATE parse_cache SET accessed_at = ? WHERE key = ?",
+                            (now, key),
+                        )
+                        self.db.commit()
+                        self._store(key, row[0], row[1])
+                        self.stats["disk_hits"] += 1
+                        return statement_data
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, statement_data: dict) -> None:
+        """
+        Stores a parsed statement in both tiers.
+
+        Args:
+            key (str): The cache key.
+            statement_data (dict): The parsed statement.
+        """
+        value = dumps(statement_data)
+        now = time.time()
+        with self.lock:
+            self._store(key, value, now)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now, now),
+                )
+                self._evict_disk(now)
+                self.db.commit()
+
+    def clear(self) -> None:
+        """
+        Removes every entry from both tiers.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            if self.db is not None:
+                self.db.execute("DELETE FROM parse_cache")
+                self.db.commit()
+
+    def _store(self, key: str, value: bytes, created_at: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        self._discard(key)
+        self.entries[key] = (value, created_at)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._discard(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def _discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def _evict_disk(self, now: float) -> None:
+        self.db.execute(
+            "DELETE FROM parse_cache WHERE created_at < ?", (now - self.ttl,)
+        )
+        total = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM parse_cache"
+        ).fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        for key, size in self.db.execute(
+            "SELECT key, size FROM parse_cache ORDER BY accessed_at"
+        ).fetchall():
+            self.db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+            self.stats["evictions"] += 1
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
@@ -1,16 +1,87 @@
 import os
 
 from dotenv import find_dotenv, load_dotenv
-import logging
 
 env_file = os.getenv("ENV", f"{os.path.dirname(__file__)}/../../.env.development")
 env_file_ = find_dotenv(env_file)
 load_dotenv(env_file_)
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+DB_INSERT_CHUNK_SIZE = int(os.getenv("DB_INSERT_CHUNK_SIZE", "5000"))
+# Whether every worker creates the schema when it starts. Off by default, so
+# that workers do not race on the DDL; run `python -m src.kaspi_parser.schema`
+# once instead.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "30000"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
 
-logging.basicConfig(
-    filename="app.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "process")
+EXECUTOR_MAX_WORKERS = int(os.getenv("EXECUTOR_MAX_WORKERS", str(os.cpu_count() or 1)))
+EXECUTOR_MAX_TASKS_PER_CHILD = int(os.getenv("EXECUTOR_MAX_TASKS_PER_CHILD", "100"))
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "false").lower() == "true"
+
+UPLOAD_SPOOL_MAX_SIZE = int(os.getenv("UPLOAD_SPOOL_MAX_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+HEADER_SCAN_LIMIT = int(os.getenv("HEADER_SCAN_LIMIT", "16384"))
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "text")
+# Statements of at least this many pages are parsed as page ranges in parallel
+# by the process pool; 0 disables it. A range has at least
+# PARALLEL_PARSE_MIN_RANGE_PAGES pages.
+PARALLEL_PARSE_MIN_PAGES = int(os.getenv("PARALLEL_PARSE_MIN_PAGES", "100"))
+PARALLEL_PARSE_MIN_RANGE_PAGES = int(os.getenv("PARALLEL_PARSE_MIN_RANGE_PAGES", "25"))
+
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PARSE_CACHE_TTL = float(os.getenv("PARSE_CACHE_TTL", str(24 * 60 * 60)))
+PARSE_CACHE_DB_PATH = os.getenv("PARSE_CACHE_DB_PATH", "")
+PARSE_CACHE_DISK_MAX_BYTES = int(
+    os.getenv("PARSE_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024))
 )
+
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+WRITE_BEHIND_PUT_TIMEOUT = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", "5.0"))
+# A JSON lines file the statements that could not be written are appended to;
+# empty disables it.
+WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", "")
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "assets/output")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", "500"))
+STREAM_SINK_MAX_BATCHES = int(os.getenv("STREAM_SINK_MAX_BATCHES", "4"))
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", str(EXECUTOR_MAX_WORKERS)))
+JOBS_QUEUE_SIZE = int(os.getenv("JOBS_QUEUE_SIZE", "100"))
+JOBS_TIMEOUT = float(os.getenv("JOBS_TIMEOUT", "300"))
+JOBS_RESULT_MAX_MEMORY = int(os.getenv("JOBS_RESULT_MAX_MEMORY", str(1024 * 1024)))
+JOBS_SPILL_DIR = os.getenv("JOBS_SPILL_DIR", "")
+JOBS_RETENTION = float(os.getenv("JOBS_RETENTION", str(60 * 60)))
+JOBS_RETRY_AFTER = int(os.getenv("JOBS_RETRY_AFTER", "5"))
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+INGEST_PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "5.0"))
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_TOP_COUNTERPARTIES = int(os.getenv("ROLLUP_TOP_COUNTERPARTIES", "20"))
+ROLLUP_RECONCILE_TOLERANCE = float(os.getenv("ROLLUP_RECONCILE_TOLERANCE", "0.01"))
+
+READ_PAGE_SIZE = int(os.getenv("READ_PAGE_SIZE", "100"))
+READ_MAX_PAGE_SIZE = int(os.getenv("READ_MAX_PAGE_SIZE", "1000"))
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
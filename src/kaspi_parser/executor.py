@@ -0,0 +1,154 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import sys
+import threading
+
+from src.kaspi_parser import config, logs, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up() -> int:
+    """
+    Task submitted once per worker so that the pool spawns its processes and
+    imports the parser modules before the first real request arrives. With
+    STARTUP_WARM_UP, it also parses a sample statement to load PyMuPDF and numpy.
+
+    Returns:
+        int: The number of transactions parsed, 0 without STARTUP_WARM_UP.
+    """
+    from src.kaspi_parser import warmup
+
+    return warmup.warm_up() if config.STARTUP_WARM_UP else 0
+
+
+class Executor:
+    """
+    A class to run CPU-bound parsing work outside the event loop.
+
+    Supported backends:
+        - "inline": run the callable directly in the calling thread.
+        - "thread": run the callable in a thread pool.
+        - "process": run the callable in a pre-warmed process pool.
+    """
+
+    backends = ("inline", "thread", "process")
+
+    def __init__(
+        self,
+        backend: str = config.EXECUTOR_BACKEND,
+        max_workers: int = config.EXECUTOR_MAX_WORKERS,
+        max_tasks_per_child: int = config.EXECUTOR_MAX_TASKS_PER_CHILD,
+    ) -> None:
+        """
+        Initializes a new instance of the Executor class.
+
+        Args:
+            backend (str): One of "inline", "thread" or "process".
+            max_workers (int): The number of threads or processes in the pool.
+            max_tasks_per_child (int): The number of tasks after which a worker
+                                       process is replaced. Only honoured by the
+                                       process backend on Python 3.11+.
+
+        Raises:
+            ValueError: If the backend is not supported.
+        """
+        if backend not in self.backends:
+            raise ValueError(
+                f"Unsupported executor backend: {backend}, expected one of {self.backends}"
+            )
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Creates the underlying pool. For the process backend, every worker is
+        started and warmed up before this method returns. The inline and thread
+        backends warm up the calling process instead. Safe to call from several
+        threads at once: only the first call creates the pool.
+        """
+        with self.lock:
+            self.create_pool()
+
+    def create_pool(self) -> None:
+        """
+        Creates and warms up the pool, unless it exists. Called by `start` with
+        the lock held.
+        """
+        if self.pool is not None:
+            return
+        if self.backend != "process":
+            if self.backend == "thread":
+                self.pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers
+                )
+            if config.STARTUP_WARM_UP:
+                _warm_up()
+            return
+
+        kwargs = {
+            "mp_context": multiprocessing.get_context("spawn"),
+            "initializer": logs.setup_worker,
+            "initargs": (logs.worker_queue(),),
+        }
+        if sys.version_info >= (3, 11):
+            kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers, **kwargs
+        )
+        futures = [self.pool.submit(_warm_up) for _ in range(self.max_workers)]
+        concurrent.futures.wait(futures)
+        logger.info("Process pool started with %s workers", self.max_workers)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Shuts down the underlying pool, if any.
+
+        Args:
+            wait (bool): Whether to wait for pending tasks to finish.
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=wait)
+                self.pool = None
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a callable on the configured backend and awaits its result. The
+        pool is started on first use if `start` was not called.
+
+        For the process backend, the callable and its arguments must be picklable.
+        Metrics observed by the callable in a pool are collected there and
+        recorded in the calling context, so they reach /metrics and the
+        Server-Timing header of the current request.
+
+        Args:
+            func (callable): The callable to run.
+            *args: Positional arguments for the callable.
+            **kwargs: Keyword arguments for the callable.
+
+        Returns:
+            Any: The value returned by the callable.
+        """
+        if self.backend == "inline":
+            return func(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        if self.pool is None:
+            # Started by the app lifespan; if it did not run, start the pool off
+            # the event loop, since warming up the workers blocks.
+            await loop.run_in_executor(None, self.start)
+        if not config.METRICS_ENABLED:
+            return await loop.run_in_executor(
+                self.pool, functools.partial(func, *args, **kwargs)
+            )
+        result, observations = await loop.run_in_executor(
+            self.pool, functools.partial(metrics.collect, func, *args, **kwargs)
+        )
+        metrics.replay(observations)
+        return result
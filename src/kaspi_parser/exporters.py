@@ -0,0 +1,292 @@
+import csv
+import importlib.util
+import io
+import itertools
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+
+from src.kaspi_parser import config, transactions
+
+COLUMNS = [
+    "FROM_DATE",
+    "TO_DATE",
+    "STATEMENT_LANGUAGE",
+    "FULL_NAME",
+    "FINANSIAL_INSTITUTION",
+    "AMOUNT",
+    "DETAILS",
+    "OPERATION_DATE",
+    "TRANSACTION_TYPE",
+    "INSERT_DATE",
+    "CARD_NUMBER",
+    "ST_CREATION_DATE",
+    "ST_MODIFIED_DATE",
+    "ST_SUBJECT",
+    "ST_AUTHOR",
+    "ST_TITLE",
+    "ST_PRODUCER",
+]
+
+
+class Exporter(ABC):
+    """
+    A base class for exporters that write the transactions of a parsed statement
+    row by row, so memory use does not depend on the number of transactions.
+
+    Subclasses implement `write_rows`. Every exporter can write to a file path,
+    return in-memory bytes or produce chunks for a streamed HTTP response, and
+    can write the rows of several statements to one file. Only `CsvExporter`
+    sends chunks while the rows are written; the other formats are complete
+    only at the end, so their `stream` builds the whole file first.
+    """
+
+    extension = ""
+    media_type = "application/octet-stream"
+    # The optional module the exporter needs, checked by `get_exporter`.
+    requires = None
+
+    @staticmethod
+    def rows(statement_data: dict) -> Iterator[list]:
+        """
+        Yields one export row per transaction. "Details" may be a lazy iterator.
+
+        Args:
+            statement_data (dict): A parsed statement as returned by
+                                   `BankStatement.parse_statement`.
+
+        Yields:
+            list: The values of a row, in the order of `COLUMNS`.
+        """
+        rows = transactions.iter_rows(statement_data["Details"])
+        for operation_date, amount, transaction_type, detail in rows:
+            yield [
+                statement_data["fromDate"],
+                statement_data["toDate"],
+                "RUS",
+                statement_data["FIO"],
+                statement_data["financialInstitutionName"],
+                amount,
+                detail,
+                operation_date,
+                transaction_type,
+                None,
+                statement_data["cardNumber"],
+                None,
+                None,
+                None,
+                None,
+                None,
+                None,
+            ]
+
+    @abstractmethod
+    def write_rows(self, rows: Iterable[list], file) -> None:
+        """
+        Writes export rows to a binary file object.
+
+        Args:
+            rows (Iterable[list]): The rows, as yielded by `rows`.
+            file: A writable binary file object.
+        """
+
+    def write(self, statement_data: dict, file) -> None:
+        """
+        Writes the export to a binary file object.
+
+        Args:
+            statement_data (dict): A parsed statement.
+            file: A writable binary file object.
+        """
+        self.write_rows(self.rows(statement_data), file)
+
+    def write_many(self, statements: Iterable[dict], file) -> None:
+        """
+        Writes the transactions of several statements to one binary file object.
+
+        Args:
+            statements (Iterable[dict]): The parsed statements.
+            file: A writable binary file object.
+        """
+        self.write_rows(itertools.chain.from_iterable(map(self.rows, statements)), file)
+
+    def to_file(self, statement_data: dict, file_path: str) -> None:
+        """
+        Writes the export to a file, creating its directory if needed.
+
+        Args:
+            statement_data (dict): A parsed statement.
+            file_path (str): The path of the file to write.
+        """
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        with open(file_path, "wb") as file:
+            self.write(statement_data, file)
+
+    def to_bytes(self, statement_data: dict) -> bytes:
+        """
+        Returns the export as in-memory bytes.
+
+        Args:
+            statement_data (dict): A parsed statement.
+
+        Returns:
+            bytes: The content of the exported file.
+        """
+        with io.BytesIO() as file:
+            self.write(statement_data, file)
+            return file.getvalue()
+
+    def stream(
+        self, statement_data: dict, chunk_size: int = config.UPLOAD_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        Yields the export in chunks for a streamed HTTP response. The whole file
+        is built first, in a spooled temporary file which moves to disk once it
+        outgrows UPLOAD_SPOOL_MAX_SIZE, so the first chunk is only sent once all
+        rows are written. `CsvExporter` overrides it to send rows as they come.
+
+        Args:
+            statement_data (dict): A parsed statement.
+            chunk_size (int, optional): The size of each chunk in bytes.
+
+        Yields:
+            bytes: The next chunk of the exported file.
+        """
+        with tempfile.SpooledTemporaryFile(
+            max_size=config.UPLOAD_SPOOL_MAX_SIZE
+        ) as file:
+            self.write(statement_data, file)
+            file.seek(0)
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+
+class XlsxExporter(Exporter):
+    """
+    Writes transactions with an openpyxl write-only workbook, which streams rows
+    to the file instead of keeping every cell in memory.
+    """
+
+    extension = "xlsx"
+    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+    def write_rows(self, rows: Iterable[list], file) -> None:
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+        worksheet.append(COLUMNS)
+        for row in rows:
+            worksheet.append(row)
+        workbook.save(file)
+
+
+class CsvExporter(Exporter):
+    """
+    Writes transactions as UTF-8 CSV with a header row. The only format whose
+    `stream` sends chunks while the rows are being written.
+    """
+
+    extension = "csv"
+    media_type = "text/csv"
+
+    def write_rows(self, rows: Iterable[list], file) -> None:
+        text_file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        writer = csv.writer(text_file)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+        text_file.flush()
+        text_file.detach()
+
+    def stream(
+        self, statement_data: dict, chunk_size: int = config.UPLOAD_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        for row in self.rows(statement_data):
+            writer.writerow(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode("utf-8")
+
+
+class ParquetExporter(Exporter):
+    """
+    Writes transactions as Parquet, one row group per `batch_size` rows.
+    Requires the optional `pyarrow` dependency.
+    """
+
+    extension = "parquet"
+    media_type = "application/vnd.apache.parquet"
+    requires = "pyarrow"
+
+    def __init__(self, batch_size: int = config.EXPORT_BATCH_SIZE) -> None:
+        """
+        Initializes a new instance of the ParquetExporter class.
+
+        Args:
+            batch_size (int): The number of rows per row group.
+        """
+        self.batch_size = batch_size
+
+    def write_rows(self, rows: Iterable[list], file) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {
+            "AMOUNT": pa.float64(),
+            "OPERATION_DATE": pa.timestamp("us"),
+            "INSERT_DATE": pa.timestamp("us"),
+        }
+        schema = pa.schema(
+            [(column, types.get(column, pa.string())) for column in COLUMNS]
+        )
+        rows = iter(rows)
+        with pq.ParquetWriter(file, schema) as parquet_writer:
+            while batch := list(itertools.islice(rows, self.batch_size)):
+                columns = zip(*batch)
+                parquet_writer.write_table(
+                    pa.Table.from_arrays(
+                        [
+                            pa.array(column, type=field.type)
+                            for field, column in zip(schema, columns)
+                        ],
+                        schema=schema,
+                    )
+                )
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (XlsxExporter(), CsvExporter(), ParquetExporter())
+}
+
+
+def get_exporter(export_format: str) -> Exporter:
+    """
+    Returns the exporter registered for a format.
+
+    Args:
+        export_format (str): One of "xlsx", "csv" or "parquet".
+
+    Returns:
+        Exporter: The exporter for the format.
+
+    Raises:
+        ValueError: If the format is not supported, or needs an optional
+                    dependency that is not installed.
+    """
+    try:
+        exporter = EXPORTERS[export_format]
+    except KeyError:
+        raise ValueError(f"Unsupported export format: {export_format}") from None
+    if exporter.requires and importlib.util.find_spec(exporter.requires) is None:
+        raise ValueError(
+            f"The {export_format} export format requires {exporter.requires}, "
+            "which is not installed"
+        )
+    return exporter
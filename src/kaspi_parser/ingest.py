@@ -0,0 +1,460 @@
+"""
+Parses directories of archived statement PDFs across all cores and stores them
+in the database or in Parquet/CSV shards.
+
+Usage:
+    python -m src.kaspi_parser.ingest archive/ --output db
+    python -m src.kaspi_parser.ingest archive/ --output parquet --output-dir shards/
+    python -m src.kaspi_parser.ingest --file-list files.txt --manifest manifest.txt
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator
+
+from src.kaspi_parser import config, exporters, logs, models, util
+
+logger = logging.getLogger(__name__)
+
+# Set in every worker process by `init_worker`.
+_bank_statement = None
+_processed = frozenset()
+
+
+def iter_paths(sources: Iterable[str], file_list: str | None = None) -> Iterator[str]:
+    """
+    Yields the PDF files under the given directories, the given files, and the
+    files listed one per line in `file_list`.
+
+    Args:
+        sources (Iterable[str]): Directories, searched recursively, or PDF files.
+        file_list (str, optional): A text file with one PDF path per line.
+
+    Yields:
+        str: The path of a PDF file.
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for directory, _, names in os.walk(source):
+                for name in sorted(names):
+                    if name.lower().endswith(".pdf"):
+                        yield os.path.join(directory, name)
+        else:
+            yield source
+    if file_list:
+        with open(file_list, encoding="utf-8") as file:
+            for line in file:
+                if line := line.strip():
+                    yield line
+
+
+def load_manifest(manifest_path: str | None) -> set[str]:
+    """
+    Reads the SHA-256 digests of the files stored by earlier runs.
+
+    Args:
+        manifest_path (str | None): The manifest file. It may not exist yet.
+
+    Returns:
+        set[str]: The digests of the processed files.
+    """
+    if not manifest_path or not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, encoding="utf-8") as file:
+        return {line.split("\t", 1)[0] for line in file if line.strip()}
+
+
+def init_worker(processed: frozenset, log_records=None) -> None:
+    """
+    Initializes a worker process of the parse pool.
+
+    Args:
+        processed (frozenset): The digests of the files to skip.
+        log_records (multiprocessing.Queue, optional): The queue returned by
+                                                       `logs.worker_queue`.
+    """
+    global _bank_statement, _processed
+    logs.setup_worker(log_records)
+    _bank_statement = util.BankStatement()
+    _processed = processed
+
+
+def parse_file(path: str) -> dict:
+    """
+    Parses one PDF in a worker process. The file is memory-mapped, so hashing
+    and parsing read it without copying it into the Python heap first.
+
+    Args:
+        path (str): The path of the PDF.
+
+    Returns:
+        dict: The path, size, SHA-256 digest, status ("parsed", "skipped" or
+              "failed"), the columnar statement or the error, and the duration.
+    """
+    started = time.perf_counter()
+    result = {"path": path, "size": 0, "digest": None, "statement": None}
+    try:
+        with (
+            open(path, "rb") as file,
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        ):
+            result["size"] = len(mapped)
+            result["digest"] = hashlib.sha256(mapped).hexdigest()
+            if result["digest"] in _processed:
+                result["status"] = "skipped"
+            else:
+                with memoryview(mapped) as view:
+                    statement_data = _bank_statement.parse_statement(
+                        file_bytes=view, columnar=True
+                    )
+                if not statement_data:
+                    raise ValueError("No statement found")
+                result["status"] = "parsed"
+                result["statement"] = statement_data
+    except Exception as error:  # noqa: BLE001
+        # Any failure of one file, whatever the parser raises, is recorded in
+        # the error log instead of stopping the run.
+        result["status"] = "failed"
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+class Progress:
+    """
+    Counts processed files and bytes and logs throughput every `interval` seconds.
+    """
+
+    def __init__(
+        self, total: int, interval: float = config.INGEST_PROGRESS_INTERVAL
+    ) -> None:
+        """
+        Initializes a new instance of the Progress class.
+
+        Args:
+            total (int): The number of files to process.
+            interval (float): The number of seconds between reports.
+        """
+        self.total = total
+        self.interval = interval
+        self.counts = {"parsed": 0, "skipped": 0, "failed": 0, "stored": 0}
+        self.bytes = 0
+        self.started = self.reported = time.perf_counter()
+
+    @property
+    def done(self) -> int:
+        """
+        The number of files parsed, skipped or failed so far.
+        """
+        return self.counts["parsed"] + self.counts["skipped"] + self.counts["failed"]
+
+    def add(self, status: str, size: int = 0) -> None:
+        """
+        Counts a processed file and reports progress if the interval has passed.
+
+        Args:
+            status (str): "parsed", "skipped", "failed" or "stored".
+            size (int, optional): The size of the file in bytes.
+        """
+        self.counts[status] += 1
+        self.bytes += size
+        now = time.perf_counter()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.report()
+
+    def summary(self) -> dict:
+        """
+        Returns the counts and throughput so far.
+
+        Returns:
+            dict: The file counts, elapsed seconds, files per second and MB per second.
+        """
+        elapsed = time.perf_counter() - self.started
+        return {
+            "total": self.total,
+            **self.counts,
+            "seconds": elapsed,
+            "files_per_second": self.done / elapsed if elapsed else 0.0,
+            "mb_per_second": self.bytes / 1024 / 1024 / elapsed if elapsed else 0.0,
+        }
+
+    def report(self) -> None:
+        """
+        Logs one progress line.
+        """
+        summary = self.summary()
+        remaining = self.total - self.done
+        eta = (
+            remaining / summary["files_per_second"]
+            if summary["files_per_second"]
+            else 0.0
+        )
+        logger.info(
+            "%d/%d files, %d stored, %d skipped, %d failed, %.1f files/s, "
+            "%.1f MB/s, ETA %.0f s",
+            self.done,
+            self.total,
+            summary["stored"],
+            summary["skipped"],
+            summary["failed"],
+            summary["files_per_second"],
+            summary["mb_per_second"],
+            eta,
+        )
+
+
+class Ingestor:
+    """
+    A class to store parsed statements in batches and record what was stored.
+
+    With the "db" output, every batch is inserted with `Record.insert_records` in
+    one transaction; if that fails, its statements are retried one by one so a
+    single bad statement does not lose the others. With "parquet" or "csv", every
+    batch is written to its own shard file. Digests are appended to the manifest
+    only after their batch is stored, so an interrupted run is resumed without
+    losing statements, at worst storing the last batch twice.
+    """
+
+    def __init__(
+        self,
+        output: str,
+        output_dir: str,
+        manifest_path: str | None,
+        error_log_path: str | None,
+        progress: Progress,
+    ) -> None:
+        """
+        Initializes a new instance of the Ingestor class.
+
+        Args:
+            output (str): "db", "parquet" or "csv".
+            output_dir (str): The directory of the shard files.
+            manifest_path (str | None): The file digests of stored statements are
+                                        appended to. None disables resuming.
+            error_log_path (str | None): The JSON lines file per-file errors are
+                                         appended to. None logs them only to app.log.
+            progress (Progress): The progress counter.
+        """
+        self.output = output
+        self.output_dir = output_dir
+        self.exporter = None if output == "db" else exporters.get_exporter(output)
+        self.record = util.Record()
+        self.progress = progress
+        self.shard_prefix = time.strftime("%Y%m%d%H%M%S")
+        self.shards = 0
+        self.manifest = self.open_append(manifest_path)
+        self.error_log = self.open_append(error_log_path)
+
+    @staticmethod
+    def open_append(path: str | None):
+        """
+        Opens a text file for appending, creating its directory if needed.
+
+        Args:
+            path (str | None): The path of the file.
+
+        Returns:
+            The open file, or None if no path is given.
+        """
+        if not path:
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return open(path, "a", encoding="utf-8")
+
+    def close(self) -> None:
+        """
+        Closes the manifest and the error log.
+        """
+        for file in (self.manifest, self.error_log):
+            if file is not None:
+                file.close()
+
+    def log_error(self, path: str, error: str) -> None:
+        """
+        Records a file that could not be parsed or stored.
+
+        Args:
+            path (str): The path of the file.
+            error (str): The error message.
+        """
+        logger.error("Ingest of %s failed: %s", path, error)
+        if self.error_log is not None:
+            self.error_log.write(
+                json.dumps({"path": path, "error": error}, ensure_ascii=False) + "\n"
+            )
+            self.error_log.flush()
+
+    def mark_stored(self, results: list[dict]) -> None:
+        """
+        Appends the digests of stored files to the manifest.
+
+        Args:
+            results (list[dict]): The results of `parse_file` for the stored files.
+        """
+        for _ in results:
+            self.progress.add("stored")
+        if self.manifest is not None:
+            self.manifest.writelines(
+                f"{result['digest']}\t{result['path']}\n" for result in results
+            )
+            self.manifest.flush()
+            os.fsync(self.manifest.fileno())
+
+    def write_batch(self, results: list[dict]) -> None:
+        """
+        Stores a batch of parsed statements.
+
+        Args:
+            results (list[dict]): The results of `parse_file` with status "parsed".
+        """
+        if not results:
+            return
+        statements = [result["statement"] for result in results]
+        if self.exporter is not None:
+            self.shards += 1
+            shard_path = os.path.join(
+                self.output_dir,
+                f"shard_{self.shard_prefix}_{self.shards:05d}.{self.exporter.extension}",
+            )
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(shard_path, "wb") as file:
+                self.exporter.write_many(statements, file)
+            self.mark_stored(results)
+            return
+        try:
+            self.record.insert_records(statements)
+            self.mark_stored(results)
+        except Exception:  # noqa: BLE001
+            # Retries the batch file by file, so that one bad statement only
+            # fails itself.
+            for result in results:
+                try:
+                    self.record.insert_record(result["statement"])
+                    self.mark_stored([result])
+                except Exception as error:  # noqa: BLE001
+                    self.log_error(result["path"], f"{type(error).__name__}: {error}")
+
+
+def ingest(
+    paths: list[str],
+    output: str = "db",
+    output_dir: str = "assets/ingest",
+    manifest_path: str | None = None,
+    error_log_path: str | None = None,
+    workers: int = config.EXECUTOR_MAX_WORKERS,
+    batch_size: int = config.INGEST_BATCH_SIZE,
+    progress_interval: float = config.INGEST_PROGRESS_INTERVAL,
+) -> dict:
+    """
+    Parses PDF files in a pool of worker processes and stores them in batches.
+
+    Files whose SHA-256 digest is in the manifest, or that repeat a file seen
+    earlier in the run, are skipped. At most `batch_size + 2 * workers` files are
+    being parsed or waiting to be stored at any time, so memory use does not
+    grow when storing is slower than parsing.
+
+    Args:
+        paths (list[str]): The PDF files.
+        output (str, optional): "db", "parquet" or "csv". Defaults to "db".
+        output_dir (str, optional): The directory of the shard files.
+        manifest_path (str, optional): The manifest used to skip and record stored files.
+        error_log_path (str, optional): The JSON lines file of per-file errors.
+        workers (int, optional): The number of worker processes.
+        batch_size (int, optional): The number of statements per DB transaction or shard.
+        progress_interval (float, optional): The number of seconds between progress reports.
+
+    Returns:
+        dict: The file counts and throughput of the run.
+    """
+    seen = load_manifest(manifest_path)
+    progress = Progress(len(paths), progress_interval)
+    ingestor = Ingestor(output, output_dir, manifest_path, error_log_path, progress)
+    in_flight = threading.BoundedSemaphore(batch_size + 2 * workers)
+
+    def feed() -> Iterator[str]:
+        for path in paths:
+            in_flight.acquire()
+            yield path
+
+    context = multiprocessing.get_context("spawn")
+    batch = []
+    try:
+        with context.Pool(
+            workers,
+            initializer=init_worker,
+            initargs=(frozenset(seen), logs.worker_queue()),
+            maxtasksperchild=config.EXECUTOR_MAX_TASKS_PER_CHILD,
+        ) as pool:
+            for result in pool.imap_unordered(parse_file, feed()):
+                status = result["status"]
+                if status == "parsed" and result["digest"] in seen:
+                    status = "skipped"
+                progress.add(status, result["size"])
+                if status != "parsed":
+                    if status == "failed":
+                        ingestor.log_error(result["path"], result["error"])
+                    in_flight.release()
+                    continue
+                seen.add(result["digest"])
+                batch.append(result)
+                if len(batch) >= batch_size:
+                    ingestor.write_batch(batch)
+                    in_flight.release(len(batch))
+                    batch = []
+            ingestor.write_batch(batch)
+    finally:
+        ingestor.close()
+    progress.report()
+    return progress.summary()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("sources", nargs="*", help="PDF files or directories.")
+    parser.add_argument("--file-list", help="A text file with one PDF path per line.")
+    parser.add_argument("--output", choices=["db", "parquet", "csv"], default="db")
+    parser.add_argument("--output-dir", default="assets/ingest")
+    parser.add_argument("--database-url", default=config.DATABASE_URL)
+    parser.add_argument("--manifest", help="The resume manifest of stored files.")
+    parser.add_argument("--error-log", help="The JSON lines file of per-file errors.")
+    parser.add_argument("--workers", type=int, default=config.EXECUTOR_MAX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=config.INGEST_BATCH_SIZE)
+    parser.add_argument(
+        "--progress-interval", type=float, default=config.INGEST_PROGRESS_INTERVAL
+    )
+    args = parser.parse_args(argv)
+    if not args.sources and not args.file_list:
+        parser.error("expected PDF files, directories or --file-list")
+
+    logs.setup()
+    paths = list(iter_paths(args.sources, args.file_list))
+    if args.output == "db":
+        models.init_engine(args.database_url, create_schema=True)
+    try:
+        summary = ingest(
+            paths,
+            output=args.output,
+            output_dir=args.output_dir,
+            manifest_path=args.manifest,
+            error_log_path=args.error_log,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            progress_interval=args.progress_interval,
+        )
+    finally:
+        models.dispose_engine()
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
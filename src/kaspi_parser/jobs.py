@@ -0,0 +1,386 @@
+import asyncio
+import contextlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+
+from src.kaspi_parser import config, responses
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFullError(Exception):
+    """
+    Raised when a job cannot be submitted because the job queue is full.
+    """
+
+
+class JobCancelledError(Exception):
+    """
+    Raised in a job handler that reaches its commit point after the job timed out.
+    """
+
+
+class Cancellation:
+    """
+    Settles the race between the timeout of a job and its handler storing the
+    result: whichever of `cancel` and `commit` is called first wins.
+
+    Awaiting a thread or a process pool cannot be interrupted, so a job that times
+    out keeps running in the background. Its handler calls `commit` before any
+    persistent side effect, such as the export or the DB insert, and stops there.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes a new instance of the Cancellation class.
+        """
+        self.cancelled = False
+        self.committed = False
+
+    def cancel(self) -> bool:
+        """
+        Cancels the job, unless its handler has already committed.
+
+        Returns:
+            bool: Whether the job was cancelled.
+        """
+        if not self.committed:
+            self.cancelled = True
+        return self.cancelled
+
+    def commit(self) -> None:
+        """
+        Marks the point after which the handler is no longer cancelled.
+
+        Raises:
+            JobCancelledError: If the job has been cancelled.
+        """
+        if self.cancelled:
+            raise JobCancelledError("Job was cancelled before it was stored")
+        self.committed = True
+
+
+class Job:
+    """
+    A statement submitted for background processing, and its outcome.
+
+    The result is kept serialised: in memory up to `JobManager.max_memory_result`
+    bytes, in a file under the spill directory beyond that.
+    """
+
+    def __init__(self, upload, options: dict) -> None:
+        """
+        Initializes a new instance of the Job class.
+
+        Args:
+            upload (util.SpooledUpload): The buffered PDF document, owned by the job.
+            options (dict): The keyword arguments passed on to the job handler.
+        """
+        self.id = uuid.uuid4().hex
+        self.upload = upload
+        self.options = options
+        self.status = "queued"
+        self.error = None
+        self.excel_path = ""
+        self.timings = {}
+        self.result = None
+        self.result_path = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        """
+        Tells whether the job has finished, successfully or not.
+        """
+        return self.status in ("succeeded", "failed", "timeout")
+
+    def to_dict(self) -> dict:
+        """
+        Describes the job without its result.
+
+        Returns:
+            dict: The id, status, error, export location, timings and timestamps.
+        """
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "excel_path": self.excel_path,
+            "timings": self.timings,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def render(self) -> bytes:
+        """
+        Serialises the job with its result as JSON. The stored result is spliced
+        in as is, so it is not parsed again.
+
+        Returns:
+            bytes: The JSON document, with the result under "result".
+        """
+        result = self.result
+        if self.result_path is not None:
+            with open(self.result_path, "rb") as file:
+                result = file.read()
+        return b"".join(
+            [
+                responses.dumps(self.to_dict())[:-1],
+                b',"result":',
+                result if result is not None else b"null",
+                b"}",
+            ]
+        )
+
+    def discard(self) -> None:
+        """
+        Releases the upload and removes the spilled result, if any.
+        """
+        if self.upload is not None:
+            self.upload.close()
+            self.upload = None
+        if self.result_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.result_path)
+            self.result_path = None
+        self.result = None
+
+
+class JobManager:
+    """
+    A class to run statements in the background on a fixed number of workers.
+
+    Jobs wait on a bounded in-process queue and are picked up by `workers`
+    asyncio tasks, each awaiting one handler call at a time, including the
+    handler of a job that timed out, so at most `workers` statements are
+    processed concurrently and at most `max_queued` wait. Finished jobs are
+    kept for `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        handler,
+        workers: int = config.JOBS_WORKERS,
+        max_queued: int = config.JOBS_QUEUE_SIZE,
+        timeout: float = config.JOBS_TIMEOUT,
+        max_memory_result: int = config.JOBS_RESULT_MAX_MEMORY,
+        spill_dir: str = config.JOBS_SPILL_DIR,
+        retention: float = config.JOBS_RETENTION,
+    ) -> None:
+        """
+        Initializes a new instance of the JobManager class.
+
+        Args:
+            handler (callable): The coroutine function processing a job. It is
+                                called with the upload, a `timings` dict to fill
+                                and the job options, and returns the result dict.
+            workers (int): The number of jobs processed concurrently.
+            max_queued (int): The maximum number of jobs waiting for a worker.
+            timeout (float): The number of seconds after which a running job is cancelled.
+            max_memory_result (int): The serialised size above which a result is
+                                     written to disk instead of kept in memory.
+            spill_dir (str): The directory of spilled results. Empty for a
+                             directory under the system temp dir.
+            retention (float): The number of seconds finished jobs are kept.
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.max_memory_result = max_memory_result
+        self.spill_dir = spill_dir or os.path.join(
+            tempfile.gettempdir(), "kaspi_parser_jobs"
+        )
+        self.retention = retention
+        self.jobs = {}
+        self.queue = None
+        self.tasks = []
+        self.abandoned = set()
+
+    def start(self) -> None:
+        """
+        Starts the worker tasks on the running event loop, unless they are
+        already running there.
+        """
+        if self.tasks and self.tasks[0].get_loop() is asyncio.get_running_loop():
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queued)
+        self.tasks = [asyncio.create_task(self.run()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """
+        Cancels the worker tasks and discards every job, finished or not. Waits
+        for the handlers of cancelled jobs, which stop at their commit point.
+        """
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await asyncio.gather(*self.abandoned, return_exceptions=True)
+        for job in self.jobs.values():
+            job.discard()
+        self.jobs.clear()
+
+    def submit(self, upload, **options) -> Job:
+        """
+        Queues a statement for processing.
+
+        Args:
+            upload (util.SpooledUpload): The buffered PDF document. The job takes
+                                         ownership of it and closes it when done.
+            **options: The keyword arguments passed on to the handler.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFullError: If `max_queued` jobs are already waiting.
+        """
+        self.start()
+        self.evict()
+        job = Job(upload, options)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Job queue is full") from None
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        Returns a job by id.
+
+        Args:
+            job_id (str): The id returned by `submit`.
+
+        Returns:
+            Job | None: The job, or None if it does not exist or has expired.
+        """
+        self.evict()
+        return self.jobs.get(job_id)
+
+    def qsize(self) -> int:
+        """
+        Returns the number of jobs waiting for a worker.
+
+        Returns:
+            int: The number of jobs waiting for a worker.
+        """
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def evict(self) -> None:
+        """
+        Discards the jobs that finished more than `retention` seconds ago.
+        """
+        expired = [
+            job_id
+            for job_id, job in self.jobs.items()
+            if job.done and time.time() - job.finished_at > self.retention
+        ]
+        for job_id in expired:
+            self.jobs.pop(job_id).discard()
+
+    async def run(self) -> None:
+        """
+        Processes queued jobs one at a time until cancelled.
+        """
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.process(job)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, job: Job) -> None:
+        """
+        Runs the handler on a job and stores its result or error. After `timeout`
+        seconds the job is reported as timed out, unless its handler has already
+        committed, in which case it is waited for.
+
+        The handler is called with a `Cancellation` and keeps running after the
+        timeout, since a thread or pool worker cannot be interrupted, but stops
+        before storing anything. The upload is closed once the handler is done,
+        and the worker waits for it before taking the next job.
+
+        Args:
+            job (Job): The job to process.
+        """
+        job.status = "running"
+        job.started_at = time.time()
+        started = time.perf_counter()
+        cancellation = Cancellation()
+        task = asyncio.ensure_future(
+            self.handler(
+                job.upload,
+                timings=job.timings,
+                cancellation=cancellation,
+                **job.options,
+            )
+        )
+        try:
+            await asyncio.wait({task}, timeout=self.timeout)
+            if task.done() or not cancellation.cancel():
+                result = await task
+                job.excel_path = result.get("excel_path", "")
+                self.store_result(job, responses.dumps(result))
+                job.status = "succeeded"
+            else:
+                job.status = "timeout"
+                job.error = f"Job timed out after {self.timeout} seconds"
+                logger.error("Job %s timed out", job.id)
+        except Exception as error:
+            job.status = "failed"
+            job.error = f"Error parsing PDF: {error}"
+            logger.exception("Job %s failed", job.id)
+        finally:
+            if task.done():
+                job.upload.close()
+            else:
+                cancellation.cancel()
+                self.abandon(task, job.upload)
+            job.upload = None
+            job.timings["total"] = time.perf_counter() - started
+            job.finished_at = time.time()
+        await asyncio.wait({task})
+
+    def abandon(self, task: asyncio.Future, upload) -> None:
+        """
+        Keeps track of the handler of a cancelled job until it finishes, then
+        closes its upload, which the handler may still be reading until then.
+
+        Args:
+            task (asyncio.Future): The handler of the job.
+            upload (util.SpooledUpload): The buffered PDF document of the job.
+        """
+
+        def release(task: asyncio.Future) -> None:
+            self.abandoned.discard(task)
+            upload.close()
+            if not task.cancelled() and task.exception() is not None:
+                logger.info("Cancelled job stopped: %s", task.exception())
+
+        self.abandoned.add(task)
+        task.add_done_callback(release)
+
+    def store_result(self, job: Job, result: bytes) -> None:
+        """
+        Keeps a serialised result in memory, or writes it to the spill directory
+        if it is larger than `max_memory_result` bytes.
+
+        Args:
+            job (Job): The job the result belongs to.
+            result (bytes): The serialised result.
+        """
+        if len(result) <= self.max_memory_result:
+            job.result = result
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        job.result_path = os.path.join(self.spill_dir, f"{job.id}.json")
+        with open(job.result_path, "wb") as file:
+            file.write(result)
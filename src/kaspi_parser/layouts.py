@@ -0,0 +1,225 @@
+import functools
+import re
+
+from src.kaspi_parser import config
+
+
+class UnsupportedStatementError(ValueError):
+    """
+    Raised when a document does not match the fingerprint of any registered
+    statement layout, e.g. because it is not a Kaspi statement at all.
+    """
+
+
+class Layout:
+    """
+    The grammar of one statement layout, e.g. the Russian Kaspi Gold statement.
+
+    A layout is recognised by its fingerprint: substrings that all occur at the
+    start of the first page. Its header and transaction patterns only contain
+    the wording of its own language and are compiled once, when the layout is
+    created.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        language: str | None,
+        fingerprint: tuple[str, ...],
+        header_patterns: dict[str, str],
+        operations: tuple[str, ...],
+        extra_texts: tuple[str, ...] = (),
+    ) -> None:
+        """
+        Initializes a new instance of the Layout class.
+
+        Args:
+            name (str): The unique name of the layout.
+            language (str | None): The language of the layout, e.g. "ru".
+            fingerprint (tuple[str, ...]): The substrings identifying the layout.
+            header_patterns (dict[str, str]): One pattern per header field. Each sets
+                                              the named group of its field; the balance
+                                              pattern sets "balance_date" and "balance".
+            operations (tuple[str, ...]): The transaction types used in the table.
+            extra_texts (tuple[str, ...], optional): Footers and notices removed from
+                                                     the text before scanning it.
+        """
+        self.name = name
+        self.language = language
+        self.fingerprint = fingerprint
+        self.header_patterns = header_patterns
+        self.operations = operations
+        self.extra_texts = extra_texts
+        self.header_pattern = re.compile(
+            "|".join(f"(?={pattern})" for pattern in header_patterns.values())
+        )
+        self.statement_pattern = re.compile(
+            r"(\d{2}\.\d{2}\.\d{2})\s+"  # Дата в формате dd.mm.yy
+            r"([+-]\s?\d{1,3}(?:\s\d{3})*,\d{2} ₸)\s+"  # Сумма с символом валюты
+            rf"({'|'.join(map(re.escape, operations))})\s+"  # Тип операции
+            r"(.+?)(?=\d{2}\.\d{2}\.\d{2}|$)"  # Описание
+        )
+
+    def __repr__(self) -> str:
+        return f"Layout({self.name!r})"
+
+    def matches(self, text: str) -> bool:
+        """
+        Tells whether a text carries the fingerprint of the layout.
+
+        Args:
+            text (str): The beginning of the first page.
+
+        Returns:
+            bool: True if every fingerprint substring occurs in the text.
+        """
+        return all(marker in text for marker in self.fingerprint)
+
+    def clean(self, text: str) -> str:
+        """
+        Removes the footers and notices of the layout from a text.
+
+        Args:
+            text (str): The text of the statement.
+
+        Returns:
+            str: The cleaned text.
+        """
+        for extra_text in self.extra_texts:
+            text = text.replace(extra_text, "")
+        return text
+
+
+LAYOUTS: dict[str, Layout] = {}
+
+
+def register(layout: Layout) -> Layout:
+    """
+    Adds a layout to the registry. Layouts are tried in registration order.
+
+    Args:
+        layout (Layout): The layout.
+
+    Returns:
+        Layout: The registered layout.
+    """
+    LAYOUTS[layout.name] = layout
+    any_layout.cache_clear()
+    return layout
+
+
+def detect(text: str, limit: int = config.HEADER_SCAN_LIMIT) -> Layout:
+    """
+    Finds the layout of a statement from the beginning of its first page. Only
+    substring checks are run, so other documents are rejected before any
+    header or transaction pattern is tried.
+
+    Args:
+        text (str): The text of the first page.
+        limit (int, optional): The number of leading characters checked.
+
+    Returns:
+        Layout: The first registered layout whose fingerprint matches.
+
+    Raises:
+        UnsupportedStatementError: If no layout matches.
+    """
+    head = text[:limit]
+    for layout in LAYOUTS.values():
+        if layout.matches(head):
+            return layout
+    raise UnsupportedStatementError("Document is not a supported Kaspi statement")
+
+
+@functools.lru_cache(maxsize=1)
+def any_layout() -> Layout:
+    """
+    Returns a layout accepting the transactions of every registered layout. Used
+    to scan fragments of a statement whose layout is not known, e.g. pages
+    without the header.
+
+    Returns:
+        Layout: The combined layout, without header patterns.
+    """
+    return Layout(
+        name="any",
+        language=None,
+        fingerprint=(),
+        header_patterns={},
+        operations=tuple(
+            dict.fromkeys(
+                operation
+                for layout in LAYOUTS.values()
+                for operation in layout.operations
+            )
+        ),
+        extra_texts=tuple(
+            extra_text
+            for layout in LAYOUTS.values()
+            for extra_text in layout.extra_texts
+        ),
+    )
+
+
+KASPI_GOLD_RU = register(
+    Layout(
+        name="kaspi_gold_ru",
+        language="ru",
+        fingerprint=("Kaspi", "Номер счета:"),
+        header_patterns={
+            "fio": r"(?i:по \d{2}\.\d{2}\.\d{2} (?P<fio>.*?) Номер счета:)",
+            "card": r"(?i:Номер карты: (?P<card>\*\d{4}))",
+            "iban": r"(?i:Номер счета: (?P<iban>.*?) )",
+            "currency": r"(?i:Валюта счета: (?P<currency>\w+))",
+            "period": (
+                r"(?i:за период с (?P<from>\d{2}\.\d{2}\.\d{2})"
+                r" по (?P<until>\d{2}\.\d{2}\.\d{2}))"
+            ),
+            "balance": (
+                r"Доступно на (?P<balance_date>\d{2}\.\d{2}\.\d{2}) (?P<balance>.*?) ₸"
+            ),
+            "replenishments": r"Пополнения (?P<replenishments>.*?) ₸",
+            "transfers": r"Переводы (?P<transfers>.*?) ₸",
+            "purchases": r"Покупки (?P<purchases>.*?) ₸",
+            "withdrawals": r"Снятия (?P<withdrawals>.*?) ₸",
+            "others": r"Разное (?P<others>.*?) ₸",
+        },
+        operations=("Перевод", "Покупка", "Пополнение", "Разное", "Снятие"),
+        extra_texts=(
+            "АО «Kaspi Bank», БИК CASPKZKA, www.kaspi.kz",
+            " - Сумма заблокирована. Банк ожидает подтверждения от платежной системы.",
+        ),
+    )
+)
+
+KASPI_GOLD_KZ = register(
+    Layout(
+        name="kaspi_gold_kz",
+        language="kz",
+        fingerprint=("Kaspi", "Шот нөмірі:"),
+        header_patterns={
+            "fio": r"(?i:бойынша (?P<fio>.*?) Шот нөмірі:)",
+            "card": r"(?i:Карта нөмірі: (?P<card>\*\d{4}))",
+            "iban": r"(?i:Шот нөмірі: (?P<iban>.*?) )",
+            "currency": r"(?i:Шот валютасы: (?P<currency>\w+))",
+            "period": (
+                r"(?i:(?P<from>\d{2}\.\d{2}\.\d{2})ж\.? бастап"
+                r" (?P<until>\d{2}\.\d{2}\.\d{2})ж\.? дейінгі кезеңге)"
+            ),
+            "balance": (
+                r"(?P<balance_date>\d{2}\.\d{2}\.\d{2})ж. қолжетімді: (?P<balance>.*?) ₸"
+            ),
+            "replenishments": r"Толықтыру (?P<replenishments>.*?) ₸",
+            "transfers": r"Аударым (?P<transfers>.*?) ₸",
+            "purchases": r"Зат сатып алу (?P<purchases>.*?) ₸",
+            "withdrawals": r"Ақша алу (?P<withdrawals>.*?) ₸",
+            # Matches both the Cyrillic and the Latin schwa of "Әртүрлі".
+            "others": r"ртүрлі (?P<others>.*?) ₸",
+        },
+        operations=("Толықтыру", "Аударым", "Зат сатып алу", "Ақша алу", "Əртүрлі"),
+        extra_texts=(
+            "«Kaspi Bank» АҚ, БСК CASPKZKA, www.kaspi.kz",
+            " - Сомаға тосқауыл қойылған. Банк төлем жүйесінің растауын күтуде.",
+        ),
+    )
+)
@@ -0,0 +1,326 @@
+import atexit
+import contextvars
+import copy
+import datetime
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import time
+import uuid
+
+import orjson
+
+from src.kaspi_parser import config
+
+# The fields of the HTTP request being served, added to every record logged
+# while serving it: the request id, and the page count, row count and stage
+# durations reported through `bind` and `add_timing`.
+_request = contextvars.ContextVar("log_request", default=None)
+
+# The attributes every LogRecord has; anything else was passed with `extra=`.
+RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", logging.INFO, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "context"}
+
+_listener = None
+_handler = None
+# The queue worker processes log to, and the listener writing their records to
+# the log file of this process.
+_worker_records = None
+_worker_listener = None
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the fields of the current request onto each record. Runs on the
+    thread that logs, before the record is queued, since the context is not
+    available on the listener thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = _request.get()
+        record.context = (
+            {**fields, "timings": dict(fields["timings"])} if fields else {}
+        )
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, with the time, level, logger,
+    message, the fields of the request being served and any `extra=` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    A queue handler that renders the message and exception of a record before
+    queueing it, without applying the formatter of the file, so that JSON
+    formatting happens on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+def create_file_handler(
+    filename: str,
+    rotation: str,
+    max_bytes: int,
+    backup_count: int,
+    when: str,
+) -> logging.Handler:
+    """
+    Creates the handler writing the log file.
+
+    Args:
+        filename (str): The path of the log file.
+        rotation (str): "size" to rotate at `max_bytes`, "time" to rotate every
+                        `when`, "watched" to reopen the file once an external
+                        tool such as logrotate has moved it, or "none".
+        max_bytes (int): The size at which the file is rotated.
+        backup_count (int): The number of rotated files kept.
+        when (str): The rotation interval, e.g. "midnight" or "H".
+
+    Returns:
+        logging.Handler: The file handler.
+
+    Raises:
+        ValueError: If the rotation is not supported.
+    """
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8"
+        )
+    if rotation == "watched":
+        return logging.handlers.WatchedFileHandler(filename, encoding="utf-8")
+    if rotation == "none":
+        return logging.FileHandler(filename, encoding="utf-8")
+    raise ValueError(f"Unsupported log rotation: {rotation}")
+
+
+def setup(
+    filename: str = config.LOG_FILE,
+    level: str = config.LOG_LEVEL,
+    log_format: str = config.LOG_FORMAT,
+    rotation: str = config.LOG_ROTATION,
+    max_bytes: int = config.LOG_MAX_BYTES,
+    backup_count: int = config.LOG_BACKUP_COUNT,
+    when: str = config.LOG_ROTATE_WHEN,
+) -> None:
+    """
+    Routes the root logger through a queue to a background listener thread,
+    which writes the log file. Logging on the request path only copies the
+    request fields and puts the record on the queue; formatting and file I/O
+    happen on the listener thread. Does nothing if already set up.
+
+    Called from the entry points only, the app lifespan and the CLIs, so
+    that a single handler in the process owns the file. Pool workers log through
+    `worker_queue` instead. Several server processes must not rotate the same
+    file: use the "watched" rotation with an external rotation tool, or put
+    "{pid}" in the filename to give each process its own file.
+
+    Args:
+        filename (str, optional): The path of the log file. "{pid}" is replaced
+                                  with the id of the process.
+        level (str, optional): The level of the root logger. Defaults to "INFO".
+        log_format (str, optional): "json" for one JSON object per line, or "text".
+        rotation (str, optional): "size", "time", "watched" or "none". Defaults to "size".
+        max_bytes (int, optional): The size at which the file is rotated.
+        backup_count (int, optional): The number of rotated files kept.
+        when (str, optional): The interval of time-based rotation.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    file_handler = create_file_handler(
+        filename.replace("{pid}", str(os.getpid())),
+        rotation,
+        max_bytes,
+        backup_count,
+        when,
+    )
+    file_handler.setFormatter(
+        JsonFormatter()
+        if log_format == "json"
+        else logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    )
+    records = queue.SimpleQueue()
+    _handler = QueueHandler(records)
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(records, file_handler)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def worker_queue():
+    """
+    Returns the queue pool worker processes log to, to be passed to
+    `setup_worker` in their initializer. Its records are written by a second
+    listener thread to the log file of this process, which stays the only one
+    writing and rotating it.
+
+    Returns:
+        multiprocessing.Queue | None: The queue, or None if logging is not set up
+                                      in this process.
+    """
+    global _worker_records, _worker_listener
+    if _listener is None:
+        return None
+    if _worker_listener is None:
+        _worker_records = multiprocessing.get_context("spawn").Queue()
+        _worker_listener = logging.handlers.QueueListener(
+            _worker_records, *_listener.handlers
+        )
+        _worker_listener.start()
+    return _worker_records
+
+
+def setup_worker(records, level: str = config.LOG_LEVEL) -> None:
+    """
+    Routes the root logger of a pool worker process to the queue returned by
+    `worker_queue` in the parent process. Does nothing if `records` is None.
+
+    Args:
+        records (multiprocessing.Queue | None): The queue of the parent process.
+        level (str, optional): The level of the root logger.
+    """
+    global _handler
+    if records is None:
+        return
+    _handler = QueueHandler(records)
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+
+
+def shutdown() -> None:
+    """
+    Writes every queued record, stops the listener threads and closes the file.
+    """
+    global _listener, _handler, _worker_records, _worker_listener
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_records.close()
+        _worker_records = _worker_listener = None
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = _handler = None
+
+
+def bind(**fields) -> None:
+    """
+    Adds fields to every record logged for the request being served.
+
+    Args:
+        **fields: The fields, e.g. pages=3 or rows=120.
+    """
+    request = _request.get()
+    if request is not None:
+        request.update(fields)
+
+
+def add_timing(stage: str, seconds: float) -> None:
+    """
+    Adds the duration of a stage to the "timings" field of the request being served.
+
+    Args:
+        stage (str): The stage name.
+        seconds (float): The duration in seconds.
+    """
+    request = _request.get()
+    if request is not None:
+        request["timings"][stage] = request["timings"].get(stage, 0.0) + seconds
+
+
+class RequestLogMiddleware:
+    """
+    An ASGI middleware that gives every HTTP request an id, taken from its
+    X-Request-ID header or generated, returns it in the X-Request-ID response
+    header, and logs one record per request with its status and duration.
+    """
+
+    def __init__(self, app) -> None:
+        """
+        Initializes a new instance of the RequestLogMiddleware class.
+
+        Args:
+            app: The wrapped ASGI application.
+        """
+        self.app = app
+        self.logger = logging.getLogger("kaspi_parser.access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")
+        request_id = request_id or uuid.uuid4().hex
+        token = _request.set({"request_id": request_id, "timings": {}})
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-request-id", request_id.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            self.logger.info(
+                "%s %s %s",
+                scope["method"],
+                scope["path"],
+                status,
+                extra={"status": status, "duration": time.perf_counter() - started},
+            )
+            _request.reset(token)
@@ -1,9 +1,28 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 
-from src.kaspi_parser import routers
+from src.kaspi_parser import logs, metrics, models, routers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logs.setup()
+    models.init_engine()
+    routers.parse_executor.start()
+    routers.write_queue.start()
+    routers.job_manager.start()
+    yield
+    await routers.job_manager.stop()
+    await routers.write_queue.stop()
+    routers.parse_executor.shutdown()
+    models.dispose_engine()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(logs.RequestLogMiddleware)
 app.include_router(routers.router)
 
 
@@ -13,4 +32,7 @@ def read_root():
 
 
 if __name__ == "__main__":
+    # A single server process creates the schema here, once, before it starts.
+    # Deployments with several workers run `python -m src.kaspi_parser.schema`.
+    models.init_engine(create_schema=True)
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,371 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from src.kaspi_parser import config, logs
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+TRANSACTION_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+BYTE_BUCKETS = tuple(1024 * 4**power for power in range(10))
+
+# Observations made while a collector is active are buffered instead of being
+# recorded, so they can be shipped back from a worker process.
+_collector = contextvars.ContextVar("metrics_collector", default=None)
+# The stage durations of the HTTP request being served, for its Server-Timing header.
+_timings = contextvars.ContextVar("metrics_timings", default=None)
+
+
+class Histogram:
+    """
+    A cumulative histogram with optional labels, rendered in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(
+        self, name: str, documentation: str, buckets: tuple, labelnames: tuple = ()
+    ) -> None:
+        """
+        Initializes a new instance of the Histogram class.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text of the metric.
+            buckets (tuple): The upper bounds of the buckets, in increasing order.
+            labelnames (tuple, optional): The names of the labels of every sample.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Records one value.
+
+        Args:
+            value (float): The observed value.
+            **labels: The label values, one per name in `labelnames`.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        """
+        Renders the histogram in the Prometheus text exposition format.
+
+        Returns:
+            list[str]: The lines of the metric.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            series = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self.series.items()
+            )
+        for key, (counts, total, count) in series:
+            labels = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+    def clear(self) -> None:
+        """
+        Removes every recorded value.
+        """
+        with self.lock:
+            self.series.clear()
+
+
+HISTOGRAMS = {
+    histogram.name: histogram
+    for histogram in (
+        Histogram(
+            "kaspi_parser_stage_seconds",
+            "Duration of each processing stage in seconds.",
+            LATENCY_BUCKETS,
+            ("stage",),
+        ),
+        Histogram(
+            "kaspi_parser_request_seconds",
+            "Duration of HTTP requests in seconds.",
+            LATENCY_BUCKETS,
+            ("method", "path", "status"),
+        ),
+        Histogram(
+            "kaspi_parser_statement_pages",
+            "Number of pages per parsed statement.",
+            PAGE_BUCKETS,
+        ),
+        Histogram(
+            "kaspi_parser_statement_transactions",
+            "Number of transactions per parsed statement.",
+            TRANSACTION_BUCKETS,
+        ),
+        Histogram(
+            "kaspi_parser_bytes_processed",
+            "Number of bytes handled by each processing stage.",
+            BYTE_BUCKETS,
+            ("stage",),
+        ),
+    )
+}
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    Records a value in the named histogram, and adds stage durations, page and
+    row counts to the log fields of the request being served. Does nothing if
+    METRICS_ENABLED is off.
+
+    Args:
+        name (str): The name of a histogram in HISTOGRAMS.
+        value (float): The observed value.
+        **labels: The label values of the histogram.
+    """
+    if not config.METRICS_ENABLED:
+        return
+    collector = _collector.get()
+    if collector is not None:
+        collector.append((name, value, labels))
+        return
+    HISTOGRAMS[name].observe(value, **labels)
+    if name == "kaspi_parser_stage_seconds":
+        timings = _timings.get()
+        if timings is not None:
+            timings[labels["stage"]] = timings.get(labels["stage"], 0.0) + value
+        logs.add_timing(labels["stage"], value)
+    elif name == "kaspi_parser_statement_pages":
+        logs.bind(pages=value)
+    elif name == "kaspi_parser_statement_transactions":
+        logs.bind(rows=value)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times the enclosed block as a processing stage.
+
+    Args:
+        name (str): The stage name, used as the "stage" label and Server-Timing metric.
+    """
+    if not config.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("kaspi_parser_stage_seconds", time.perf_counter() - started, stage=name)
+
+
+def collect(func, *args, **kwargs) -> tuple:
+    """
+    Calls a function and returns its result together with every observation it
+    made, instead of recording them. Used to run instrumented code in a worker
+    process and `replay` its observations in the parent.
+
+    Args:
+        func (callable): The function to call.
+        *args: Positional arguments for the function.
+        **kwargs: Keyword arguments for the function.
+
+    Returns:
+        tuple: The result of the function and the list of its observations.
+    """
+    observations = []
+    token = _collector.set(observations)
+    try:
+        return func(*args, **kwargs), observations
+    finally:
+        _collector.reset(token)
+
+
+def replay(observations: list) -> None:
+    """
+    Records observations returned by `collect`.
+
+    Args:
+        observations (list): The (name, value, labels) tuples to record.
+    """
+    for name, value, labels in observations:
+        observe(name, value, **labels)
+
+
+def render_counter(name: str, documentation: str, samples: dict) -> list[str]:
+    """
+    Renders a counter in the Prometheus text exposition format.
+
+    Args:
+        name (str): The metric name, ending in "_total".
+        documentation (str): The HELP text of the metric.
+        samples (dict): The value of every series, keyed by its rendered labels,
+                        e.g. 'tier="memory"', or "" for a counter without labels.
+
+    Returns:
+        list[str]: The lines of the metric.
+    """
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+    for labels, value in samples.items():
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}{suffix} {value}")
+    return lines
+
+
+def render(
+    cache_stats: dict | None = None, write_behind_stats: dict | None = None
+) -> str:
+    """
+    Renders every histogram in the Prometheus text exposition format.
+
+    Args:
+        cache_stats (dict | None, optional): The counters of the parse cache, as in
+                                             `cache.ParseCache.stats`, rendered as
+                                             hit, miss and eviction counters.
+        write_behind_stats (dict | None, optional): The counters of the write-behind
+                                                    queue, as in
+                                                    `writer.WriteBehindQueue.stats`.
+
+    Returns:
+        str: The exposition text.
+    """
+    lines = []
+    for histogram in HISTOGRAMS.values():
+        lines.extend(histogram.render())
+    if cache_stats is not None:
+        lines.extend(
+            render_counter(
+                "kaspi_parser_parse_cache_hits_total",
+                "Parse cache hits by tier.",
+                {
+                    'tier="memory"': cache_stats["memory_hits"],
+                    'tier="disk"': cache_stats["disk_hits"],
+                },
+            )
+        )
+        lines.extend(
+            render_counter(
+                "kaspi_parser_parse_cache_misses_total",
+                "Parse cache misses.",
+                {"": cache_stats["misses"]},
+            )
+        )
+        lines.extend(
+            render_counter(
+                "kaspi_parser_parse_cache_evictions_total",
+                "Parse cache entries evicted to stay within the size limits.",
+                {"": cache_stats["evictions"]},
+            )
+        )
+    if write_behind_stats is not None:
+        lines.extend(
+            render_counter(
+                "kaspi_parser_write_behind_statements_total",
+                "Statements written in the background, by outcome.",
+                {
+                    'outcome="written"': write_behind_stats["written"],
+                    'outcome="failed"': write_behind_stats["failed"],
+                },
+            )
+        )
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: dict) -> str:
+    """
+    Formats stage durations as a Server-Timing header value.
+
+    Args:
+        timings (dict): The stage durations in seconds.
+
+    Returns:
+        str: The header value, with durations in milliseconds.
+    """
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()
+    )
+
+
+class MetricsMiddleware:
+    """
+    An ASGI middleware that times every HTTP request and adds a Server-Timing
+    header with the duration of each stage run while serving it.
+    """
+
+    def __init__(self, app) -> None:
+        """
+        Initializes a new instance of the MetricsMiddleware class.
+
+        Args:
+            app: The wrapped ASGI application.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = {}
+        token = _timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timings["total"] = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", server_timing(timings).encode("latin-1"))
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            HISTOGRAMS["kaspi_parser_request_seconds"].observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                path=getattr(route, "path", "unmatched"),
+                status=status,
+            )
@@ -1,8 +1,27 @@
+import threading
+from typing import Literal
+
 from pydantic import BaseModel
-from sqlalchemy import Column, String, Float, Date, DateTime, Integer, ForeignKey
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    create_engine,
+    event,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.schema import CreateColumn
 
 from src.kaspi_parser import config
 
@@ -13,10 +32,24 @@ class PDFRequest(BaseModel):
     base64_pdf: str
     to_excel: bool = False
     dry_run: bool = False
+    cache: Literal["use", "bypass"] = "use"
+    write_behind: bool = False
+    export_format: Literal["xlsx", "csv", "parquet"] = "xlsx"
+    incremental: bool = False
+
+
+class BatchPDFRequest(BaseModel):
+    documents: list[PDFRequest]
+    single_transaction: bool = False
 
 
 class BankStatement(Base):
     __tablename__ = "bank_statements"
+    __table_args__ = (
+        Index("ix_bank_statements_iban_id", "iban", "id"),
+        Index("ix_bank_statements_card_number_id", "card_number", "id"),
+        Index("ix_bank_statements_period", "from_date", "to_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     financial_institution_name = Column(String(256), nullable=False)
@@ -39,6 +72,21 @@ class BankStatement(Base):
 
 class TransactionDetail(Base):
     __tablename__ = "transaction_details"
+    __table_args__ = (
+        Index(
+            "ix_transaction_details_statement_date",
+            "bank_statement_id",
+            "operation_date",
+            "id",
+        ),
+        Index(
+            "ix_transaction_details_statement_type",
+            "bank_statement_id",
+            "transaction_type",
+            "amount",
+        ),
+        Index("ix_transaction_details_iban_date", "iban", "operation_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     operation_date = Column(DateTime, nullable=False)
@@ -46,11 +94,253 @@ class TransactionDetail(Base):
     transaction_type = Column(String(50), nullable=False)
     detail = Column(String(256), nullable=True)
     bank_statement_id = Column(Integer, ForeignKey("bank_statements.id"))
+    iban = Column(String(34), nullable=True)
+    fingerprint = Column(String(32), nullable=True)
 
     bank_statement = relationship("BankStatement", back_populates="details")
 
 
-engine = create_engine(config.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class StatementTransaction(Base):
+    """
+    Links a statement to a transaction first stored with an earlier, overlapping
+    statement of the same account, so incremental ingestion stores it only once.
+    """
+
+    __tablename__ = "statement_transactions"
+    __table_args__ = (
+        Index(
+            "ix_statement_transactions_statement_date",
+            "bank_statement_id",
+            "operation_date",
+            "transaction_detail_id",
+        ),
+    )
+
+    bank_statement_id = Column(
+        Integer, ForeignKey("bank_statements.id"), primary_key=True
+    )
+    transaction_detail_id = Column(
+        Integer, ForeignKey("transaction_details.id"), primary_key=True
+    )
+    # Copied from the linked transaction, so the transactions of a statement can
+    # be read in date order from the index of this table.
+    operation_date = Column(DateTime, nullable=True)
+
+
+class StatementMonthlyRollup(Base):
+    """
+    The inflow, outflow and closing balance of a statement per calendar month,
+    computed once at ingest.
+    """
+
+    __tablename__ = "statement_monthly_rollups"
+
+    bank_statement_id = Column(
+        Integer, ForeignKey("bank_statements.id"), primary_key=True
+    )
+    month = Column(Date, primary_key=True)
+    inflow = Column(Float, nullable=False)
+    outflow = Column(Float, nullable=False)
+    net = Column(Float, nullable=False)
+    transactions = Column(Integer, nullable=False)
+    closing_balance = Column(Float, nullable=False)
+
+
+class StatementTypeRollup(Base):
+    """
+    The total of a statement per transaction type, computed once at ingest.
+    """
+
+    __tablename__ = "statement_type_rollups"
+
+    bank_statement_id = Column(
+        Integer, ForeignKey("bank_statements.id"), primary_key=True
+    )
+    transaction_type = Column(String(50), primary_key=True)
+    category = Column(String(20), nullable=False)
+    total = Column(Float, nullable=False)
+    transactions = Column(Integer, nullable=False)
+
+
+class StatementCounterpartyRollup(Base):
+    """
+    The counterparties of a statement with the largest turnover, computed once
+    at ingest and ranked from 1.
+    """
+
+    __tablename__ = "statement_counterparty_rollups"
+
+    bank_statement_id = Column(
+        Integer, ForeignKey("bank_statements.id"), primary_key=True
+    )
+    rank = Column(Integer, primary_key=True)
+    counterparty = Column(String(256), nullable=True)
+    inflow = Column(Float, nullable=False)
+    outflow = Column(Float, nullable=False)
+    total = Column(Float, nullable=False)
+    transactions = Column(Integer, nullable=False)
+
+
+engine = None
+engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def create_db_engine(database_url: str | None = None):
+    """
+    Creates a SQLAlchemy engine configured from `config`.
+
+    Server databases get a sized connection pool with pre-ping and recycling,
+    and PostgreSQL additionally gets a statement timeout. SQLite connections
+    get a busy timeout and the configured journal mode and synchronous pragmas,
+    so that several workers can write to the same file without failing on the
+    database lock.
+
+    Args:
+        database_url (str, optional): The database URL. Defaults to config.DATABASE_URL.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    url = make_url(database_url or config.DATABASE_URL)
+    if url.get_backend_name() == "sqlite":
+        sqlite_engine = create_engine(
+            url,
+            connect_args={
+                "timeout": config.SQLITE_BUSY_TIMEOUT,
+                "check_same_thread": False,
+            },
+        )
+
+        @event.listens_for(sqlite_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+            cursor.close()
+
+        return sqlite_engine
+
+    connect_args = {}
+    if url.get_backend_name() == "postgresql" and config.DB_STATEMENT_TIMEOUT:
+        connect_args["options"] = f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT}"
+    return create_engine(
+        url,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+def add_missing_columns(bind) -> None:
+    """
+    Adds the nullable columns of every table that are missing from tables created
+    by earlier versions, since `create_all` does not alter existing tables.
+
+    Args:
+        bind: The engine or connection to upgrade.
+    """
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                table_name = preparer.format_table(table)
+                column_spec = CreateColumn(column).compile(dialect=bind.dialect)
+                connection.execute(
+                    text(f"ALTER TABLE {table_name} ADD COLUMN {column_spec}")
+                )
+
+
+def backfill_link_dates(bind) -> None:
+    """
+    Copies the operation date of the linked transaction to the statement links
+    stored before `StatementTransaction.operation_date` was added.
+
+    Args:
+        bind: The engine or connection to upgrade.
+    """
+    link = StatementTransaction.__table__
+    detail = TransactionDetail.__table__
+    with bind.begin() as connection:
+        connection.execute(
+            update(link)
+            .where(link.c.operation_date.is_(None))
+            .values(
+                operation_date=select(detail.c.operation_date)
+                .where(detail.c.id == link.c.transaction_detail_id)
+                .scalar_subquery()
+            )
+        )
+
+
+def ensure_schema(bind) -> None:
+    """
+    Creates the missing tables with their indexes. Run once from an entry point,
+    such as `python -m src.kaspi_parser.schema`, since concurrent runs race on
+    the DDL.
+
+    Args:
+        bind: The engine to create the schema with.
+    """
+    Base.metadata.create_all(bind=bind)
+
+
+def upgrade_schema(bind) -> None:
+    """
+    Upgrades the tables created by earlier versions: adds their missing columns
+    and indexes and backfills the new columns. A one-off migration, run with
+    `python -m src.kaspi_parser.schema --upgrade` and never on startup.
+
+    Args:
+        bind: The engine to upgrade the schema with.
+    """
+    add_missing_columns(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    backfill_link_dates(bind)
+
+
+def init_engine(database_url: str | None = None, create_schema: bool | None = None):
+    """
+    Creates the engine of the current process, binds `SessionLocal` to it and
+    optionally creates the schema. Called from the app lifespan, so that every worker
+    process gets its own engine and connection pool after it starts.
+
+    Args:
+        database_url (str, optional): The database URL. Defaults to config.DATABASE_URL.
+        create_schema (bool, optional): Whether to create the schema, see
+                                        `ensure_schema`. Defaults to
+                                        config.DB_CREATE_SCHEMA.
+
+    Returns:
+        Engine: The engine of the current process.
+    """
+    global engine
+    with engine_lock:
+        if engine is None:
+            engine = create_db_engine(database_url)
+            SessionLocal.configure(bind=engine)
+            if config.DB_CREATE_SCHEMA if create_schema is None else create_schema:
+                ensure_schema(engine)
+    return engine
+
 
-Base.metadata.create_all(bind=engine)
+def dispose_engine() -> None:
+    """
+    Closes every pooled connection of the current process and unbinds `SessionLocal`.
+    """
+    global engine
+    with engine_lock:
+        if engine is not None:
+            engine.dispose()
+            engine = None
@@ -0,0 +1,392 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, tuple_, union_all
+
+from src.kaspi_parser import models, rollups
+
+
+def encode_cursor(values: list) -> str:
+    """
+    Encodes the sort key of the last returned row as an opaque cursor.
+
+    Args:
+        values (list): The JSON serialisable sort key values.
+
+    Returns:
+        str: The URL-safe cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, types: tuple) -> list:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor.
+        types (tuple): The expected type of each sort key value, e.g. (str, int).
+
+    Returns:
+        list: The sort key values.
+
+    Raises:
+        ValueError: If the cursor is malformed or its values do not match `types`.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"Invalid cursor: {cursor}") from error
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(
+            isinstance(value, expected) and not isinstance(value, bool)
+            for value, expected in zip(values, types)
+        )
+    ):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def statement_to_dict(statement: models.BankStatement) -> dict:
+    """
+    Maps a stored statement to the keys used by the parse response.
+
+    Args:
+        statement (models.BankStatement): The stored statement.
+
+    Returns:
+        dict: The statement without its transactions.
+    """
+    return {
+        "id": statement.id,
+        "financialInstitutionName": statement.financial_institution_name,
+        "FIO": statement.full_name,
+        "cardNumber": statement.card_number,
+        "IBAN": statement.iban,
+        "currency": statement.currency,
+        "fromDate": statement.from_date,
+        "toDate": statement.to_date,
+        "cardBalanceDateFrom": statement.card_balance_date_from,
+        "cardBalanceDateUntil": statement.card_balance_date_until,
+        "Replenishments": statement.replenishments,
+        "Transfers": statement.transfers,
+        "Purchases": statement.purchases,
+        "Withdrawals": statement.withdrawals,
+        "Others": statement.others,
+    }
+
+
+def statement_transaction_selects(statement_id: int) -> list[tuple]:
+    """
+    Builds the selects of the transactions of a statement: those stored with it
+    and those linked to it by incremental ingestion. Each one reads its own
+    (bank_statement_id, operation_date, id) index, of transaction_details and of
+    statement_transactions, so callers combine them with UNION ALL rather than
+    with an OR that neither index can serve.
+
+    Args:
+        statement_id (int): The id of the statement.
+
+    Returns:
+        list[tuple]: For each select, the select of the id, operation_date, amount,
+                     transaction_type and detail columns, and its operation date
+                     and id columns to filter and order on.
+    """
+    detail = models.TransactionDetail
+    link = models.StatementTransaction
+    columns = (detail.amount, detail.transaction_type, detail.detail)
+    own = select(detail.id, detail.operation_date, *columns).where(
+        detail.bank_statement_id == statement_id
+    )
+    linked = (
+        select(detail.id, link.operation_date, *columns)
+        .join_from(link, detail, link.transaction_detail_id == detail.id)
+        .where(link.bank_statement_id == statement_id)
+    )
+    return [
+        (own, detail.operation_date, detail.id),
+        (linked, link.operation_date, link.transaction_detail_id),
+    ]
+
+
+def statement_transactions(statement_id: int):
+    """
+    Builds the subquery of every transaction of a statement, stored with it or
+    linked to it, with the columns of `statement_transaction_selects`.
+
+    Args:
+        statement_id (int): The id of the statement.
+
+    Returns:
+        Subquery: The UNION ALL of the selects.
+    """
+    return union_all(
+        *(query for query, _, _ in statement_transaction_selects(statement_id))
+    ).subquery()
+
+
+def list_statements(
+    db,
+    limit: int,
+    iban: str | None = None,
+    card_number: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: str | None = None,
+) -> dict:
+    """
+    Returns one page of stored statements ordered by id, using keyset pagination.
+
+    Args:
+        db: A database session.
+        limit (int): The maximum number of statements returned.
+        iban (str, optional): Only statements of this IBAN.
+        card_number (str, optional): Only statements of this card.
+        date_from (date, optional): Only statements whose period ends on or after this date.
+        date_to (date, optional): Only statements whose period starts on or before this date.
+        after (str, optional): The cursor returned with the previous page.
+
+    Returns:
+        dict: The statements under "items" and the cursor of the next page under
+              "next_cursor", which is None on the last page.
+    """
+    query = select(models.BankStatement)
+    if iban is not None:
+        query = query.where(models.BankStatement.iban == iban)
+    if card_number is not None:
+        query = query.where(models.BankStatement.card_number == card_number)
+    if date_from is not None:
+        query = query.where(models.BankStatement.to_date >= date_from)
+    if date_to is not None:
+        query = query.where(models.BankStatement.from_date <= date_to)
+    if after is not None:
+        (last_id,) = decode_cursor(after, (int,))
+        query = query.where(models.BankStatement.id > last_id)
+    statements = (
+        db.execute(query.order_by(models.BankStatement.id).limit(limit + 1))
+        .scalars()
+        .all()
+    )
+    next_cursor = None
+    if len(statements) > limit:
+        statements = statements[:limit]
+        next_cursor = encode_cursor([statements[-1].id])
+    return {
+        "items": [statement_to_dict(statement) for statement in statements],
+        "next_cursor": next_cursor,
+    }
+
+
+def list_transactions(
+    db,
+    statement_id: int,
+    limit: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    transaction_type: str | None = None,
+    after: str | None = None,
+) -> dict:
+    """
+    Returns one page of the transactions of a statement ordered by operation date
+    and id, using keyset pagination on the (bank_statement_id, operation_date, id) index.
+    Transactions stored with an earlier statement and linked to this one by
+    incremental ingestion are included: the page is the UNION ALL of one page of
+    each select of `statement_transaction_selects`, merged and cut to `limit`.
+
+    Args:
+        db: A database session.
+        statement_id (int): The id of the statement.
+        limit (int): The maximum number of transactions returned.
+        date_from (date, optional): Only transactions on or after this date.
+        date_to (date, optional): Only transactions on or before this date.
+        transaction_type (str, optional): Only transactions of this type.
+        after (str, optional): The cursor returned with the previous page.
+
+    Returns:
+        dict: The transactions under "items" and the cursor of the next page under
+              "next_cursor", which is None on the last page.
+    """
+    if after is not None:
+        last_date, last_id = decode_cursor(after, (str, int))
+        try:
+            last_date = datetime.fromisoformat(last_date)
+        except ValueError as error:
+            raise ValueError(f"Invalid cursor: {after}") from error
+    pages = []
+    for query, operation_date, transaction_id in statement_transaction_selects(
+        statement_id
+    ):
+        if date_from is not None:
+            query = query.where(
+                operation_date >= datetime.combine(date_from, datetime.min.time())
+            )
+        if date_to is not None:
+            query = query.where(
+                operation_date
+                < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+            )
+        if transaction_type is not None:
+            query = query.where(
+                models.TransactionDetail.transaction_type == transaction_type
+            )
+        if after is not None:
+            query = query.where(
+                tuple_(operation_date, transaction_id) > tuple_(last_date, last_id)
+            )
+        page = query.order_by(operation_date, transaction_id).limit(limit + 1)
+        pages.append(select(page.subquery()))
+    page = union_all(*pages).subquery()
+    rows = db.execute(
+        select(page).order_by(page.c.operation_date, page.c.id).limit(limit + 1)
+    ).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].operation_date.isoformat(), rows[-1].id])
+    return {
+        "items": [
+            {
+                "id": row.id,
+                "operationDate": row.operation_date,
+                "amount": row.amount,
+                "transactionType": row.transaction_type,
+                "detail": row.detail,
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_totals(db, statement_id: int) -> list[dict]:
+    """
+    Aggregates the transactions of a statement by type in SQL.
+
+    Args:
+        db: A database session.
+        statement_id (int): The id of the statement.
+
+    Returns:
+        list[dict]: The number of transactions and their total amount per type.
+    """
+    transactions = statement_transactions(statement_id)
+    rows = db.execute(
+        select(
+            transactions.c.transaction_type,
+            func.count(),
+            func.coalesce(func.sum(transactions.c.amount), 0.0),
+        )
+        .group_by(transactions.c.transaction_type)
+        .order_by(transactions.c.transaction_type)
+    ).all()
+    return [
+        {"transactionType": transaction_type, "count": count, "amount": amount}
+        for transaction_type, count, amount in rows
+    ]
+
+
+def get_statement(db, statement_id: int) -> dict | None:
+    """
+    Returns a stored statement without its transactions.
+
+    Args:
+        db: A database session.
+        statement_id (int): The id of the statement.
+
+    Returns:
+        dict | None: The statement, or None if it does not exist.
+    """
+    statement = db.get(models.BankStatement, statement_id)
+    return statement_to_dict(statement) if statement is not None else None
+
+
+def get_rollups(db, statement_id: int) -> dict | None:
+    """
+    Returns the summaries of a stored statement, read from the summary tables,
+    and their reconciliation with the totals printed in the statement header.
+    No transaction is read.
+
+    Args:
+        db: A database session.
+        statement_id (int): The id of the statement.
+
+    Returns:
+        dict | None: The monthly inflow, outflow and closing balance, the totals
+                     per transaction type, the top counterparties and the
+                     reconciliation, or None if the statement does not exist.
+                     "monthly" is empty if the summaries were never computed.
+    """
+    statement = get_statement(db, statement_id)
+    if statement is None:
+        return None
+    monthly = [
+        row._asdict()
+        for row in db.execute(
+            select(
+                models.StatementMonthlyRollup.month,
+                models.StatementMonthlyRollup.inflow,
+                models.StatementMonthlyRollup.outflow,
+                models.StatementMonthlyRollup.net,
+                models.StatementMonthlyRollup.transactions,
+                models.StatementMonthlyRollup.closing_balance,
+            )
+            .where(models.StatementMonthlyRollup.bank_statement_id == statement_id)
+            .order_by(models.StatementMonthlyRollup.month)
+        )
+    ]
+    types = [
+        row._asdict()
+        for row in db.execute(
+            select(
+                models.StatementTypeRollup.transaction_type,
+                models.StatementTypeRollup.category,
+                models.StatementTypeRollup.total,
+                models.StatementTypeRollup.transactions,
+            )
+            .where(models.StatementTypeRollup.bank_statement_id == statement_id)
+            .order_by(models.StatementTypeRollup.transaction_type)
+        )
+    ]
+    counterparties = db.execute(
+        select(models.StatementCounterpartyRollup)
+        .where(models.StatementCounterpartyRollup.bank_statement_id == statement_id)
+        .order_by(models.StatementCounterpartyRollup.rank)
+    ).scalars()
+    return {
+        "id": statement_id,
+        "monthly": [
+            {
+                "month": row["month"],
+                "inflow": row["inflow"],
+                "outflow": row["outflow"],
+                "net": row["net"],
+                "count": row["transactions"],
+                "closingBalance": row["closing_balance"],
+            }
+            for row in monthly
+        ],
+        "totals": [
+            {
+                "transactionType": row["transaction_type"],
+                "category": row["category"],
+                "count": row["transactions"],
+                "amount": row["total"],
+            }
+            for row in types
+        ],
+        "counterparties": [
+            {
+                "rank": counterparty.rank,
+                "counterparty": counterparty.counterparty,
+                "inflow": counterparty.inflow,
+                "outflow": counterparty.outflow,
+                "net": counterparty.total,
+                "count": counterparty.transactions,
+            }
+            for counterparty in counterparties
+        ],
+        "reconciliation": rollups.reconcile(statement, types, monthly),
+    }
@@ -0,0 +1,56 @@
+import orjson
+from fastapi.responses import Response
+
+from src.kaspi_parser import transactions
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(value):
+    if isinstance(value, transactions.TransactionTable):
+        return value.to_dicts()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content, newline: bool = False) -> bytes:
+    """
+    Serialises content to JSON with orjson. Datetimes are written natively in
+    ISO 8601, and a `TransactionTable` is written as a list of transaction dicts.
+
+    Args:
+        content: The content to serialise.
+        newline (bool, optional): Whether to append a newline, as NDJSON lines need.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    return orjson.dumps(
+        content, default=_default, option=orjson.OPT_APPEND_NEWLINE if newline else 0
+    )
+
+
+class JSONResponse(Response):
+    """
+    A JSON response rendered with `dumps`.
+
+    Endpoints return it directly instead of a dict, so FastAPI does not run
+    `jsonable_encoder` over every transaction before serialising.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def accepts_ndjson(accept: str | None) -> bool:
+    """
+    Tells whether a client asked for an NDJSON stream.
+
+    Args:
+        accept (str | None): The value of the Accept header.
+
+    Returns:
+        bool: True if the header lists application/x-ndjson.
+    """
+    return NDJSON_MEDIA_TYPE in (accept or "")
@@ -0,0 +1,203 @@
+from collections.abc import Iterable
+from datetime import date
+
+from src.kaspi_parser import config
+
+# The statement total each transaction type adds up to, in both languages.
+TRANSACTION_CATEGORIES = {
+    "Пополнение": "Replenishments",
+    "Толықтыру": "Replenishments",
+    "Перевод": "Transfers",
+    "Аударым": "Transfers",
+    "Покупка": "Purchases",
+    "Зат сатып алу": "Purchases",
+    "Снятие": "Withdrawals",
+    "Ақша алу": "Withdrawals",
+    "Разное": "Others",
+    "Əртүрлі": "Others",
+}
+CATEGORIES = ("Replenishments", "Transfers", "Purchases", "Withdrawals", "Others")
+
+
+class RollupBuilder:
+    """
+    A class to compute the summaries of a statement while its transactions are
+    being stored: inflow, outflow and closing balance per month, totals per
+    transaction type and the top counterparties.
+
+    Transactions are added in chunks, as they are inserted, so "Details" is read
+    once even when it is a lazy iterator. Each chunk is folded into running
+    totals keyed by month, transaction type and counterparty, so memory grows
+    with the number of groups, not with the number of transactions.
+    """
+
+    def __init__(
+        self, top_counterparties: int = config.ROLLUP_TOP_COUNTERPARTIES
+    ) -> None:
+        """
+        Initializes a new instance of the RollupBuilder class.
+
+        Args:
+            top_counterparties (int): The number of counterparties kept, by turnover.
+        """
+        self.top_counterparties = top_counterparties
+        # [inflow, outflow, net, transactions] per group.
+        self.months = {}
+        self.types = {}
+        self.counterparties = {}
+
+    def add(self, rows: Iterable[tuple]) -> None:
+        """
+        Adds transactions to the statement.
+
+        Args:
+            rows (Iterable[tuple]): Rows starting with the operation date, amount,
+                                    transaction type and description, e.g. as yielded
+                                    by `transactions.iter_fingerprinted_rows`.
+        """
+        for operation_date, amount, transaction_type, detail, *_ in rows:
+            inflow = max(amount, 0.0)
+            outflow = min(amount, 0.0)
+            month = (operation_date.year, operation_date.month)
+            for groups, key in (
+                (self.months, month),
+                (self.types, transaction_type),
+                (self.counterparties, detail),
+            ):
+                totals = groups.get(key)
+                if totals is None:
+                    totals = groups[key] = [0.0, 0.0, 0.0, 0]
+                totals[0] += inflow
+                totals[1] += outflow
+                totals[2] += amount
+                totals[3] += 1
+
+    def build(
+        self, from_date: date, to_date: date, opening_balance: float | None
+    ) -> dict[str, list[dict]]:
+        """
+        Computes the summaries of the transactions added so far.
+
+        Every month of the statement period gets a row, including months without
+        transactions, so the closing balances form a complete trajectory.
+
+        Args:
+            from_date (date): The first day of the statement period.
+            to_date (date): The last day of the statement period.
+            opening_balance (float | None): The balance at the start of the period.
+
+        Returns:
+            dict[str, list[dict]]: The rows of the "monthly", "types" and
+                                   "counterparties" summary tables, without the
+                                   statement id.
+        """
+        months = set(self.months)
+        year, month = from_date.year, from_date.month
+        while (year, month) <= (to_date.year, to_date.month):
+            months.add((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        monthly = []
+        closing_balance = opening_balance or 0.0
+        for year, month in sorted(months):
+            inflow, outflow, net, count = self.months.get(
+                (year, month), (0.0, 0.0, 0.0, 0)
+            )
+            closing_balance += net
+            monthly.append(
+                {
+                    "month": date(year, month, 1),
+                    "inflow": round(inflow, 2),
+                    "outflow": round(outflow, 2),
+                    "net": round(net, 2),
+                    "transactions": count,
+                    "closing_balance": round(closing_balance, 2),
+                }
+            )
+
+        counterparties = sorted(
+            self.counterparties.items(),
+            key=lambda item: (item[1][1] - item[1][0], item[0]),
+        )[: self.top_counterparties]
+
+        return {
+            "monthly": monthly,
+            "types": [
+                {
+                    "transaction_type": transaction_type,
+                    "category": TRANSACTION_CATEGORIES.get(transaction_type, "Others"),
+                    "total": round(total, 2),
+                    "transactions": count,
+                }
+                for transaction_type, (_, _, total, count) in sorted(self.types.items())
+            ],
+            "counterparties": [
+                {
+                    "rank": rank,
+                    "counterparty": counterparty,
+                    "inflow": round(inflow, 2),
+                    "outflow": round(outflow, 2),
+                    "total": round(total, 2),
+                    "transactions": count,
+                }
+                for rank, (counterparty, (inflow, outflow, total, count)) in enumerate(
+                    counterparties, start=1
+                )
+            ],
+        }
+
+
+def reconcile(
+    statement: dict,
+    types: list[dict],
+    monthly: list[dict],
+    tolerance: float = config.ROLLUP_RECONCILE_TOLERANCE,
+) -> list[dict]:
+    """
+    Compares the summaries of a statement with the totals printed in its header.
+
+    Args:
+        statement (dict): The statement, with the "Replenishments", "Transfers",
+                          "Purchases", "Withdrawals", "Others" and
+                          "cardBalanceDateUntil" keys of the parse response.
+        types (list[dict]): The rows of the "types" summary.
+        monthly (list[dict]): The rows of the "monthly" summary, in month order.
+        tolerance (float, optional): The largest difference still reconciled.
+
+    Returns:
+        list[dict]: One entry per category and one for the closing balance, with
+                    the printed and computed totals, their difference and whether
+                    they reconcile.
+    """
+    computed = dict.fromkeys(CATEGORIES, 0.0)
+    for row in types:
+        computed[row["category"]] += row["total"]
+    totals = [
+        (category, statement[category], computed[category]) for category in CATEGORIES
+    ]
+    if monthly:
+        totals.append(
+            (
+                "Balance",
+                statement["cardBalanceDateUntil"],
+                monthly[-1]["closing_balance"],
+            )
+        )
+
+    reconciliation = []
+    for category, statement_total, computed_total in totals:
+        difference = (
+            round(computed_total - statement_total, 2)
+            if statement_total is not None
+            else None
+        )
+        reconciliation.append(
+            {
+                "category": category,
+                "statementTotal": statement_total,
+                "computedTotal": round(computed_total, 2),
+                "difference": difference,
+                "reconciled": difference is not None and abs(difference) <= tolerance,
+            }
+        )
+    return reconciliation
@@ -1,46 +1,910 @@
-import base64
+import asyncio
+import itertools
+import logging
+import time
 import uuid
+from datetime import date
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from starlette.datastructures import UploadFile
 
-from src.kaspi_parser import config
-from src.kaspi_parser import models
-from src.kaspi_parser import util
+from src.kaspi_parser import (
+    cache,
+    config,
+    executor,
+    exporters,
+    jobs,
+    metrics,
+    models,
+    queries,
+    responses,
+    util,
+    writer,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 bank_statement = util.BankStatement()
 file_processor = util.FileProcessor()
 record = util.Record()
+parse_executor = executor.Executor()
+parse_cache = cache.ParseCache()
+write_queue = writer.WriteBehindQueue(record=record)
 
 
-@router.post("/parse-statement/")
-async def parse_statement(request: models.PDFRequest):
+def get_cache_key(upload: util.SpooledUpload) -> str:
+    """
+    Builds the parse cache key of an upload. The extraction mode is part of the
+    parser version, since the two modes may read a document differently.
+
+    Args:
+        upload (util.SpooledUpload): The buffered PDF document.
+
+    Returns:
+        str: The cache key.
+    """
+    return parse_cache.make_key(
+        upload.hexdigest(), f"{util.PARSER_VERSION}-{config.EXTRACTION_MODE}"
+    )
+
+
+async def process_statement(
+    upload: util.SpooledUpload,
+    to_excel: bool,
+    dry_run: bool,
+    timings: dict | None = None,
+    cache: str = "use",
+    write_behind: bool = False,
+    export_format: str = "xlsx",
+    incremental: bool = False,
+    cancellation: jobs.Cancellation | None = None,
+) -> dict:
+    """
+    Parses a buffered statement and runs the optional Excel export and DB insert.
+
+    Args:
+        upload (util.SpooledUpload): The buffered PDF document.
+        to_excel (bool): Whether to export the parsed statement to a file.
+        dry_run (bool): Whether to skip inserting the parsed statement into the database.
+        timings (dict, optional): If given, filled with the duration of each step in seconds.
+        cache (str, optional): "use" to serve the statement from the parse cache when
+                               possible, "bypass" to always parse it. The fresh result
+                               is stored in the cache in both cases.
+        write_behind (bool, optional): Whether to queue the DB insert and respond
+                                       before it is done.
+        export_format (str, optional): The format of the exported file. Defaults to "xlsx".
+        incremental (bool, optional): Whether to store only the transactions not
+                                      already stored for the same IBAN.
+        cancellation (jobs.Cancellation, optional): For a background job, committed
+                                                    before the export and DB insert.
+
+    Returns:
+        dict: The response body.
+
+    Raises:
+        ValueError: If both write_behind and incremental are set, or the export
+                    format is not available.
+        jobs.JobCancelledError: If the job timed out before the export and DB insert.
+    """
+    check_ingest_options(write_behind, incremental)
+    if to_excel:
+        exporters.get_exporter(export_format)
+    timings = {} if timings is None else timings
     file_path = ""
-    try:
-        config.logging.info(
-            f"Starting to parse PDF for base64 input: {request.base64_pdf[:50]}..."
+    started = time.perf_counter()
+    metrics.observe("kaspi_parser_bytes_processed", upload.size, stage="upload")
+    cache_key = get_cache_key(upload)
+    statement_data = None
+    if cache != "bypass":
+        with metrics.stage("cache"):
+            statement_data = await run_in_threadpool(parse_cache.get, cache_key)
+    if statement_data is None:
+        statement_data = await parse_upload(upload)
+        await run_in_threadpool(parse_cache.set, cache_key, statement_data)
+    else:
+        logger.info("Parse cache hit: %s", cache_key)
+    timings["parse"] = time.perf_counter() - started
+    success = bool(statement_data)
+    logger.info("PDF parsing successful: %s", success)
+    if cancellation is not None:
+        cancellation.commit()
+    file_path, status, ingest = await finish_statement(
+        statement_data,
+        to_excel=to_excel and success,
+        dry_run=dry_run or not success,
+        timings=timings,
+        write_behind=write_behind,
+        export_format=export_format,
+        incremental=incremental,
+    )
+    result = {
+        "success": success,
+        "msg": None,
+        "msgType": None,
+        "status": status,
+        "excel_path": file_path,
+        "data": statement_data,
+    }
+    if ingest is not None:
+        result["ingest"] = ingest
+    return result
+
+
+async def parse_upload(upload: util.SpooledUpload) -> dict:
+    """
+    Parses a buffered statement on the parse executor, with a columnar "Details".
+    With the process backend and text extraction, statements of at least
+    config.PARALLEL_PARSE_MIN_PAGES pages are split into page ranges parsed by
+    several workers at once.
+
+    Args:
+        upload (util.SpooledUpload): The buffered PDF document.
+
+    Returns:
+        dict: The parsed statement.
+    """
+    source = upload.as_source()
+    if (
+        config.PARALLEL_PARSE_MIN_PAGES > 0
+        and parse_executor.backend == "process"
+        and config.EXTRACTION_MODE == "text"
+    ):
+        page_count = await run_in_threadpool(bank_statement.get_page_count, **source)
+        if page_count >= config.PARALLEL_PARSE_MIN_PAGES:
+            return await parse_page_ranges(source, page_count)
+    return await parse_executor.run(
+        bank_statement.parse_statement, columnar=True, **source
+    )
+
+
+async def parse_page_ranges(source: dict, page_count: int) -> dict:
+    """
+    Parses a statement as page ranges on the process pool, each worker opening
+    the document itself, and joins their transactions in page order.
+
+    Args:
+        source (dict): The document, as returned by `util.SpooledUpload.as_source`.
+        page_count (int): The number of pages of the document.
+
+    Returns:
+        dict: The parsed statement, as returned by `parse_statement` with columnar=True.
+    """
+    with metrics.stage("parse"):
+        layout, header = await run_in_threadpool(bank_statement.read_header, **source)
+        page_ranges = bank_statement.plan_page_ranges(
+            page_count,
+            parse_executor.max_workers,
+            config.PARALLEL_PARSE_MIN_RANGE_PAGES,
         )
-        pdf_bytes = base64.b64decode(request.base64_pdf)
-        statement_data = bank_statement.parse_statement(file_bytes=pdf_bytes)
-        success = True if statement_data else False
-        config.logging.info(f"PDF parsing successful: {success}")
+        ranges = await asyncio.gather(
+            *(
+                parse_executor.run(
+                    bank_statement.scan_page_range, start, stop, layout.name, **source
+                )
+                for start, stop in page_ranges
+            )
+        )
+        details = await run_in_threadpool(
+            bank_statement.get_table,
+            statements=bank_statement.merge_page_ranges(ranges, layout),
+        )
+    logger.info(
+        "Parsed %d pages as %d ranges in parallel", page_count, len(page_ranges)
+    )
+    metrics.observe("kaspi_parser_statement_pages", page_count)
+    metrics.observe("kaspi_parser_statement_transactions", len(details))
+    return bank_statement.make_result(header, details)
+
+
+def check_ingest_options(write_behind: bool, incremental: bool) -> None:
+    """
+    Rejects option combinations the DB insert does not support.
+
+    Args:
+        write_behind (bool): Whether the DB insert is queued.
+        incremental (bool): Whether the DB insert is incremental.
+
+    Raises:
+        ValueError: If both options are set.
+    """
+    if write_behind and incremental:
+        raise ValueError("incremental ingestion cannot be combined with write_behind")
+
+
+async def finish_statement(
+    statement_data: dict,
+    to_excel: bool,
+    dry_run: bool,
+    timings: dict,
+    write_behind: bool = False,
+    export_format: str = "xlsx",
+    incremental: bool = False,
+) -> tuple[str, str | None, dict | None]:
+    """
+    Runs the optional export and DB insert of a parsed statement.
+
+    Args:
+        statement_data (dict): The parsed statement.
+        to_excel (bool): Whether to export the statement to a file.
+        dry_run (bool): Whether to skip inserting the statement into the database.
+        timings (dict): Filled with the duration of each step in seconds.
+        write_behind (bool, optional): Whether to queue the DB insert instead of waiting for it.
+        export_format (str, optional): The format of the exported file. Defaults to "xlsx".
+        incremental (bool, optional): Whether to store only the transactions not
+                                      already stored for the same IBAN.
 
-        if request.to_excel is True and success is True:
+    Returns:
+        tuple[str, str | None, dict | None]: The path of the exported file, or "" if
+                                             there is none, the DB status: "queued",
+                                             "persisted" or None, and the number of
+                                             new and deduplicated transactions of an
+                                             incremental insert.
+    """
+    file_path = ""
+    if to_excel is True:
+        file_id = str(uuid.uuid4()).replace("-", "_")
+        file_path = f"{config.EXPORT_DIR}/statement_{file_id}.{export_format}"
+        started = time.perf_counter()
+        await parse_executor.run(
+            file_processor.export,
+            statement_data=statement_data,
+            file_path=file_path,
+            export_format=export_format,
+        )
+        timings["excel"] = time.perf_counter() - started
+        logger.info("Export file generated: %s", file_path)
+    status = ingest = None
+    if dry_run is False and write_behind is True:
+        started = time.perf_counter()
+        await write_queue.put(statement_data)
+        timings["db"] = time.perf_counter() - started
+        status = "queued"
+        logger.info("Record queued for database insert.")
+    elif dry_run is False:
+        logger.info("Dry run is False, inserting record into database...")
+        started = time.perf_counter()
+        if incremental:
+            result = await run_in_threadpool(
+                record.ingest_record, statement_data=statement_data
+            )
+            ingest = {"new": result["new"], "deduplicated": result["deduplicated"]}
+        else:
+            await run_in_threadpool(record.insert_record, statement_data=statement_data)
+        timings["db"] = time.perf_counter() - started
+        status = "persisted"
+        logger.info("Record inserted into database successfully.")
+    return file_path, status, ingest
+
+
+async def stream_statement(
+    upload: util.SpooledUpload,
+    to_excel: bool,
+    dry_run: bool,
+    cache: str = "use",
+    write_behind: bool = False,
+    export_format: str = "xlsx",
+    incremental: bool = False,
+) -> StreamingResponse:
+    """
+    Parses a buffered statement lazily and streams it as NDJSON: the statement
+    header on the first line, then one transaction per line as pages are parsed,
+    then a summary line with "success", "status", "excel_path" and, for an
+    incremental insert, "ingest". The optional export and DB insert are fed the
+    transactions as they are sent. A queued (write_behind) insert needs the whole
+    statement, so it is rejected.
+
+    A parse cache hit is streamed from the cache, but a fresh lazy parse is not
+    stored in it. The stream owns the upload and closes it when it ends.
+
+    Args:
+        upload (util.SpooledUpload): The buffered PDF document.
+        to_excel (bool): Whether to export the parsed statement to a file.
+        dry_run (bool): Whether to skip inserting the parsed statement into the database.
+        cache (str, optional): "use" to serve the statement from the parse cache when
+                               possible, "bypass" to always parse it.
+        write_behind (bool, optional): Whether to queue the DB insert. Not supported.
+        export_format (str, optional): The format of the exported file. Defaults to "xlsx".
+        incremental (bool, optional): Whether to store only new transactions.
+
+    Returns:
+        StreamingResponse: The application/x-ndjson response.
+
+    Raises:
+        ValueError: If write_behind is set for a statement that is not a dry run,
+                    or the export format is not available.
+    """
+    try:
+        if write_behind and not dry_run:
+            raise ValueError("write_behind is not supported when streaming")
+        if to_excel:
+            exporters.get_exporter(export_format)
+        metrics.observe("kaspi_parser_bytes_processed", upload.size, stage="upload")
+        statement_data = None
+        if cache != "bypass":
+            cache_key = get_cache_key(upload)
+            statement_data = await run_in_threadpool(parse_cache.get, cache_key)
+        if statement_data is None:
+            statement_data = await run_in_threadpool(
+                bank_statement.parse_statement, lazy=True, **upload.as_source()
+            )
+    except Exception:
+        upload.close()
+        raise
+    return StreamingResponse(
+        iter_ndjson(
+            statement_data,
+            upload,
+            to_excel=to_excel,
+            dry_run=dry_run,
+            export_format=export_format,
+            incremental=incremental,
+        ),
+        media_type=responses.NDJSON_MEDIA_TYPE,
+    )
+
+
+async def iter_ndjson(
+    statement_data: dict,
+    upload: util.SpooledUpload,
+    to_excel: bool,
+    dry_run: bool,
+    export_format: str,
+    incremental: bool = False,
+):
+    """
+    Yields the NDJSON lines of `stream_statement`, NDJSON_BATCH_SIZE transactions
+    at a time. The export and DB insert read the same batches through bounded
+    channels while they are sent, so the transactions are never all held in
+    memory. An error after the first line is reported on a last line with
+    "success": false, since the response status has already been sent.
+    """
+    header = {key: value for key, value in statement_data.items() if key != "Details"}
+    sinks = {}
+    file_path = ""
+    try:
+        details = iter(statement_data["Details"])
+        yield responses.dumps(header, newline=True)
+        if to_excel is True:
             file_id = str(uuid.uuid4()).replace("-", "_")
-            file_path = f"assets/output/statement_{file_id}.xlsx"
-            file_processor.to_excel(statement_data=statement_data, file_path=file_path)
-            config.logging.info(f"Excel file generated: {file_path}")
-        if request.dry_run is False and success is True:
-            config.logging.info("Dry run is False, inserting record into database...")
-            record.insert_record(statement_data=statement_data)
-            config.logging.info("Record inserted into database successfully.")
-        return {
-            "success": success,
-            "msg": None,
-            "msgType": None,
+            file_path = f"{config.EXPORT_DIR}/statement_{file_id}.{export_format}"
+            sinks["excel"] = start_sink(
+                file_processor.export,
+                header,
+                file_path=file_path,
+                export_format=export_format,
+            )
+        if dry_run is False:
+            sinks["db"] = start_sink(
+                record.ingest_record if incremental else record.insert_record, header
+            )
+        while batch := await run_in_threadpool(
+            list, itertools.islice(details, config.NDJSON_BATCH_SIZE)
+        ):
+            for channel, _ in sinks.values():
+                await run_in_threadpool(channel.put, batch)
+            yield b"".join(responses.dumps(row, newline=True) for row in batch)
+        for channel, _ in sinks.values():
+            await run_in_threadpool(channel.close)
+        results = dict(
+            zip(sinks, await asyncio.gather(*(task for _, task in sinks.values())))
+        )
+        summary = {
+            "success": True,
+            "status": "persisted" if "db" in results else None,
             "excel_path": file_path,
-            "data": statement_data,
         }
+        if incremental and "db" in results:
+            summary["ingest"] = {
+                "new": results["db"]["new"],
+                "deduplicated": results["db"]["deduplicated"],
+            }
+        yield responses.dumps(summary, newline=True)
+    except SQLAlchemyError:
+        logger.exception("Error storing streamed statement")
+        yield responses.dumps(
+            {
+                "success": False,
+                "msg": "Error storing statement",
+                "msgType": "error",
+            },
+            newline=True,
+        )
+    except Exception as error:
+        logger.exception("Error streaming PDF")
+        yield responses.dumps(
+            {
+                "success": False,
+                "msg": f"Error parsing PDF: {error}",
+                "msgType": "error",
+            },
+            newline=True,
+        )
+    finally:
+        for channel, task in sinks.values():
+            if not task.done():
+                channel.abort(RuntimeError("The statement stream ended early"))
+            task.add_done_callback(discard_result)
+        upload.close()
+
+
+def start_sink(func, header: dict, **kwargs) -> tuple[util.BatchChannel, asyncio.Task]:
+    """
+    Starts a consumer of the transactions of a streamed statement in a worker thread.
+
+    Args:
+        func: A function taking the statement as a `statement_data` keyword argument.
+        header (dict): The statement without "Details".
+        **kwargs: Further keyword arguments of `func`.
+
+    Returns:
+        tuple[util.BatchChannel, asyncio.Task]: The channel to feed the batches to,
+                                                and the task of the consumer.
+    """
+    channel = util.BatchChannel()
+    task = asyncio.create_task(
+        run_in_threadpool(channel.consume, func, header, **kwargs)
+    )
+    return channel, task
+
+
+def discard_result(task: asyncio.Task) -> None:
+    """
+    Retrieves the outcome of an abandoned task, so its error is not reported as
+    never retrieved.
+
+    Args:
+        task (asyncio.Task): The finished task.
+    """
+    if not task.cancelled():
+        task.exception()
+
+
+@router.post("/parse-statement/")
+async def parse_statement(request: models.PDFRequest, http_request: Request):
+    """
+    Parses a base64 encoded PDF. Responds with NDJSON, streamed as the pages are
+    parsed, if the Accept header asks for application/x-ndjson.
+    """
+    try:
+        logger.info(
+            "Starting to parse PDF from %d base64 characters", len(request.base64_pdf)
+        )
+        with util.SpooledUpload() as upload:
+            upload.write_base64(request.base64_pdf)
+            if responses.accepts_ndjson(http_request.headers.get("accept")):
+                return await stream_statement(
+                    upload.detach(),
+                    to_excel=request.to_excel,
+                    dry_run=request.dry_run,
+                    cache=request.cache,
+                    write_behind=request.write_behind,
+                    export_format=request.export_format,
+                    incremental=request.incremental,
+                )
+            result = await process_statement(
+                upload,
+                to_excel=request.to_excel,
+                dry_run=request.dry_run,
+                cache=request.cache,
+                write_behind=request.write_behind,
+                export_format=request.export_format,
+                incremental=request.incremental,
+            )
+            return responses.JSONResponse(result)
+    except writer.QueueFullError as error:
+        logger.error("Error queueing record: %s", error)
+        raise HTTPException(
+            status_code=503, detail=str(error), headers={"Retry-After": "1"}
+        )
+    except SQLAlchemyError:
+        logger.exception("Error storing statement")
+        raise HTTPException(status_code=500, detail="Error storing statement")
+    except Exception as error:
+        logger.exception("Error parsing PDF")
+        raise HTTPException(status_code=400, detail=f"Error parsing PDF: {error}")
+
+
+@router.post("/parse-statement/upload")
+async def parse_statement_upload(
+    request: Request,
+    to_excel: bool = False,
+    dry_run: bool = False,
+    cache: Literal["use", "bypass"] = "use",
+    write_behind: bool = False,
+    export_format: Literal["xlsx", "csv", "parquet"] = "xlsx",
+    incremental: bool = False,
+):
+    """
+    Parses a PDF sent either as a multipart/form-data "file" field or as a raw
+    application/pdf body. The upload is spooled to disk above UPLOAD_SPOOL_MAX_SIZE.
+    Responds with NDJSON if the Accept header asks for application/x-ndjson.
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith(("multipart/form-data", "application/pdf")):
+        raise HTTPException(
+            status_code=415,
+            detail="Expected multipart/form-data or application/pdf body",
+        )
+    try:
+        with util.SpooledUpload() as upload:
+            if content_type.startswith("multipart/form-data"):
+                async with request.form() as form:
+                    file = form.get("file")
+                    if not isinstance(file, UploadFile):
+                        raise TypeError("Multipart body must contain a 'file' field")
+                    while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+                        upload.write(chunk)
+            else:
+                async for chunk in request.stream():
+                    upload.write(chunk)
+            logger.info("Starting to parse uploaded PDF of %d bytes", upload.size)
+            if responses.accepts_ndjson(request.headers.get("accept")):
+                return await stream_statement(
+                    upload.detach(),
+                    to_excel=to_excel,
+                    dry_run=dry_run,
+                    cache=cache,
+                    write_behind=write_behind,
+                    export_format=export_format,
+                    incremental=incremental,
+                )
+            result = await process_statement(
+                upload,
+                to_excel=to_excel,
+                dry_run=dry_run,
+                cache=cache,
+                write_behind=write_behind,
+                export_format=export_format,
+                incremental=incremental,
+            )
+            return responses.JSONResponse(result)
+    except writer.QueueFullError as error:
+        logger.error("Error queueing record: %s", error)
+        raise HTTPException(
+            status_code=503, detail=str(error), headers={"Retry-After": "1"}
+        )
+    except SQLAlchemyError:
+        logger.exception("Error storing statement")
+        raise HTTPException(status_code=500, detail="Error storing statement")
     except Exception as error:
-        config.logging.error(f"Error parsing PDF: {error}")
+        logger.exception("Error parsing PDF")
         raise HTTPException(status_code=400, detail=f"Error parsing PDF: {error}")
+
+
+@router.post("/parse-statement/export")
+async def export_statement(request: models.PDFRequest):
+    """
+    Parses a statement and streams it back as a file in request.export_format
+    instead of writing it under config.EXPORT_DIR.
+    """
+    try:
+        exporter = exporters.get_exporter(request.export_format)
+        with util.SpooledUpload() as upload:
+            upload.write_base64(request.base64_pdf)
+            result = await process_statement(
+                upload,
+                to_excel=False,
+                dry_run=request.dry_run,
+                cache=request.cache,
+                write_behind=request.write_behind,
+                incremental=request.incremental,
+            )
+    except writer.QueueFullError as error:
+        logger.error("Error queueing record: %s", error)
+        raise HTTPException(
+            status_code=503, detail=str(error), headers={"Retry-After": "1"}
+        )
+    except SQLAlchemyError:
+        logger.exception("Error storing statement")
+        raise HTTPException(status_code=500, detail="Error storing statement")
+    except Exception as error:
+        logger.exception("Error parsing PDF")
+        raise HTTPException(status_code=400, detail=f"Error parsing PDF: {error}")
+    return StreamingResponse(
+        exporter.stream(result["data"]),
+        media_type=exporter.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="statement.{exporter.extension}"'
+        },
+    )
+
+
+async def parse_document(document: models.PDFRequest, dry_run: bool) -> dict:
+    """
+    Parses one document of a batch, turning any error into a per-document result.
+
+    Args:
+        document (models.PDFRequest): The document to parse.
+        dry_run (bool): Whether to skip inserting the parsed statement into the database.
+
+    Returns:
+        dict: The per-document result, including its step timings.
+    """
+    started = time.perf_counter()
+    timings = {}
+    try:
+        with util.SpooledUpload() as upload:
+            upload.write_base64(document.base64_pdf)
+            result = await process_statement(
+                upload,
+                to_excel=document.to_excel,
+                dry_run=dry_run,
+                timings=timings,
+                cache=document.cache,
+                write_behind=document.write_behind,
+                export_format=document.export_format,
+                incremental=document.incremental,
+            )
+    except SQLAlchemyError:
+        logger.exception("Error storing statement in batch")
+        result = {
+            "success": False,
+            "msg": "Error storing statement",
+            "msgType": "error",
+            "excel_path": "",
+            "data": None,
+        }
+    except Exception as error:
+        logger.exception("Error parsing PDF in batch")
+        result = {
+            "success": False,
+            "msg": f"Error parsing PDF: {error}",
+            "msgType": "error",
+            "excel_path": "",
+            "data": None,
+        }
+    timings["total"] = time.perf_counter() - started
+    result["timings"] = timings
+    return result
+
+
+@router.post("/parse-statements/batch")
+async def parse_statements_batch(request: models.BatchPDFRequest):
+    """
+    Parses several statements concurrently. With single_transaction, every
+    successfully parsed document that is not a dry run is written to the
+    database in one transaction once all documents are parsed, and gets the
+    "persisted" status once it commits. If it rolls back, those documents are
+    marked "failed" and the response is a 500. Since the shared transaction
+    replaces the per-document insert, incremental and write_behind are rejected
+    with single_transaction.
+    """
+    if request.single_transaction and any(
+        document.incremental or document.write_behind for document in request.documents
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="incremental and write_behind cannot be used with single_transaction",
+        )
+    logger.info("Starting to parse batch of %s PDFs", len(request.documents))
+    results = await asyncio.gather(
+        *[
+            parse_document(
+                document,
+                dry_run=document.dry_run or request.single_transaction,
+            )
+            for document in request.documents
+        ]
+    )
+    msg = None
+    status_code = 200
+    if request.single_transaction:
+        persisted = [
+            result
+            for document, result in zip(request.documents, results)
+            if result["success"] and document.dry_run is False
+        ]
+        if persisted:
+            try:
+                await run_in_threadpool(
+                    record.insert_records,
+                    statements=[result["data"] for result in persisted],
+                )
+                status = "persisted"
+            except SQLAlchemyError:
+                msg = "Error inserting records"
+                status = "failed"
+                status_code = 500
+            for result in persisted:
+                result["status"] = status
+                if status == "failed":
+                    result["success"] = False
+                    result["msg"] = msg
+                    result["msgType"] = "error"
+    return responses.JSONResponse(
+        {
+            "success": msg is None and all(result["success"] for result in results),
+            "msg": msg,
+            "msgType": "error" if msg else None,
+            "results": results,
+        },
+        status_code=status_code,
+    )
+
+
+@router.get("/statements")
+def list_statements(
+    iban: str | None = None,
+    card_number: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: str | None = None,
+    limit: int = Query(config.READ_PAGE_SIZE, ge=1, le=config.READ_MAX_PAGE_SIZE),
+):
+    """
+    Lists stored statements by IBAN, card and overlapping period. Pass the
+    returned next_cursor as `after` to get the next page.
+    """
+    try:
+        with util.Record.get_db() as db:
+            page = queries.list_statements(
+                db,
+                limit=limit,
+                iban=iban,
+                card_number=card_number,
+                date_from=date_from,
+                date_to=date_to,
+                after=after,
+            )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return responses.JSONResponse(page)
+
+
+@router.get("/statements/{statement_id}")
+def get_statement(statement_id: int):
+    """
+    Returns a stored statement with its totals per transaction type, aggregated in SQL.
+    """
+    with util.Record.get_db() as db:
+        statement = queries.get_statement(db, statement_id)
+        if statement is None:
+            raise HTTPException(status_code=404, detail="Statement not found")
+        statement["totals"] = queries.get_totals(db, statement_id)
+    return responses.JSONResponse(statement)
+
+
+@router.get("/statements/{statement_id}/rollups")
+def get_rollups(statement_id: int):
+    """
+    Returns the summaries of a stored statement computed at ingest: monthly
+    inflow, outflow and closing balance, totals per transaction type, top
+    counterparties, and their reconciliation with the statement totals. Returns
+    404 for statements stored before summaries were computed at ingest, until
+    they are rebuilt with POST.
+    """
+    with util.Record.get_db() as db:
+        summary = queries.get_rollups(db, statement_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Statement not found")
+    if not summary["monthly"]:
+        raise HTTPException(status_code=404, detail="Rollups not computed")
+    return responses.JSONResponse(summary)
+
+
+@router.post("/statements/{statement_id}/rollups")
+def rebuild_rollups(statement_id: int):
+    """
+    Recomputes the summaries of a stored statement from its transactions,
+    replacing any stored ones in a single transaction, and returns them.
+    Returns 409 if they are being rebuilt concurrently.
+    """
+    with util.Record.get_db() as db:
+        if queries.get_statement(db, statement_id) is None:
+            raise HTTPException(status_code=404, detail="Statement not found")
+        try:
+            record.rebuild_rollups(db, statement_id)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            logger.warning("Rollups of statement %s rebuilt concurrently", statement_id)
+            raise HTTPException(
+                status_code=409, detail="Rollups are being rebuilt concurrently"
+            )
+        summary = queries.get_rollups(db, statement_id)
+    return responses.JSONResponse(summary)
+
+
+@router.get("/statements/{statement_id}/transactions")
+def list_transactions(
+    statement_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    transaction_type: str | None = None,
+    after: str | None = None,
+    limit: int = Query(config.READ_PAGE_SIZE, ge=1, le=config.READ_MAX_PAGE_SIZE),
+):
+    """
+    Lists the transactions of a stored statement by date range and type, ordered
+    by operation date. Pass the returned next_cursor as `after` to get the next page.
+    """
+    try:
+        with util.Record.get_db() as db:
+            page = queries.list_transactions(
+                db,
+                statement_id=statement_id,
+                limit=limit,
+                date_from=date_from,
+                date_to=date_to,
+                transaction_type=transaction_type,
+                after=after,
+            )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return responses.JSONResponse(page)
+
+
+job_manager = jobs.JobManager(handler=process_statement)
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(request: models.PDFRequest):
+    """
+    Queues a base64 encoded PDF for background processing and returns the job
+    id at once. Returns 429 with a Retry-After header when the job queue is full.
+    """
+    try:
+        check_ingest_options(request.write_behind, request.incremental)
+        if request.to_excel:
+            exporters.get_exporter(request.export_format)
+        with util.SpooledUpload() as upload:
+            upload.write_base64(request.base64_pdf)
+            job_upload = upload.detach()
+    except Exception as error:
+        logger.exception("Error reading PDF")
+        raise HTTPException(status_code=400, detail=f"Error reading PDF: {error}")
+    try:
+        job = job_manager.submit(
+            job_upload,
+            to_excel=request.to_excel,
+            dry_run=request.dry_run,
+            cache=request.cache,
+            write_behind=request.write_behind,
+            export_format=request.export_format,
+            incremental=request.incremental,
+        )
+    except jobs.JobQueueFullError as error:
+        job_upload.close()
+        logger.error("Error queueing job: %s", error)
+        raise HTTPException(
+            status_code=429,
+            detail=str(error),
+            headers={"Retry-After": str(config.JOBS_RETRY_AFTER)},
+        )
+    logger.info("Job %s queued", job.id)
+    return responses.JSONResponse(job.to_dict(), status_code=202)
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Returns the status, timings and export location of a job, and its result
+    once it has succeeded.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Response(job.render(), media_type="application/json")
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Exposes the stage, request and statement size histograms and the parse cache
+    and write-behind counters in the Prometheus text format. Returns 404 when
+    METRICS_ENABLED is off.
+    """
+    if not config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        metrics.render(
+            cache_stats=dict(parse_cache.stats),
+            write_behind_stats=dict(write_queue.stats),
+        ),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
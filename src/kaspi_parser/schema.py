@@ -0,0 +1,48 @@
+"""
+Creates the database schema once, before the server workers start.
+
+The workers do not create it themselves unless DB_CREATE_SCHEMA is on, so that
+several of them starting at once do not race on the same DDL.
+
+After updating from an earlier version, run it once with `--upgrade` to add
+the new columns and indexes to the existing tables and backfill them.
+
+Usage:
+    python -m src.kaspi_parser.schema
+    python -m src.kaspi_parser.schema --upgrade
+    python -m src.kaspi_parser.schema --database-url postgresql://user@host/db
+"""
+
+import argparse
+import logging
+import sys
+
+from src.kaspi_parser import config, logs, models
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", default=config.DATABASE_URL)
+    parser.add_argument(
+        "--upgrade",
+        action="store_true",
+        help="upgrade the tables created by earlier versions",
+    )
+    args = parser.parse_args(argv)
+
+    logs.setup()
+    engine = models.create_db_engine(args.database_url)
+    try:
+        models.ensure_schema(engine)
+        if args.upgrade:
+            models.upgrade_schema(engine)
+    finally:
+        engine.dispose()
+    logger.info("Database schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
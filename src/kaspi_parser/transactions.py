@@ -0,0 +1,339 @@
+import hashlib
+import sys
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+TRANSACTION_TYPES = (
+    "Перевод",
+    "Покупка",
+    "Пополнение",
+    "Разное",
+    "Снятие",
+    "Толықтыру",
+    "Аударым",
+    "Зат сатып алу",
+    "Ақша алу",
+    "Əртүрлі",
+)
+TRANSACTION_TYPE_CODES = {name: code for code, name in enumerate(TRANSACTION_TYPES)}
+
+
+class TransactionTable:
+    """
+    A columnar container for the transactions of a statement.
+
+    Transactions are stored in parallel arrays instead of one dict per row:
+        - dates: int64 days since 1970-01-01.
+        - amounts: float64 amounts.
+        - type_codes: int8 indexes into TRANSACTION_TYPES.
+        - details: interned description strings.
+
+    Iterating over the table yields the usual transaction dicts, so it can be
+    used wherever a list of "Details" is expected. Consumers that care about
+    speed use `iter_rows` or the arrays directly.
+
+    numpy is imported on first use, so importing this module stays cheap.
+    """
+
+    def __init__(
+        self,
+        dates: "np.ndarray",
+        amounts: "np.ndarray",
+        type_codes: "np.ndarray",
+        details: list[str],
+    ) -> None:
+        """
+        Initializes a new instance of the TransactionTable class.
+
+        Args:
+            dates (np.ndarray): The operation dates as int64 days since the epoch.
+            amounts (np.ndarray): The amounts as float64.
+            type_codes (np.ndarray): The transaction types as indexes into TRANSACTION_TYPES.
+            details (list[str]): The transaction descriptions.
+        """
+        self.dates = dates
+        self.amounts = amounts
+        self.type_codes = type_codes
+        self.details = details
+
+    @classmethod
+    def from_statements(
+        cls, statements: Iterable[list], date_format: str = "%d.%m.%y"
+    ) -> "TransactionTable":
+        """
+        Builds a table from the raw statements produced by
+        `BankStatement.iter_statements`, decoding dates and amounts column-wise.
+
+        Args:
+            statements (Iterable[list]): The date, amount, transaction type and
+                                         description strings of each statement.
+            date_format (str, optional): The format of the dates. Defaults to "%d.%m.%y".
+
+        Returns:
+            TransactionTable: The decoded table.
+        """
+        import numpy as np
+
+        columns = list(zip(*statements)) or [(), (), (), ()]
+        dates, amounts, operations, details = columns
+        return cls(
+            dates=cls.decode_dates(dates, date_format),
+            amounts=cls.decode_amounts(amounts),
+            type_codes=np.fromiter(
+                (TRANSACTION_TYPE_CODES[operation] for operation in operations),
+                dtype=np.int8,
+                count=len(operations),
+            ),
+            details=[sys.intern(detail) for detail in details],
+        )
+
+    @staticmethod
+    def decode_dates(values, date_format: str = "%d.%m.%y") -> "np.ndarray":
+        """
+        Converts date strings to days since the epoch.
+
+        "dd.mm.yy" dates are decoded with array arithmetic on their code points;
+        other formats fall back to `datetime.strptime`.
+
+        Args:
+            values (Sequence[str]): The date strings.
+            date_format (str, optional): The format of the dates. Defaults to "%d.%m.%y".
+
+        Returns:
+            np.ndarray: int64 days since 1970-01-01.
+        """
+        import numpy as np
+
+        if date_format != "%d.%m.%y":
+            return np.array(
+                [datetime.strptime(value, date_format) for value in values],
+                dtype="datetime64[D]",
+            ).astype(np.int64)
+        if not len(values):
+            return np.empty(0, dtype=np.int64)
+        digits = np.array(values, dtype="U8").view(np.uint32).reshape(-1, 8) - 48
+        days = digits[:, 0] * 10 + digits[:, 1]
+        months = digits[:, 3] * 10 + digits[:, 4]
+        years = 2000 + digits[:, 6] * 10 + digits[:, 7]
+        first_of_month = (years - 1970).astype("datetime64[Y]") + (months - 1).astype(
+            "timedelta64[M]"
+        )
+        return (
+            first_of_month.astype("datetime64[D]").astype(np.int64) + days - 1
+        ).astype(np.int64)
+
+    @staticmethod
+    def decode_amounts(values) -> "np.ndarray":
+        """
+        Converts amount strings such as "- 1 500,00 ₸" to floats.
+
+        Every digit is weighted by its position among the digits of its string,
+        which yields the amount in tiyn without building intermediate strings.
+
+        Args:
+            values (Sequence[str]): The amount strings, each with two decimal places.
+
+        Returns:
+            np.ndarray: float64 amounts.
+        """
+        import numpy as np
+
+        if not len(values):
+            return np.empty(0, dtype=np.float64)
+        codes = np.array(values, dtype=str)
+        width = codes.dtype.itemsize // 4
+        codes = codes.view(np.uint32).reshape(-1, width)
+        is_digit = (codes >= 48) & (codes <= 57)
+        digits_to_the_right = np.cumsum(is_digit[:, ::-1], axis=1)[:, ::-1] - 1
+        weights = np.where(is_digit, 10.0**digits_to_the_right, 0.0)
+        tiyn = (np.where(is_digit, codes - 48, 0) * weights).sum(axis=1)
+        sign = np.where(codes[:, 0] == ord("-"), -1.0, 1.0)
+        return sign * tiyn / 100
+
+    def __len__(self) -> int:
+        return len(self.details)
+
+    def __iter__(self) -> Iterator[dict]:
+        for operation_date, amount, transaction_type, detail in self.iter_rows():
+            yield {
+                "operationDate": operation_date,
+                "amount": amount,
+                "transactionType": transaction_type,
+                "detail": detail,
+            }
+
+    def operation_dates(self) -> list[datetime]:
+        """
+        Returns the operation dates as datetime objects.
+
+        Returns:
+            list[datetime]: The operation dates.
+        """
+        return self.dates.astype("datetime64[D]").astype("datetime64[us]").tolist()
+
+    def transaction_types(self) -> list[str]:
+        """
+        Returns the name of the transaction type of every transaction.
+
+        Returns:
+            list[str]: The transaction type names.
+        """
+        return [TRANSACTION_TYPES[code] for code in self.type_codes.tolist()]
+
+    def iter_rows(self) -> Iterator[tuple]:
+        """
+        Yields the operation date, amount, transaction type and description of
+        every transaction, decoded column by column.
+
+        Yields:
+            tuple: (datetime, float, str, str)
+        """
+        return zip(
+            self.operation_dates(),
+            self.amounts.tolist(),
+            self.transaction_types(),
+            self.details,
+        )
+
+    def to_columns(self) -> dict:
+        """
+        Returns the columns of the table, e.g. to serialise it with orjson's numpy
+        support.
+
+        Returns:
+            dict: The "dates", "amounts", "type_codes" and "details" columns.
+        """
+        return {
+            "dates": self.dates,
+            "amounts": self.amounts,
+            "type_codes": self.type_codes,
+            "details": self.details,
+        }
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> "TransactionTable":
+        """
+        Builds a table from columns as returned by `to_columns`, or from their
+        JSON lists.
+
+        Args:
+            columns (dict): The "dates", "amounts", "type_codes" and "details" columns.
+
+        Returns:
+            TransactionTable: The table.
+        """
+        import numpy as np
+
+        return cls(
+            dates=np.asarray(columns["dates"], dtype=np.int64),
+            amounts=np.asarray(columns["amounts"], dtype=np.float64),
+            type_codes=np.asarray(columns["type_codes"], dtype=np.int8),
+            details=list(columns["details"]),
+        )
+
+    def to_dicts(self) -> list[dict]:
+        """
+        Returns the transactions as the dicts exposed in the JSON response.
+
+        Returns:
+            list[dict]: One dict per transaction.
+        """
+        return list(self)
+
+
+def iter_rows(details) -> Iterator[tuple]:
+    """
+    Yields the operation date, amount, transaction type and description of every
+    transaction in "Details", whether it is a `TransactionTable` or a list or
+    iterator of transaction dicts.
+
+    Args:
+        details (TransactionTable | Iterable[dict]): The transactions of a statement.
+
+    Yields:
+        tuple: (datetime, float, str, str)
+    """
+    if isinstance(details, TransactionTable):
+        return details.iter_rows()
+    return (
+        (
+            detail["operationDate"],
+            detail["amount"],
+            detail["transactionType"],
+            detail["detail"],
+        )
+        for detail in details
+    )
+
+
+def fingerprint(
+    operation_date: datetime,
+    amount: float,
+    transaction_type: str,
+    detail: str,
+    ordinal: int = 0,
+) -> str:
+    """
+    Identifies a transaction independently of the statement it was read from.
+
+    Args:
+        operation_date (datetime): The date of the transaction.
+        amount (float): The amount of the transaction.
+        transaction_type (str): The type of the transaction.
+        detail (str): The description of the transaction.
+        ordinal (int, optional): The number of identical transactions before this
+                                 one in the same statement.
+
+    Returns:
+        str: A 32 character hex digest.
+    """
+    key = (
+        f"{operation_date:%Y-%m-%d}|{amount:.2f}|{transaction_type}|{detail}|{ordinal}"
+    )
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def iter_fingerprinted_rows(details) -> Iterator[tuple]:
+    """
+    Yields every transaction in "Details" together with its fingerprint. Identical
+    transactions, e.g. two equal purchases on the same day, get consecutive
+    ordinals, so an overlapping statement yields the same fingerprints for them.
+
+    Identical transactions share their date, and statements list transactions
+    grouped by date, so the ordinals are counted per run of equal dates and the
+    memory used is bounded by the transactions of the busiest day, not of the
+    whole statement.
+
+    Args:
+        details (TransactionTable | Iterable[dict]): The transactions of a statement.
+
+    Yields:
+        tuple: (datetime, float, str, str, str), the row followed by its fingerprint.
+
+    Raises:
+        ValueError: If a date appears again after transactions of other dates,
+                    since earlier ordinals of that date are no longer known.
+    """
+    seen = Counter()
+    finished = set()
+    current = None
+    for row in iter_rows(details):
+        day = row[0].date()
+        if day != current:
+            if day in finished:
+                raise ValueError(
+                    f"Transactions are not grouped by date: {day:%d.%m.%y} "
+                    "appears again"
+                )
+            if current is not None:
+                finished.add(current)
+            current = day
+            seen.clear()
+        ordinal = seen[row]
+        seen[row] += 1
+        yield (*row, fingerprint(*row, ordinal=ordinal))
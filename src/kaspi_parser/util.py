@@ -1,15 +1,35 @@
 import base64
-import io
-from src.kaspi_parser import config
+import hashlib
+import itertools
+import logging
 import os
+import queue
 import re
+import tempfile
+import threading
+import time
+from collections.abc import Generator, Iterable, Iterator
 from contextlib import contextmanager
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 
-import fitz
-import pandas as pd
+from sqlalchemy import delete, func, insert, select
 
-from src.kaspi_parser import models
+from src.kaspi_parser import (
+    config,
+    exporters,
+    layouts,
+    metrics,
+    models,
+    queries,
+    rollups,
+    transactions,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the parsed output changes, so that cached results are invalidated.
+PARSER_VERSION = "3"
 
 
 def encode_file(file_path: str) -> str:
@@ -26,6 +46,213 @@ def encode_file(file_path: str) -> str:
         return base64.b64encode(file.read()).decode("utf-8")
 
 
+class SpooledUpload:
+    """
+    A class to buffer an uploaded PDF in memory, rolling over to a named temporary
+    file once the upload grows beyond a size threshold.
+    """
+
+    def __init__(self, max_size: int = config.UPLOAD_SPOOL_MAX_SIZE) -> None:
+        """
+        Initializes a new instance of the SpooledUpload class.
+
+        Args:
+            max_size (int): The number of bytes kept in memory before spooling to disk.
+        """
+        self.max_size = max_size
+        self.buffer = bytearray()
+        self.file = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Appends a chunk of the upload to the buffer.
+
+        Args:
+            chunk (bytes): The chunk to append.
+        """
+        self.size += len(chunk)
+        self.digest.update(chunk)
+        if self.file is None and self.size > self.max_size:
+            # Kept open across writes, and closed and removed by `close`.
+            self.file = tempfile.NamedTemporaryFile(  # noqa: SIM115
+                suffix=".pdf", delete=False
+            )
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+        if self.file is not None:
+            self.file.write(chunk)
+        else:
+            self.buffer += chunk
+
+    def write_base64(
+        self, data: str, chunk_size: int = config.UPLOAD_CHUNK_SIZE
+    ) -> None:
+        """
+        Decodes a Base64 string chunk by chunk and appends the result to the buffer,
+        so the decoded document is never held as a second full copy.
+
+        Args:
+            data (str): The Base64 encoded content.
+            chunk_size (int): The number of characters decoded at a time.
+
+        Raises:
+            binascii.Error: If the data is not valid Base64.
+        """
+        with metrics.stage("decode"):
+            remainder = ""
+            for start in range(0, len(data), chunk_size):
+                chunk = remainder + "".join(data[start : start + chunk_size].split())
+                cut = len(chunk) - len(chunk) % 4
+                self.write(base64.b64decode(chunk[:cut]))
+                remainder = chunk[cut:]
+            if remainder:
+                self.write(base64.b64decode(remainder))
+        metrics.observe("kaspi_parser_bytes_processed", len(data), stage="decode")
+
+    def hexdigest(self) -> str:
+        """
+        Returns the SHA-256 hex digest of everything written so far.
+
+        Returns:
+            str: The hex digest.
+        """
+        return self.digest.hexdigest()
+
+    def as_source(self) -> dict:
+        """
+        Returns the keyword arguments that point BankStatement.parse_statement at
+        the buffered document.
+
+        Returns:
+            dict: Either {"file_path": ...} or {"file_bytes": ...}.
+        """
+        if self.file is not None:
+            self.file.flush()
+            return {"file_path": self.file.name}
+        return {"file_bytes": self.buffer}
+
+    def detach(self) -> "SpooledUpload":
+        """
+        Moves the buffered document to a new SpooledUpload, so that it outlives the
+        `with` block of this one, e.g. while a streamed response is being sent.
+        This upload is left empty and the caller must close the returned one.
+
+        Returns:
+            SpooledUpload: The upload now owning the buffered document.
+        """
+        upload = SpooledUpload(max_size=self.max_size)
+        upload.buffer, upload.file = self.buffer, self.file
+        upload.size, upload.digest = self.size, self.digest
+        self.buffer, self.file = bytearray(), None
+        return upload
+
+    def close(self) -> None:
+        """
+        Releases the buffer and removes the temporary file, if any.
+        """
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.file.name)
+            self.file = None
+        self.buffer = bytearray()
+
+
+class BatchChannel:
+    """
+    A bounded channel that hands the batches of transactions of a streamed
+    statement from the event loop to a consumer running in a worker thread, such
+    as an export or a DB insert, which reads them as one lazy "Details" iterator.
+
+    The producer blocks while `max_batches` batches are waiting, so only those
+    are held in memory however long the statement is.
+    """
+
+    END = object()
+
+    def __init__(self, max_batches: int = config.STREAM_SINK_MAX_BATCHES) -> None:
+        """
+        Initializes a new instance of the BatchChannel class.
+
+        Args:
+            max_batches (int): The number of batches waiting before `put` blocks.
+        """
+        self.queue = queue.Queue(max_batches)
+        self.error = None
+        self.stopped = threading.Event()
+
+    def put(self, batch) -> None:
+        """
+        Hands a batch to the consumer, blocking while the channel is full. The
+        batch is dropped if the consumer has stopped reading.
+
+        Args:
+            batch: A list of transactions, or `END` once there are no more.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> None:
+        """
+        Marks the end of the transactions, blocking while the channel is full.
+        """
+        self.put(self.END)
+
+    def abort(self, error: Exception) -> None:
+        """
+        Makes the consumer raise an error instead of reading further transactions,
+        so a DB insert rolls back. Does not block.
+
+        Args:
+            error (Exception): The error to raise in the consumer.
+        """
+        self.error = error
+
+    def __iter__(self) -> Iterator[dict]:
+        while True:
+            if self.error is not None:
+                raise self.error
+            try:
+                batch = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if batch is self.END:
+                return
+            yield from batch
+
+    def consume(self, func, statement_data: dict, **kwargs):
+        """
+        Calls `func` with the statement, reading "Details" from the channel.
+        Meant to run in a worker thread.
+
+        Args:
+            func: A function taking a `statement_data` keyword argument, such as
+                  `Record.insert_record`.
+            statement_data (dict): The statement header, without "Details".
+            **kwargs: Further keyword arguments of `func`.
+
+        Returns:
+            The return value of `func`.
+        """
+        try:
+            return func(
+                statement_data={**statement_data, "Details": iter(self)}, **kwargs
+            )
+        finally:
+            self.stopped.set()
+
+
 class BankStatement:
     """
     A class to process financial statements and extract relevant information.
@@ -34,177 +261,205 @@ class BankStatement:
     def __init__(self) -> None:
         pass
 
-    class Patterns:
+    def parse_statement(
+        self,
+        file_bytes=None,
+        date_format="%d.%m.%y",
+        file_path=None,
+        lazy=False,
+        columnar=False,
+        extraction=config.EXTRACTION_MODE,
+    ):
         """
-        A nested class to store regex patterns for extracting data from financial statements.
+        Parse a financial statement from a byte stream or a file on disk.
+
+        The layout is detected from the first page, so documents that are not Kaspi
+        statements are rejected before any pattern runs, and the header and every
+        page are then scanned with the grammar of that layout only. Transactions
+        are parsed page by page.
+
+        Args:
+            file_bytes (bytes): The byte content of the financial statement file.
+            date_format (str): The date format used in the statement.
+            file_path (str, optional): The path to the statement file. Used instead of
+                                       file_bytes when the upload was spooled to disk.
+            lazy (bool, optional): If True, "Details" is an iterator that reads the
+                                   remaining pages on demand and can be consumed once.
+            columnar (bool, optional): If True, "Details" is a `TransactionTable`.
+                                       Ignored when lazy is True.
+            extraction (str, optional): "text" to scan the flattened text of every page
+                                        with the pattern of its layout, or "layout" to assemble
+                                        rows from word positions with `iter_table_rows`.
+                                        Defaults to config.EXTRACTION_MODE.
+
+        Returns:
+            dict: A dictionary containing parsed information from the statement.
+
+        Raises:
+            layouts.UnsupportedStatementError: If the document matches no registered layout.
         """
+        with metrics.stage("parse"):
+            if extraction == "layout":
+                statements = self.iter_table_rows(
+                    stream=file_bytes, file_path=file_path
+                )
+                header_text = next(statements, "")
+                layout = layouts.detect(header_text)
+                header = self.get_header(
+                    text=header_text, date_format=date_format, layout=layout
+                )
+                pages = None
+            else:
+                pages = self.iter_pages(stream=file_bytes, file_path=file_path)
+                first_page = next(pages, "")
+                layout = layouts.detect(first_page)
+                header = self.get_header(
+                    text=first_page, date_format=date_format, layout=layout
+                )
+                pages = itertools.chain([first_page], pages)
+                statements = None
+            options = {
+                "date_format": date_format,
+                "pages": pages,
+                "statements": statements,
+                "layout": layout,
+            }
+            if lazy:
+                details = self.get_details(**options)
+            elif columnar:
+                details = self.get_table(**options)
+            else:
+                details = list(self.get_details(**options))
+        if not lazy:
+            metrics.observe("kaspi_parser_statement_transactions", len(details))
 
-        fio_pattern = (
-            r"по \d{2}\.\d{2}\.\d{2} (.*?) Номер счета:|бойынша (.*?) Шот нөмірі:"
-        )
-        card_number_pattern = r"Номер карты: (\*\d{4})|Карта нөмірі: (\*\d{4})"
-        iban_pattern = r"Номер счета: (.*?) |Шот нөмірі: (.*?) "
-        currency_pattern = r"Валюта счета: (\w+)|Шот валютасы: (\w+)"
-        date_pattern = (
-            r"за период с (\d{2}\.\d{2}\.\d{2}) по (\d{2}\.\d{2}\.\d{2})"
-            r"|(\d{2}\.\d{2}\.\d{2})ж\.? бастап (\d{2}\.\d{2}\.\d{2})ж\.? дейінгі кезеңге"
-        )
+        return self.make_result(header, details, date_format)
 
-    def parse_statement(self, file_bytes, date_format="%d.%m.%y"):
+    @staticmethod
+    def make_result(
+        header: "StatementHeader", details, date_format: str = "%d.%m.%y"
+    ) -> dict:
         """
-        Parse a financial statement from a byte stream.
+        Builds the parsed statement from its header and transactions.
 
         Args:
-            file_bytes (bytes): The byte content of the financial statement file.
-            date_format (str): The date format used in the statement.
+            header (StatementHeader): The header of the statement.
+            details: The transactions, as a list, iterator or `TransactionTable`.
+            date_format (str, optional): The format of the period dates. Defaults to "%d.%m.%y".
 
         Returns:
             dict: A dictionary containing parsed information from the statement.
         """
-        with io.BytesIO(file_bytes) as stream:
-            text = self.get_text(stream=stream)
-            fio = next(
-                (
-                    match[0] or match[1]
-                    for match in re.findall(
-                        self.Patterns.fio_pattern, text, re.IGNORECASE
-                    )
-                    if any(match)
-                ),
-                None,
-            )
-            parts = fio.split()
-            filtered_parts = [
-                part for i, part in enumerate(parts) if i not in [1, 2, 3]
-            ]
-            fio = " ".join(filtered_parts)
+        return {
+            "financialInstitutionName": "АО «Kaspi Bank»",
+            "FIO": header.full_name,
+            "cardNumber": header.card_number,
+            "IBAN": header.iban,
+            "currency": header.currency,
+            "fromDate": header.from_date.strftime(date_format),
+            "toDate": header.to_date.strftime(date_format),
+            "cardBalanceDateFrom": header.card_balance_date_from,
+            "cardBalanceDateUntil": header.card_balance_date_until,
+            "Replenishments": header.replenishments,
+            "Transfers": header.transfers,
+            "Purchases": header.purchases,
+            "Withdrawals": header.withdrawals,
+            "Others": header.others,
+            "Details": details,
+        }
 
-            card_number = next(
-                (
-                    match[0] or match[1]
-                    for match in re.findall(
-                        self.Patterns.card_number_pattern, text, re.IGNORECASE
-                    )
-                    if any(match)
-                ),
-                None,
-            )
+    def get_header(
+        self,
+        text: str,
+        date_format: str = "%d.%m.%y",
+        limit: int = config.HEADER_SCAN_LIMIT,
+        layout: layouts.Layout | None = None,
+    ) -> "StatementHeader":
+        """
+        Extract the statement header in a single pass over the beginning of the text.
 
-            iban = next(
-                (
-                    match[0] or match[1]
-                    for match in re.findall(
-                        self.Patterns.iban_pattern, text, re.IGNORECASE
-                    )
-                    if any(match)
-                ),
-                None,
-            )
+        All header fields live on the first page, so only the first `limit` characters
+        are scanned with the precompiled header pattern of the layout, and the scan stops
+        as soon as every field has been found. The first occurrence of each field wins.
 
-            currency = next(
-                (
-                    match[0] or match[1]
-                    for match in re.findall(
-                        self.Patterns.currency_pattern, text, re.IGNORECASE
-                    )
-                    if any(match)
-                ),
-                None,
-            )
+        Args:
+            text (str): The text of the bank statement.
+            date_format (str, optional): The format of the dates in the statement. Defaults to "%d.%m.%y".
+            limit (int, optional): The number of leading characters to scan.
+            layout (layouts.Layout, optional): The layout of the statement. Detected
+                                               from the text if not given.
 
-            date_match = next(
-                (
-                    match
-                    for match in re.findall(
-                        self.Patterns.date_pattern, text, re.IGNORECASE
-                    )
-                    if any(match)
-                ),
-                (None, None, None, None),
-            )
+        Returns:
+            StatementHeader: The extracted header.
 
-            date_from, date_until = (
-                date_match[0] or date_match[2],
-                date_match[1] or date_match[3],
-            )
-            card_balance_date_from = self.get_number(
-                next(
-                    iter(
-                        re.findall(
-                            rf"(?:Доступно на {date_from}|{date_from}ж. қолжетімді:) (.*?) ₸",
-                            text,
-                        )
-                    ),
-                    None,
-                ),
-                parameter_type="card_balance_date_from",
-            )
-            card_balance_date_until = self.get_number(
-                next(
-                    iter(
-                        re.findall(
-                            rf"(?:Доступно на {date_until}|{date_until}ж. қолжетімді:) (.*?) ₸",
-                            text,
-                        )
-                    ),
-                    None,
-                ),
-                parameter_type="card_balance_date_until",
-            )
-            replenishments = self.get_number(
-                next(iter(re.findall(r"(?:Пополнения|Толықтыру) (.*?) ₸", text)), None)
-            )
-            transfers = self.get_number(
-                next(iter(re.findall(r"(?:Переводы|Аударым) (.*?) ₸", text)), None)
-            )
-            purchases = self.get_number(
-                next(iter(re.findall(r"(?:Покупки|Зат сатып алу) (.*?) ₸", text)), None)
-            )
-            withdrawals = self.get_number(
-                next(iter(re.findall(r"(?:Снятия|Ақша алу) (.*?) ₸", text)), None)
-            )
-            others = self.get_number(
-                next(iter(re.findall(r"(?:Разное|ртүрлі) (.*?) ₸", text)), None)
-            )
+        Raises:
+            layouts.UnsupportedStatementError: If the text matches no registered layout.
+            ValueError: If the full name or the statement period cannot be found.
+        """
+        fields = {}
+        balances = {}
+        with metrics.stage("header"):
+            if layout is None:
+                layout = layouts.detect(text, limit)
+            for match in layout.header_pattern.finditer(text, 0, limit):
+                for name, value in match.groupdict().items():
+                    if value is None or name == "balance_date":
+                        continue
+                    if name == "balance":
+                        balances.setdefault(match["balance_date"], value)
+                    else:
+                        fields.setdefault(name, value)
+                if (
+                    len(fields) == len(HEADER_FIELDS)
+                    and fields["from"] in balances
+                    and fields["until"] in balances
+                ):
+                    break
 
-            date_from, date_until = (
-                datetime.strptime(date_from, date_format),
-                datetime.strptime(date_until, date_format),
-            )
+        if "fio" not in fields or "from" not in fields:
+            raise ValueError("Statement header not found")
 
-            details = self.get_details(text=text, date_format=date_format)
-
-            result = {
-                "financialInstitutionName": "АО «Kaspi Bank»",
-                "FIO": fio,
-                "cardNumber": card_number,
-                "IBAN": iban,
-                "currency": currency,
-                "fromDate": date_from.strftime(date_format),
-                "toDate": date_until.strftime(date_format),
-                "cardBalanceDateFrom": card_balance_date_from,
-                "cardBalanceDateUntil": card_balance_date_until,
-                "Replenishments": replenishments,
-                "Transfers": transfers,
-                "Purchases": purchases,
-                "Withdrawals": withdrawals,
-                "Others": others,
-                "Details": details,
-            }
-        return result
+        parts = fields["fio"].split()
+        filtered_parts = [part for i, part in enumerate(parts) if i not in [1, 2, 3]]
+        return StatementHeader(
+            full_name=" ".join(filtered_parts),
+            card_number=fields.get("card"),
+            iban=fields.get("iban"),
+            currency=fields.get("currency"),
+            from_date=datetime.strptime(fields["from"], date_format),
+            to_date=datetime.strptime(fields["until"], date_format),
+            card_balance_date_from=self.get_number(
+                balances.get(fields["from"]), parameter_type="card_balance_date_from"
+            ),
+            card_balance_date_until=self.get_number(
+                balances.get(fields["until"]), parameter_type="card_balance_date_until"
+            ),
+            replenishments=self.get_number(fields.get("replenishments")),
+            transfers=self.get_number(fields.get("transfers")),
+            purchases=self.get_number(fields.get("purchases")),
+            withdrawals=self.get_number(fields.get("withdrawals")),
+            others=self.get_number(fields.get("others")),
+        )
 
     @staticmethod
-    def get_text(stream):
+    def get_text(stream=None, file_path=None):
         """
-        Extract text from a PDF file stream.
+        Extract text from a PDF file stream or a PDF file on disk.
 
         Args:
-            stream (io.BytesIO): The byte stream of the PDF file.
+            stream (bytes | io.BytesIO): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over stream.
 
         Returns:
             str: The extracted text from the PDF file.
         """
-        with fitz.open(stream=stream, filetype="pdf") as pdf:
+        import fitz
+
+        with (
+            fitz.open(file_path, filetype="pdf")
+            if file_path
+            else fitz.open(stream=stream, filetype="pdf")
+        ) as pdf:
             text = "\n".join([page.get_text() for page in pdf])
         return " ".join(text.split())
 
@@ -256,78 +511,565 @@ class BankStatement:
         Returns:
             str: The cleaned text of the bank statement.
         """
-        return (
-            bank_statement_text.replace(
-                "АО «Kaspi Bank», БИК CASPKZKA, www.kaspi.kz", ""
-            )
-            .replace("«Kaspi Bank» АҚ, БСК CASPKZKA, www.kaspi.kz", "")
-            .replace(
-                " - Сумма заблокирована. Банк ожидает подтверждения от платежной системы.",
-                "",
-            )
-            .replace(
-                " - Сомаға тосқауыл қойылған. Банк төлем жүйесінің растауын күтуде.", ""
-            )
-        )
+        return layouts.any_layout().clean(bank_statement_text)
+
+    @staticmethod
+    def iter_pages(
+        stream=None, file_path=None, start: int = 0, stop: int | None = None
+    ) -> Iterator[str]:
+        """
+        Lazily extract the text of a PDF page by page.
+
+        Only one page is held in memory at a time. Whitespace is flattened the same
+        way as in `get_text`, and pages without text are skipped. The page count of
+        the statement is only observed when the whole document is read.
+
+        Args:
+            stream (bytes | io.BytesIO): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over stream.
+            start (int, optional): The index of the first page to read. Defaults to 0.
+            stop (int, optional): The index of the page to stop before. Defaults to the end.
+
+        Yields:
+            str: The text of each page.
+        """
+        import fitz
 
-    def get_statements(self, bank_statement_text: str) -> list:
+        elapsed = 0.0
+        page_count = 0
+        try:
+            started = time.perf_counter()
+            with (
+                fitz.open(file_path, filetype="pdf")
+                if file_path
+                else fitz.open(stream=stream, filetype="pdf")
+            ) as pdf:
+                for page in pdf.pages(start, stop):
+                    text = " ".join(page.get_text().split())
+                    page_count += 1
+                    elapsed += time.perf_counter() - started
+                    if text:
+                        yield text
+                    started = time.perf_counter()
+        finally:
+            metrics.observe("kaspi_parser_stage_seconds", elapsed, stage="extract")
+            if start == 0 and stop is None:
+                metrics.observe("kaspi_parser_statement_pages", page_count)
+
+    @staticmethod
+    def get_page_count(file_bytes=None, file_path=None) -> int:
+        """
+        Returns the number of pages of a PDF without extracting any text.
+
+        Args:
+            file_bytes (bytes): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over file_bytes.
+
+        Returns:
+            int: The number of pages.
+        """
+        import fitz
+
+        with (
+            fitz.open(file_path, filetype="pdf")
+            if file_path
+            else fitz.open(stream=file_bytes, filetype="pdf")
+        ) as pdf:
+            return pdf.page_count
+
+    def get_statements(
+        self, bank_statement_text: str, layout: layouts.Layout | None = None
+    ) -> list:
         """
         Extract individual statements from the bank statement text.
 
         Args:
             bank_statement_text (str): The raw text of the bank statement.
+            layout (layouts.Layout, optional): The layout of the statement. Defaults
+                                               to a grammar accepting every layout.
 
         Returns:
             list: A list of tuples containing the date, amount, transaction type, and description.
         """
-        bank_statement_text = self.replace_statement_extra_text(bank_statement_text)
-        pattern = (
-            r"(\d{2}\.\d{2}\.\d{2})\s+"  # Дата в формате dd.mm.yy
-            r"([+-]\s?\d{1,3}(?:\s\d{3})*,\d{2} ₸)\s+"  # Сумма с символом валюты
-            r"(Перевод|Покупка|Пополнение|Разное|Снятие|"
-            r"Толықтыру|Аударым|Зат сатып алу|Ақша алу|Əртүрлі)\s+"  # Тип операции (одно слово)
-            r"(.+?)(?=\d{2}\.\d{2}\.\d{2}|$)"  # Описание
-        )
-        matches = re.findall(pattern, bank_statement_text)
-        return [[element.strip() for element in match] for match in matches]
+        return list(self.iter_statements([bank_statement_text], layout=layout))
 
-    def get_details(self, text: str, date_format: str = "%d.%m.%y") -> list[dict]:
+    def iter_statements(
+        self, pages: Iterable[str], layout: layouts.Layout | None = None
+    ) -> Iterator[list]:
         """
-        Extracts and parses the transaction details from the provided bank statement text.
+        Lazily extract individual statements from the text of consecutive pages.
+
+        Each page is cleaned and scanned on its own. The last statement found on a
+        page is carried over to the next page, because its description may continue
+        after the page break.
 
         Args:
-            text (str): The raw text of the bank statement.
-            date_format (str, optional): The format of the dates in the statement. Defaults to "%d.%m.%y".
+            pages (Iterable[str]): The text of each page, in order.
+            layout (layouts.Layout, optional): The layout of the statement. Defaults
+                                               to a grammar accepting every layout.
+
+        Yields:
+            list: The date, amount, transaction type, and description of a statement.
+        """
+        layout = layout or layouts.any_layout()
+        carry = yield from self.scan_statements(pages, layout)
+        for match in layout.statement_pattern.finditer(carry):
+            yield [element.strip() for element in match.groups()]
+
+    @staticmethod
+    def scan_statements(
+        pages: Iterable[str], layout: layouts.Layout
+    ) -> Generator[list, None, str]:
+        """
+        Extracts the statements of consecutive pages, except the last one, whose
+        description may continue on the pages that follow.
+
+        Args:
+            pages (Iterable[str]): The text of each page, in order.
+            layout (layouts.Layout): The layout of the statement.
+
+        Yields:
+            list: The date, amount, transaction type, and description of a statement.
+
+        Returns:
+            str: The text of the last statement, from its date to the end of the
+                 pages, or "" if the pages hold no statement.
+        """
+        statement_pattern = layout.statement_pattern
+        carry = ""
+        for page in pages:
+            chunk = layout.clean(f"{carry} {page}" if carry else page)
+            last_match = None
+            for match in statement_pattern.finditer(chunk):
+                if last_match is not None:
+                    yield [element.strip() for element in last_match.groups()]
+                last_match = match
+            if last_match is not None:
+                carry = chunk[last_match.start() :]
+            elif carry:
+                carry = chunk
+        return carry
+
+    def scan_pages(
+        self, pages: Iterable[str], layout: layouts.Layout
+    ) -> tuple[str, list[list], str]:
+        """
+        Extracts the statements of a range of pages parsed apart from the pages
+        before it, keeping the text needed to stitch it to its neighbours.
+
+        Args:
+            pages (Iterable[str]): The text of each page of the range, in order.
+            layout (layouts.Layout): The layout of the statement.
 
         Returns:
-            list[dict]: A list of dictionaries where each dictionary represents a transaction.
-                        Each dictionary contains the following keys:
-                        - "operationDate" (datetime): The date of the transaction.
-                        - "amount" (float): The amount of the transaction.
-                        - "transactionType" (str): The type of transaction (e.g., "Transfer", "Purchase").
-                        - "detail" (str): Additional details about the transaction.
-
-        """
-        statement = self.get_statements(text)
-        statement = [
-            (
-                self.get_date(date, date_format),
-                self.get_number(amount),
-                operation,
-                detail,
+            tuple[str, list[list], str]: The text before the first statement, which
+                                         continues the last statement of the previous
+                                         range, the statements known to end in the
+                                         range, and the text of its last statement.
+        """
+        pages = iter(pages)
+        head = ""
+        for page in pages:
+            text = layout.clean(f"{head} {page}" if head else page)
+            match = layout.statement_pattern.search(text)
+            if match is None:
+                head = text
+                continue
+            head = text[: match.start()]
+            scanner = self.scan_statements(
+                itertools.chain([text[match.start() :]], pages), layout
             )
-            for date, amount, operation, detail in statement
+            statements = []
+            try:
+                while True:
+                    statements.append(next(scanner))
+            except StopIteration as stop:
+                return head, statements, stop.value
+        return head, [], ""
+
+    def scan_page_range(
+        self,
+        start: int,
+        stop: int,
+        layout_name: str,
+        file_bytes=None,
+        file_path=None,
+    ) -> tuple[str, list[list], str]:
+        """
+        Extracts and scans a range of pages of a statement. Run in a worker process,
+        which opens the document itself.
+
+        Args:
+            start (int): The index of the first page.
+            stop (int): The index of the page to stop before.
+            layout_name (str): The name of the registered layout of the statement.
+            file_bytes (bytes): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over file_bytes.
+
+        Returns:
+            tuple[str, list[list], str]: The range as returned by `scan_pages`.
+        """
+        pages = self.iter_pages(
+            stream=file_bytes, file_path=file_path, start=start, stop=stop
+        )
+        return self.scan_pages(pages, layouts.LAYOUTS[layout_name])
+
+    def merge_page_ranges(
+        self, ranges: Iterable[tuple[str, list[list], str]], layout: layouts.Layout
+    ) -> Iterator[list]:
+        """
+        Joins the statements of consecutive page ranges in page order. The last
+        statement of a range is scanned again with the text that starts the next
+        ranges, so a description crossing a range boundary is parsed as it would
+        be if the pages had been read in sequence.
+
+        Args:
+            ranges (Iterable[tuple[str, list[list], str]]): The ranges, in order,
+                                                            as returned by `scan_pages`.
+            layout (layouts.Layout): The layout of the statement.
+
+        Yields:
+            list: The date, amount, transaction type, and description of a statement.
+        """
+        carry = ""
+        for head, statements, tail in ranges:
+            if not tail:
+                carry = f"{carry} {head}" if carry else ""
+                continue
+            if carry:
+                yield from self.iter_statements([carry, head], layout=layout)
+            yield from statements
+            carry = tail
+        if carry:
+            yield from self.iter_statements([carry], layout=layout)
+
+    def read_header(
+        self, file_bytes=None, file_path=None, date_format: str = "%d.%m.%y"
+    ) -> tuple[layouts.Layout, "StatementHeader"]:
+        """
+        Detects the layout and extracts the header of a statement from its first page.
+
+        Args:
+            file_bytes (bytes): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over file_bytes.
+            date_format (str, optional): The format of the dates in the statement.
+
+        Returns:
+            tuple[layouts.Layout, StatementHeader]: The layout and the header.
+
+        Raises:
+            layouts.UnsupportedStatementError: If the document matches no registered layout.
+        """
+        first_page = next(
+            self.iter_pages(stream=file_bytes, file_path=file_path, stop=1), ""
+        )
+        layout = layouts.detect(first_page)
+        return layout, self.get_header(
+            text=first_page, date_format=date_format, layout=layout
+        )
+
+    @staticmethod
+    def plan_page_ranges(
+        page_count: int, workers: int, min_pages: int
+    ) -> list[tuple[int, int]]:
+        """
+        Splits the pages of a statement into one range per worker.
+
+        Args:
+            page_count (int): The number of pages.
+            workers (int): The number of workers parsing the ranges.
+            min_pages (int): The minimum number of pages of a range.
+
+        Returns:
+            list[tuple[int, int]]: The start and stop page index of each range.
+        """
+        size = max(min_pages, -(-page_count // max(workers, 1)), 1)
+        return [
+            (start, min(start + size, page_count))
+            for start in range(0, page_count, size)
         ]
-        details = [
-            {
-                "operationDate": s[0],
-                "amount": s[1],
-                "transactionType": s[2],
-                "detail": s[3],
+
+    def get_details(
+        self,
+        text: str | None = None,
+        date_format: str = "%d.%m.%y",
+        pages: Iterable[str] | None = None,
+        statements: Iterable[list] | None = None,
+        layout: layouts.Layout | None = None,
+    ) -> Iterator[dict]:
+        """
+        Lazily extracts and parses the transaction details from the provided bank statement text.
+
+        Args:
+            text (str, optional): The raw text of the bank statement.
+            date_format (str, optional): The format of the dates in the statement. Defaults to "%d.%m.%y".
+            pages (Iterable[str], optional): The text of each page, used instead of text to
+                                             stream the statement page by page.
+            statements (Iterable[list], optional): Already extracted statements, e.g. from
+                                                   `iter_table_rows`, used instead of text.
+            layout (layouts.Layout, optional): The layout of the statement. Defaults to
+                                               a grammar accepting every layout.
+
+        Yields:
+            dict: A dictionary representing a transaction, with the following keys:
+                  - "operationDate" (datetime): The date of the transaction.
+                  - "amount" (float): The amount of the transaction.
+                  - "transactionType" (str): The type of transaction (e.g., "Transfer", "Purchase").
+                  - "detail" (str): Additional details about the transaction.
+
+        """
+        if statements is None:
+            statements = self.iter_statements(
+                [text] if pages is None else pages, layout=layout
+            )
+        for date, amount, operation, detail in statements:
+            yield {
+                "operationDate": self.get_date(date, date_format),
+                "amount": self.get_number(amount),
+                "transactionType": operation,
+                "detail": detail,
             }
-            for s in statement
+
+    def get_table(
+        self,
+        text: str | None = None,
+        date_format: str = "%d.%m.%y",
+        pages: Iterable[str] | None = None,
+        statements: Iterable[list] | None = None,
+        layout: layouts.Layout | None = None,
+    ) -> transactions.TransactionTable:
+        """
+        Extracts the transaction details into a columnar `TransactionTable`, decoding
+        dates and amounts for all rows at once instead of one row at a time.
+
+        Args:
+            text (str, optional): The raw text of the bank statement.
+            date_format (str, optional): The format of the dates in the statement. Defaults to "%d.%m.%y".
+            pages (Iterable[str], optional): The text of each page, used instead of text.
+            statements (Iterable[list], optional): Already extracted statements, e.g. from
+                                                   `iter_table_rows`, used instead of text.
+            layout (layouts.Layout, optional): The layout of the statement. Defaults to
+                                               a grammar accepting every layout.
+
+        Returns:
+            transactions.TransactionTable: The transactions of the statement.
+        """
+        if statements is None:
+            statements = self.iter_statements(
+                [text] if pages is None else pages, layout=layout
+            )
+        return transactions.TransactionTable.from_statements(
+            statements, date_format=date_format
+        )
+
+    @staticmethod
+    def group_lines(words: list) -> list[list]:
+        """
+        Groups PyMuPDF words into visual lines by their baseline.
+
+        Args:
+            words (list): Words as returned by `page.get_text("words")`.
+
+        Returns:
+            list[list]: The lines from top to bottom, each sorted from left to right.
+        """
+        lines = []
+        baseline = None
+        for word in sorted(words, key=lambda word: word[3]):
+            if baseline is None or word[3] - baseline > (word[3] - word[1]) / 2:
+                lines.append([])
+                baseline = word[3]
+            lines[-1].append(word)
+        for line in lines:
+            line.sort(key=lambda word: word[0])
+        return lines
+
+    @staticmethod
+    def find_table_columns(lines: list[list]) -> tuple[int, dict] | None:
+        """
+        Finds the header row of the transaction table. The search stops at the
+        first line that starts with a date, since the header precedes the rows.
+
+        Args:
+            lines (list[list]): The lines of a page, as returned by `group_lines`.
+
+        Returns:
+            tuple[int, dict] | None: The index of the header row and the header word
+                                     of each column, or None if the page has no table header.
+        """
+        for index, line in enumerate(lines):
+            if DATE_PATTERN.fullmatch(line[0][4]):
+                return None
+            columns = {}
+            for word in line:
+                column = TABLE_COLUMN_TITLES.get(word[4])
+                if column is not None:
+                    columns.setdefault(column, word)
+            if len(columns) == len(TABLE_COLUMNS):
+                return index, columns
+        return None
+
+    def make_row(self, date: str, cells: list[list[str]]) -> list | None:
+        """
+        Joins the words collected for a table row into a statement.
+
+        Args:
+            date (str): The operation date.
+            cells (list[list[str]]): The words of the amount, operation and details columns.
+
+        Returns:
+            list | None: The date, amount, transaction type and description, or None
+                         if the row is not a transaction.
+        """
+        amount, operation, detail = (" ".join(cell) for cell in cells)
+        if (
+            not amount.endswith("₸")
+            or operation not in transactions.TRANSACTION_TYPE_CODES
+        ):
+            return None
+        return [
+            date,
+            amount,
+            operation,
+            self.replace_statement_extra_text(detail).strip(),
         ]
-        return details
+
+    def iter_table_rows(self, stream=None, file_path=None) -> Iterator:
+        """
+        Lazily extracts a statement from word coordinates instead of flattened text.
+
+        The first item yielded is the text above the transaction table of the first
+        page, which holds the statement header. Every further item is the date, amount,
+        transaction type and description of a statement, assembled from the positions
+        of its words. Columns are located from the table header row and reused on pages
+        without one. Below the header, a line starting with a date opens a row, a line
+        starting in the date column with anything else (the page footer) ends the
+        table on its page, and any other line continues the description of the current
+        row, even across a page break. Only the table region is read on each page.
+
+        Args:
+            stream (bytes | io.BytesIO): The content of the PDF file.
+            file_path (str, optional): The path to the PDF file. Takes precedence over stream.
+
+        Yields:
+            str | list: The header text, then one statement per table row.
+        """
+        import fitz
+
+        elapsed = 0.0
+        page_count = 0
+        columns = None
+        date, cells = None, None
+        try:
+            with (
+                fitz.open(file_path, filetype="pdf")
+                if file_path
+                else fitz.open(stream=stream, filetype="pdf")
+            ) as pdf:
+                for page in pdf:
+                    started = time.perf_counter()
+                    clip = page.rect
+                    if columns is not None:
+                        clip = fitz.Rect(
+                            columns["date"][0] - 1, clip.y0, clip.x1, clip.y1
+                        )
+                    lines = self.group_lines(page.get_text("words", clip=clip))
+                    found = self.find_table_columns(lines)
+                    first = 0
+                    if found is not None:
+                        first, columns = found
+                        first += 1
+                    header = None
+                    if page_count == 0:
+                        top = columns["date"][1] if found is not None else clip.y1
+                        header = page.get_text(
+                            clip=fitz.Rect(clip.x0, clip.y0, clip.x1, top)
+                        )
+                        header = " ".join(header.split())
+                    page_count += 1
+                    elapsed += time.perf_counter() - started
+                    if header is not None:
+                        yield header
+                    if columns is None:
+                        continue
+                    for line in lines[first:]:
+                        word = line[0]
+                        if word[0] < columns["amount"][0] and DATE_PATTERN.fullmatch(
+                            word[4]
+                        ):
+                            if date is not None and (row := self.make_row(date, cells)):
+                                yield row
+                            date, cells = word[4], [[], [], []]
+                            words = line[1:]
+                        elif word[0] < columns["date"][2]:
+                            break
+                        elif date is not None:
+                            words = [
+                                word
+                                for word in line
+                                if word[0] >= columns["detail"][0] - 1
+                            ]
+                        else:
+                            continue
+                        for word in words:
+                            if word[0] < columns["operation"][0] - 1:
+                                cells[0].append(word[4])
+                            elif word[0] < columns["detail"][0] - 1:
+                                cells[1].append(word[4])
+                            else:
+                                cells[2].append(word[4])
+            if date is not None and (row := self.make_row(date, cells)):
+                yield row
+        finally:
+            metrics.observe("kaspi_parser_stage_seconds", elapsed, stage="extract")
+            metrics.observe("kaspi_parser_statement_pages", page_count)
+
+
+@dataclass
+class StatementHeader:
+    """
+    The header of a bank statement: account holder, account and period summary.
+    """
+
+    full_name: str
+    card_number: str | None
+    iban: str | None
+    currency: str | None
+    from_date: datetime
+    to_date: datetime
+    card_balance_date_from: float | None
+    card_balance_date_until: float | None
+    replenishments: float | None
+    transfers: float | None
+    purchases: float | None
+    withdrawals: float | None
+    others: float | None
+
+
+HEADER_FIELDS = (
+    "fio",
+    "card",
+    "iban",
+    "currency",
+    "from",
+    "until",
+    "replenishments",
+    "transfers",
+    "purchases",
+    "withdrawals",
+    "others",
+)
+DATE_PATTERN = re.compile(r"\d{2}\.\d{2}\.\d{2}")
+# The titles of the columns of the transaction table, in Russian and Kazakh.
+TABLE_COLUMNS = {
+    "date": ("Дата", "Күні"),
+    "amount": ("Сумма", "Сомасы"),
+    "operation": ("Операция",),
+    "detail": ("Детали", "Толығырақ"),
+}
+TABLE_COLUMN_TITLES = {
+    title: column for column, titles in TABLE_COLUMNS.items() for title in titles
+}
 
 
 class FileProcessor:
@@ -340,12 +1082,13 @@ class FileProcessor:
         Initializes a new instance of the FileProcessor class.
         This class currently does not maintain state and serves as a utility for processing data into Excel format.
         """
-        pass
 
     @staticmethod
     def to_excel(statement_data: dict, file_path: str) -> None:
         """
         Converts the provided statement data into an Excel file and saves it to the specified file path.
+        Rows are streamed through `exporters.XlsxExporter`, so memory use does not grow with
+        the number of transactions.
 
         Args:
             statement_data (dict): A dictionary containing parsed statement data, including transaction details and metadata.
@@ -358,51 +1101,28 @@ class FileProcessor:
         This function assumes that 'statement_data' includes the keys 'fromDate', 'toDate', 'FIO', 'financialInstitutionName',
         'cardNumber', and 'Details'. Each entry in 'Details' should include 'amount', 'detail', 'operationDate', and 'transactionType'.
         """
-        columns = [
-            "FROM_DATE",
-            "TO_DATE",
-            "STATEMENT_LANGUAGE",
-            "FULL_NAME",
-            "FINANSIAL_INSTITUTION",
-            "AMOUNT",
-            "DETAILS",
-            "OPERATION_DATE",
-            "TRANSACTION_TYPE",
-            "INSERT_DATE",
-            "CARD_NUMBER",
-            "ST_CREATION_DATE",
-            "ST_MODIFIED_DATE",
-            "ST_SUBJECT",
-            "ST_AUTHOR",
-            "ST_TITLE",
-            "ST_PRODUCER",
-        ]
+        FileProcessor.export(statement_data, file_path, export_format="xlsx")
 
-        data = []
-        for detail in statement_data["Details"]:
-            row = [
-                statement_data["fromDate"],
-                statement_data["toDate"],
-                "RUS",
-                statement_data["FIO"],
-                statement_data["financialInstitutionName"],
-                detail["amount"],
-                detail["detail"],
-                detail["operationDate"],
-                detail["transactionType"],
-                None,
-                statement_data["cardNumber"],
-                None,
-                None,
-                None,
-                None,
-                None,
-                None,
-            ]
-            data.append(row)
-        df = pd.DataFrame(data, columns=columns)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        df.to_excel(file_path, index=False)
+    @staticmethod
+    def export(
+        statement_data: dict, file_path: str, export_format: str = "xlsx"
+    ) -> None:
+        """
+        Writes the provided statement data to a file in the given format.
+
+        Args:
+            statement_data (dict): A dictionary containing parsed statement data.
+            file_path (str): The path where the generated file will be saved.
+            export_format (str, optional): One of "xlsx", "csv" or "parquet". Defaults to "xlsx".
+
+        Raises:
+            ValueError: If the export format is not supported.
+        """
+        with metrics.stage("export"):
+            exporters.get_exporter(export_format).to_file(statement_data, file_path)
+        metrics.observe(
+            "kaspi_parser_bytes_processed", os.path.getsize(file_path), stage="export"
+        )
 
 
 class Record:
@@ -416,7 +1136,6 @@ class Record:
         Initializes a Record object. Currently, it does not have any attributes,
         but it can be extended with additional functionality in the future.
         """
-        pass
 
     @staticmethod
     @contextmanager
@@ -426,26 +1145,297 @@ class Record:
 
         This method is used to obtain a session from the session factory
         (`models.SessionLocal`), and ensures that the session is properly
-        closed after use, whether an exception occurs.
+        closed after use, whether an exception occurs. The engine is created
+        on first use if the app lifespan has not created it yet.
 
         Yields:
             db: A database session object, which can be used to interact with
                 the database inside the 'with' block.
         """
+        models.init_engine()
         db = models.SessionLocal()
         try:
             yield db
         finally:
             db.close()
 
-    def insert_record(self, statement_data: dict) -> None:
+    @staticmethod
+    def get_statement_row(statement_data: dict) -> dict:
+        """
+        Maps a parsed statement to the columns of the `bank_statements` table.
+
+        Args:
+            statement_data (dict): A parsed statement as returned by
+                                   `BankStatement.parse_statement`.
+
+        Returns:
+            dict: The column values of the bank statement row.
         """
-        Inserts a new bank statement and its associated transaction details
-        into the database.
+        return {
+            "financial_institution_name": statement_data["financialInstitutionName"],
+            "full_name": statement_data["FIO"],
+            "card_number": statement_data["cardNumber"],
+            "iban": statement_data["IBAN"],
+            "currency": statement_data["currency"],
+            "from_date": datetime.strptime(statement_data["fromDate"], "%d.%m.%y"),
+            "to_date": datetime.strptime(statement_data["toDate"], "%d.%m.%y"),
+            "card_balance_date_from": statement_data["cardBalanceDateFrom"],
+            "card_balance_date_until": statement_data["cardBalanceDateUntil"],
+            "replenishments": statement_data["Replenishments"],
+            "transfers": statement_data["Transfers"],
+            "purchases": statement_data["Purchases"],
+            "withdrawals": statement_data["Withdrawals"],
+            "others": statement_data["Others"],
+        }
+
+    def add_statement(
+        self, db, statement_data: dict, chunk_size: int = config.DB_INSERT_CHUNK_SIZE
+    ) -> int:
+        """
+        Writes a bank statement and its transaction details using bulk Core inserts
+        inside the caller's transaction, without committing.
+
+        The statement row is inserted with `INSERT ... RETURNING id` and the details
+        are written with executemany in chunks of `chunk_size` rows. "Details" may be
+        a lazy iterator, in which case it is consumed one chunk at a time. Every
+        detail is stored with the IBAN and its fingerprint, so later overlapping
+        statements can be ingested incrementally. The summaries of the statement
+        are computed from the same chunks and stored with it.
+
+        Args:
+            db: A database session.
+            statement_data (dict): A parsed statement as returned by
+                                   `BankStatement.parse_statement`.
+            chunk_size (int, optional): The number of details written per executemany.
+
+        Returns:
+            int: The id of the inserted bank statement.
+        """
+        bank_statement_id = self.add_statement_row(db, statement_data)
+        builder = rollups.RollupBuilder() if config.ROLLUPS_ENABLED else None
+        rows = transactions.iter_fingerprinted_rows(statement_data["Details"])
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            self.add_details(db, bank_statement_id, statement_data["IBAN"], chunk)
+            if builder is not None:
+                builder.add(chunk)
+        if builder is not None:
+            self.add_rollups(db, bank_statement_id, statement_data, builder)
+        return bank_statement_id
+
+    def add_statement_delta(
+        self, db, statement_data: dict, chunk_size: int = config.DB_INSERT_CHUNK_SIZE
+    ) -> dict:
+        """
+        Writes a bank statement, storing only the transactions not already stored
+        for the same IBAN, inside the caller's transaction, without committing.
+
+        The fingerprints stored for the IBAN within the statement period are read
+        with one query on the (iban, operation_date) index. New transactions are
+        inserted in chunks of `chunk_size` rows; transactions already stored are
+        linked to the statement in `statement_transactions` instead. The summaries
+        of the statement cover both.
+
+        Args:
+            db: A database session.
+            statement_data (dict): A parsed statement as returned by
+                                   `BankStatement.parse_statement`.
+            chunk_size (int, optional): The number of rows written per executemany.
+
+        Returns:
+            dict: The id of the inserted bank statement, and the number of new and
+                  deduplicated transactions.
+        """
+        statement_row = self.get_statement_row(statement_data)
+        detail = models.TransactionDetail
+        stored = dict(
+            db.execute(
+                select(detail.fingerprint, func.min(detail.id))
+                .where(
+                    detail.iban == statement_row["iban"],
+                    detail.operation_date >= statement_row["from_date"],
+                    detail.operation_date
+                    < statement_row["to_date"] + timedelta(days=1),
+                    detail.fingerprint.is_not(None),
+                )
+                .group_by(detail.fingerprint)
+            ).all()
+        )
+        bank_statement_id = self.add_statement_row(db, statement_data)
+
+        new = deduplicated = 0
+        builder = rollups.RollupBuilder() if config.ROLLUPS_ENABLED else None
+        rows = transactions.iter_fingerprinted_rows(statement_data["Details"])
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            if builder is not None:
+                builder.add(chunk)
+            links = [
+                {
+                    "bank_statement_id": bank_statement_id,
+                    "transaction_detail_id": stored[row[-1]],
+                    "operation_date": row[0],
+                }
+                for row in chunk
+                if row[-1] in stored
+            ]
+            fresh = [row for row in chunk if row[-1] not in stored]
+            if fresh:
+                self.add_details(db, bank_statement_id, statement_row["iban"], fresh)
+            if links:
+                db.execute(insert(models.StatementTransaction), links)
+            new += len(fresh)
+            deduplicated += len(links)
+        if builder is not None:
+            self.add_rollups(db, bank_statement_id, statement_data, builder)
+        return {"id": bank_statement_id, "new": new, "deduplicated": deduplicated}
+
+    def add_statement_row(self, db, statement_data: dict) -> int:
+        """
+        Inserts the row of a bank statement without its details.
+
+        Args:
+            db: A database session.
+            statement_data (dict): A parsed statement.
+
+        Returns:
+            int: The id of the inserted bank statement.
+        """
+        return db.execute(
+            insert(models.BankStatement)
+            .values(**self.get_statement_row(statement_data))
+            .returning(models.BankStatement.id)
+        ).scalar_one()
+
+    @staticmethod
+    def add_rollups(
+        db,
+        bank_statement_id: int,
+        statement_data: dict,
+        builder: rollups.RollupBuilder,
+    ) -> list[dict]:
+        """
+        Computes the summaries of a statement and inserts them into the summary
+        tables. A summary that does not reconcile with the totals printed in the
+        statement header is logged as a warning.
+
+        Args:
+            db: A database session.
+            bank_statement_id (int): The id of the statement.
+            statement_data (dict): The statement, in the format of `parse_statement`.
+            builder (rollups.RollupBuilder): The builder the transactions were added to.
+
+        Returns:
+            list[dict]: The reconciliation, as returned by `rollups.reconcile`.
+        """
+        with metrics.stage("rollups"):
+            summary = builder.build(
+                from_date=datetime.strptime(statement_data["fromDate"], "%d.%m.%y"),
+                to_date=datetime.strptime(statement_data["toDate"], "%d.%m.%y"),
+                opening_balance=statement_data["cardBalanceDateFrom"],
+            )
+            for table, rows in (
+                (models.StatementMonthlyRollup, summary["monthly"]),
+                (models.StatementTypeRollup, summary["types"]),
+                (models.StatementCounterpartyRollup, summary["counterparties"]),
+            ):
+                if rows:
+                    db.execute(
+                        insert(table),
+                        [
+                            {"bank_statement_id": bank_statement_id, **row}
+                            for row in rows
+                        ],
+                    )
+        reconciliation = rollups.reconcile(
+            statement_data, summary["types"], summary["monthly"]
+        )
+        for entry in reconciliation:
+            if not entry["reconciled"]:
+                logger.warning(
+                    "Statement %s does not reconcile: %s is %s, transactions add up to %s",
+                    bank_statement_id,
+                    entry["category"],
+                    entry["statementTotal"],
+                    entry["computedTotal"],
+                )
+        return reconciliation
+
+    def rebuild_rollups(self, db, bank_statement_id: int) -> None:
+        """
+        Recomputes the summaries of a stored statement from its transactions,
+        e.g. for statements stored before summaries were computed at ingest,
+        inside the caller's transaction, without committing.
+
+        Args:
+            db: A database session.
+            bank_statement_id (int): The id of the statement.
+        """
+        for table in (
+            models.StatementMonthlyRollup,
+            models.StatementTypeRollup,
+            models.StatementCounterpartyRollup,
+        ):
+            db.execute(
+                delete(table).where(table.bank_statement_id == bank_statement_id)
+            )
+        transactions = queries.statement_transactions(bank_statement_id)
+        builder = rollups.RollupBuilder()
+        builder.add(
+            db.execute(
+                select(
+                    transactions.c.operation_date,
+                    transactions.c.amount,
+                    transactions.c.transaction_type,
+                    transactions.c.detail,
+                )
+                .order_by(transactions.c.operation_date, transactions.c.id)
+                .execution_options(yield_per=config.DB_INSERT_CHUNK_SIZE)
+            )
+        )
+        statement = queries.get_statement(db, bank_statement_id)
+        self.add_rollups(
+            db,
+            bank_statement_id,
+            {
+                **statement,
+                "fromDate": statement["fromDate"].strftime("%d.%m.%y"),
+                "toDate": statement["toDate"].strftime("%d.%m.%y"),
+            },
+            builder,
+        )
+
+    @staticmethod
+    def add_details(db, bank_statement_id: int, iban: str, rows: list[tuple]) -> None:
+        """
+        Inserts transaction details with a single executemany.
+
+        Args:
+            db: A database session.
+            bank_statement_id (int): The id of the statement the details belong to.
+            iban (str): The IBAN of the statement.
+            rows (list[tuple]): Rows as yielded by `transactions.iter_fingerprinted_rows`.
+        """
+        db.execute(
+            insert(models.TransactionDetail),
+            [
+                {
+                    "operation_date": operation_date,
+                    "amount": amount,
+                    "transaction_type": transaction_type,
+                    "detail": detail,
+                    "bank_statement_id": bank_statement_id,
+                    "iban": iban,
+                    "fingerprint": fingerprint,
+                }
+                for operation_date, amount, transaction_type, detail, fingerprint in rows
+            ],
+        )
 
-        This method takes a dictionary `statement_data` containing bank
-        statement and transaction details, processes the data, and stores it
-        in the appropriate database tables: `BankStatement` and `TransactionDetail`.
+    def insert_record(
+        self, statement_data: dict, chunk_size: int = config.DB_INSERT_CHUNK_SIZE
+    ) -> int:
+        """
+        Inserts a new bank statement and its associated transaction details
+        into the database in a single transaction.
 
         Args:
             statement_data (dict): A dictionary containing the bank statement
@@ -453,58 +1443,92 @@ class Record:
                                     dictionary must contain keys such as
                                     "financialInstitutionName", "FIO",
                                     "cardNumber", etc.
+            chunk_size (int, optional): The number of details written per executemany.
 
         Returns:
-            None: This method does not return any value, it only performs
-                  database operations.
-
-        Logs:
-            The method logs progress and errors. If the operation is successful,
-            it logs the insertion of both the `BankStatement` and `TransactionDetail`
-            records, including the generated ID for each. If an error occurs during
-            the process, an error message is logged.
+            int: The id of the inserted bank statement.
 
-        Exceptions:
-            Any exceptions that occur during the database insertions are caught
-            and logged as errors.
+        Raises:
+            Exception: Any error raised during the insertions is logged and
+                       re-raised. Nothing is stored in that case.
         """
         try:
-            bank_statement = models.BankStatement(
-                financial_institution_name=statement_data["financialInstitutionName"],
-                full_name=statement_data["FIO"],
-                card_number=statement_data["cardNumber"],
-                iban=statement_data["IBAN"],
-                currency=statement_data["currency"],
-                from_date=datetime.strptime(statement_data["fromDate"], "%d.%m.%y"),
-                to_date=datetime.strptime(statement_data["toDate"], "%d.%m.%y"),
-                card_balance_date_from=statement_data["cardBalanceDateFrom"],
-                card_balance_date_until=statement_data["cardBalanceDateUntil"],
-                replenishments=statement_data["Replenishments"],
-                transfers=statement_data["Transfers"],
-                purchases=statement_data["Purchases"],
-                withdrawals=statement_data["Withdrawals"],
-                others=statement_data["Others"],
+            with metrics.stage("db"), self.get_db() as db:
+                bank_statement_id = self.add_statement(db, statement_data, chunk_size)
+                db.commit()
+            logger.info(
+                "BankStatement and TransactionDetails added with id: %s",
+                bank_statement_id,
             )
-            with self.get_db() as db:
-                config.logging.info("Adding bank_statement to DB")
-                db.add(bank_statement)
+            return bank_statement_id
+        except Exception as error:
+            logger.error("An error occurred while inserting record: %s", error)
+            raise
+
+    def ingest_record(
+        self, statement_data: dict, chunk_size: int = config.DB_INSERT_CHUNK_SIZE
+    ) -> dict:
+        """
+        Inserts a bank statement in a single transaction, storing only the
+        transactions that earlier statements of the same IBAN did not contain.
+
+        Args:
+            statement_data (dict): A parsed statement in the format accepted by
+                                   `insert_record`.
+            chunk_size (int, optional): The number of rows written per executemany.
+
+        Returns:
+            dict: The id of the inserted bank statement, and the number of new and
+                  deduplicated transactions.
+
+        Raises:
+            Exception: Any error raised during the insertions is logged and
+                       re-raised. Nothing is stored in that case.
+        """
+        try:
+            with metrics.stage("db"), self.get_db() as db:
+                result = self.add_statement_delta(db, statement_data, chunk_size)
                 db.commit()
-                db.refresh(bank_statement)
-                config.logging.info(f"BankStatement added with id: {bank_statement.id}")
-
-                for detail in statement_data["Details"]:
-                    transaction_detail = models.TransactionDetail(
-                        operation_date=detail["operationDate"],
-                        amount=detail["amount"],
-                        transaction_type=detail["transactionType"],
-                        detail=detail["detail"],
-                        bank_statement_id=bank_statement.id,
-                    )
+            logger.info(
+                "BankStatement %s ingested: %s new, %s deduplicated TransactionDetails",
+                result["id"],
+                result["new"],
+                result["deduplicated"],
+            )
+            return result
+        except Exception as error:
+            logger.error("An error occurred while ingesting record: %s", error)
+            raise
+
+    def insert_records(
+        self, statements: list[dict], chunk_size: int = config.DB_INSERT_CHUNK_SIZE
+    ) -> list[int]:
+        """
+        Inserts several bank statements and their transaction details into the
+        database in a single transaction. Either every statement is stored or,
+        if any insert fails, none of them are.
+
+        Args:
+            statements (list[dict]): A list of parsed statements in the format
+                                     accepted by `insert_record`.
+            chunk_size (int, optional): The number of details written per executemany.
 
-                    db.add(transaction_detail)
+        Returns:
+            list[int]: The ids of the inserted bank statements.
+
+        Raises:
+            Exception: Any error raised during the insertions is logged and
+                       re-raised after the transaction is rolled back.
+        """
+        try:
+            with metrics.stage("db"), self.get_db() as db:
+                bank_statement_ids = [
+                    self.add_statement(db, statement_data, chunk_size)
+                    for statement_data in statements
+                ]
                 db.commit()
-                config.logging.info(
-                    f"TransactionDetails added for bank_statement_id: {bank_statement.id}"
-                )
+            logger.info("%s bank statements added to DB", len(statements))
+            return bank_statement_ids
         except Exception as error:
-            config.logging.error(f"An error occurred while inserting record: {error}")
+            logger.error("An error occurred while inserting records: %s", error)
+            raise
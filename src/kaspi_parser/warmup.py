@@ -0,0 +1,55 @@
+from src.kaspi_parser import metrics, util
+
+# A two-transaction statement in the Russian Kaspi Gold layout.
+SAMPLE_LINES = [
+    "ВЫПИСКА по Kaspi Gold за период с 01.12.24 по 31.12.24",
+    "Иванов Иван Номер карты: *0000",
+    "Номер счета: KZ00722S000000000000 Валюта счета: KZT",
+    "Доступно на 01.12.24 1 000,00 ₸",
+    "Доступно на 31.12.24 1 400,00 ₸",
+    "Пополнения +500,00 ₸",
+    "Переводы 0,00 ₸",
+    "Покупки -100,00 ₸",
+    "Снятия 0,00 ₸",
+    "Разное 0,00 ₸",
+    "Дата Сумма Операция Детали",
+    "31.12.24 + 500,00 ₸ Пополнение С Kaspi Депозита",
+    "15.12.24 - 100,00 ₸ Покупка Magnum Cash&Carry",
+]
+
+
+def build_sample_pdf() -> bytes:
+    """
+    Builds a one-page PDF with the sample statement. The text is written with
+    the CJK fallback font built into MuPDF, which covers Cyrillic and ₸.
+
+    Returns:
+        bytes: The content of the PDF.
+    """
+    import fitz
+
+    font = fitz.Font("cjk")
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        writer = fitz.TextWriter(page.rect)
+        for offset, line in enumerate(SAMPLE_LINES):
+            writer.append((30, 40 + offset * 16), line, font=font, fontsize=8)
+        writer.write_text(page)
+        return pdf.tobytes()
+
+
+def warm_up() -> int:
+    """
+    Parses the sample statement once, so that PyMuPDF, numpy and the parser
+    code paths are loaded before the first request. Metrics observed while
+    doing so are discarded.
+
+    Returns:
+        int: The number of parsed transactions.
+    """
+    statement_data, _ = metrics.collect(
+        util.BankStatement().parse_statement,
+        file_bytes=build_sample_pdf(),
+        columnar=True,
+    )
+    return len(statement_data["Details"])
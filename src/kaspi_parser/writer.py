@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+
+from fastapi.concurrency import run_in_threadpool
+
+from src.kaspi_parser import config, responses, util
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a statement cannot be queued because the write-behind queue
+    stayed full for longer than the put timeout.
+    """
+
+
+class WriteBehindQueue:
+    """
+    A class to persist parsed statements in the background.
+
+    Statements are put on a bounded in-process queue and a background task
+    writes them to the database in multi-statement batches, flushing once a
+    batch reaches `batch_size` statements or `flush_interval` seconds have
+    passed since its first statement, whichever comes first. If a batch fails,
+    its statements are retried one by one, and those that still fail are counted
+    and appended to the dead-letter file.
+    """
+
+    def __init__(
+        self,
+        record: util.Record,
+        max_size: int = config.WRITE_BEHIND_QUEUE_SIZE,
+        batch_size: int = config.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = config.WRITE_BEHIND_FLUSH_INTERVAL,
+        put_timeout: float = config.WRITE_BEHIND_PUT_TIMEOUT,
+        dead_letter_path: str = config.WRITE_BEHIND_DEAD_LETTER_PATH,
+    ) -> None:
+        """
+        Initializes a new instance of the WriteBehindQueue class.
+
+        Args:
+            record (util.Record): The record used to write batches.
+            max_size (int): The maximum number of queued statements.
+            batch_size (int): The maximum number of statements written per batch.
+            flush_interval (float): The maximum number of seconds a statement waits
+                                    for its batch to fill up.
+            put_timeout (float): The number of seconds `put` waits for free space.
+            dead_letter_path (str): The JSON lines file the statements that could
+                                    not be written are appended to. Empty disables it.
+        """
+        self.record = record
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dead_letter_path = dead_letter_path
+        self.stats = {"written": 0, "failed": 0}
+        self.queue = None
+        self.task = None
+        self.closed = False
+
+    def start(self) -> None:
+        """
+        Starts the background flush task on the running event loop, unless it
+        is already running there.
+        """
+        if self.task is None or self.task.get_loop() is not asyncio.get_running_loop():
+            self.queue = asyncio.Queue(maxsize=self.max_size)
+            self.closed = False
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops accepting statements, writes everything still queued and waits
+        for the background task to finish.
+        """
+        if self.task is None:
+            return
+        self.closed = True
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    async def put(self, statement_data: dict) -> None:
+        """
+        Queues a parsed statement for writing, waiting for free space if the
+        queue is full.
+
+        Args:
+            statement_data (dict): The parsed statement.
+
+        Raises:
+            QueueFullError: If the queue is still full after `put_timeout` seconds
+                            or is shutting down.
+        """
+        if self.closed:
+            raise QueueFullError("Write-behind queue is shutting down")
+        self.start()
+        try:
+            await asyncio.wait_for(self.queue.put(statement_data), self.put_timeout)
+        except asyncio.TimeoutError:
+            raise QueueFullError("Write-behind queue is full") from None
+
+    def qsize(self) -> int:
+        """
+        Returns the number of statements waiting to be written.
+
+        Returns:
+            int: The number of statements waiting to be written.
+        """
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def run(self) -> None:
+        """
+        Collects queued statements into batches and writes them until a stop
+        sentinel is received.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            statement_data = await self.queue.get()
+            if statement_data is None:
+                break
+            batch = [statement_data]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    statement_data = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if statement_data is None:
+                    stopping = True
+                    break
+                batch.append(statement_data)
+            await self.flush(batch)
+
+    async def flush(self, batch: list[dict]) -> None:
+        """
+        Writes a batch of statements in one transaction. If that fails, the
+        statements are written one by one, so one bad statement does not lose
+        the rest of the batch. The requests that queued them have already been
+        answered, so failures are logged, counted and dead-lettered.
+
+        Args:
+            batch (list[dict]): The statements to write.
+        """
+        try:
+            await run_in_threadpool(self.record.insert_records, statements=batch)
+            self.stats["written"] += len(batch)
+            return
+        except Exception:
+            logger.warning(
+                "Write-behind batch of %s statements failed, retrying one by one",
+                len(batch),
+                exc_info=True,
+            )
+        for statement_data in batch:
+            try:
+                await run_in_threadpool(
+                    self.record.insert_record, statement_data=statement_data
+                )
+                self.stats["written"] += 1
+            except Exception:
+                logger.exception(
+                    "Write-behind statement of %s failed", statement_data.get("IBAN")
+                )
+                self.stats["failed"] += 1
+                if self.dead_letter_path:
+                    await run_in_threadpool(self.dead_letter, statement_data)
+
+    def dead_letter(self, statement_data: dict) -> None:
+        """
+        Appends a statement that could not be written to the dead-letter file.
+
+        Args:
+            statement_data (dict): The parsed statement.
+        """
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.dead_letter_path)), exist_ok=True
+        )
+        with open(self.dead_letter_path, "ab") as file:
+            file.write(responses.dumps(statement_data, newline=True))
@@ -0,0 +1,163 @@
+import random
+from datetime import date, timedelta
+
+import fitz
+
+ROWS_PER_PAGE = 45
+HEADER_ROWS = 11
+# The left edges of the date, operation and details columns, and the right edge
+# of the right-aligned amount column.
+DATE_X = 30
+AMOUNT_RIGHT_X = 160
+OPERATION_X = 175
+DETAILS_X = 260
+
+LAYOUTS = {
+    "ru": {
+        "footer": "АО «Kaspi Bank», БИК CASPKZKA, www.kaspi.kz",
+        "title": "ВЫПИСКА по Kaspi Gold за период с {date_from} по {date_until}",
+        "holder": "{full_name} Номер карты: {card_number}",
+        "account": "Номер счета: {iban} Валюта счета: KZT",
+        "balance": "Доступно на {date} {amount} ₸",
+        "columns": ("Дата", "Сумма", "Операция", "Детали"),
+        "operations": {
+            "replenishment": ("Пополнение", "Пополнения"),
+            "transfer": ("Перевод", "Переводы"),
+            "purchase": ("Покупка", "Покупки"),
+            "withdrawal": ("Снятие", "Снятия"),
+            "other": ("Разное", "Разное"),
+        },
+    },
+    "kz": {
+        "footer": "«Kaspi Bank» АҚ, БСК CASPKZKA, www.kaspi.kz",
+        "title": "{date_from}ж. бастап {date_until}ж. дейінгі кезеңге",
+        "holder": "Kaspi Gold бойынша {full_name} Карта нөмірі: {card_number}",
+        "account": "Шот нөмірі: {iban} Шот валютасы: KZT",
+        "balance": "{date}ж. қолжетімді: {amount} ₸",
+        "columns": ("Күні", "Сомасы", "Операция", "Толығырақ"),
+        "operations": {
+            "replenishment": ("Толықтыру", "Толықтыру"),
+            "transfer": ("Аударым", "Аударым"),
+            "purchase": ("Зат сатып алу", "Зат сатып алу"),
+            "withdrawal": ("Ақша алу", "Ақша алу"),
+            "other": ("Əртүрлі", "Əртүрлі"),
+        },
+    },
+}
+
+DEFAULT_OPERATION_MIX = {
+    "replenishment": 2,
+    "transfer": 3,
+    "purchase": 6,
+    "withdrawal": 1,
+    "other": 1,
+}
+
+DESCRIPTIONS = {
+    "replenishment": ["С Kaspi Депозита", "Зарплата ТОО Ромашка", "Айгерим А."],
+    "transfer": ["Айгерим А.", "Ерлан Б.", "Kaspi Red оплата"],
+    "purchase": ["ИП Магазин у дома", "Magnum Cash&Carry", "Yandex Go", "Small"],
+    "withdrawal": ["Банкомат Kaspi Алматы", "Банкомат Halyk"],
+    "other": ["Комиссия за перевод", "Возврат"],
+}
+
+
+def format_amount(amount: float) -> str:
+    """
+    Formats an amount the way Kaspi statements do, e.g. 1234.5 -> "1 234,50".
+    """
+    return f"{abs(amount):,.2f}".replace(",", " ").replace(".", ",")
+
+
+def generate_statement(
+    transactions: int = 40,
+    pages: int | None = None,
+    language: str = "ru",
+    operation_mix: dict | None = None,
+    seed: int = 0,
+) -> bytes:
+    """
+    Generates a synthetic Kaspi Gold statement PDF.
+
+    Args:
+        transactions (int, optional): The number of transactions. Ignored if pages is given.
+        pages (int, optional): The number of pages to fill with transactions.
+        language (str, optional): "ru" or "kz". Defaults to "ru".
+        operation_mix (dict, optional): Relative weights of "replenishment", "transfer",
+                                        "purchase", "withdrawal" and "other" operations.
+        seed (int, optional): The random seed, so the same arguments give the same PDF.
+
+    Returns:
+        bytes: The content of the generated PDF.
+    """
+    layout = LAYOUTS[language]
+    operation_mix = operation_mix or DEFAULT_OPERATION_MIX
+    rng = random.Random(seed)
+    if pages is not None:
+        transactions = max(pages * ROWS_PER_PAGE - HEADER_ROWS, 0)
+
+    date_until = date(2024, 12, 31)
+    date_from = date_until - timedelta(days=max(transactions // 5, 30))
+    kinds = rng.choices(
+        list(operation_mix), weights=list(operation_mix.values()), k=transactions
+    )
+    rows = []
+    totals = dict.fromkeys(DEFAULT_OPERATION_MIX, 0.0)
+    for index, kind in enumerate(kinds):
+        operation_date = date_until - timedelta(
+            days=index * (date_until - date_from).days // max(transactions, 1)
+        )
+        amount = round(rng.uniform(100, 250000), 2)
+        amount = amount if kind == "replenishment" else -amount
+        totals[kind] += amount
+        rows.append(
+            (
+                f"{operation_date:%d.%m.%y}",
+                f"{'+' if amount >= 0 else '-'} {format_amount(amount)} ₸",
+                layout["operations"][kind][0],
+                rng.choice(DESCRIPTIONS[kind]),
+            )
+        )
+
+    balance_from = 100000.0
+    balance_until = balance_from + sum(totals.values())
+    lines = [
+        layout["title"].format(
+            date_from=f"{date_from:%d.%m.%y}", date_until=f"{date_until:%d.%m.%y}"
+        ),
+        layout["holder"].format(full_name="Иванов Иван", card_number="*1234"),
+        layout["account"].format(iban="KZ00722S000000000001"),
+        layout["balance"].format(
+            date=f"{date_from:%d.%m.%y}", amount=format_amount(balance_from)
+        ),
+        layout["balance"].format(
+            date=f"{date_until:%d.%m.%y}",
+            amount=("-" if balance_until < 0 else "") + format_amount(balance_until),
+        ),
+    ]
+    for kind, (_, label) in layout["operations"].items():
+        sign = "+" if totals[kind] >= 0 else "-"
+        lines.append(f"{label} {sign}{format_amount(totals[kind])} ₸")
+    lines.append(layout["columns"])
+    lines.extend(rows)
+
+    font = fitz.Font("cjk")
+    with fitz.open() as pdf:
+        for start in range(0, max(len(lines), 1), ROWS_PER_PAGE):
+            page = pdf.new_page()
+            writer = fitz.TextWriter(page.rect)
+            for offset, line in enumerate(lines[start : start + ROWS_PER_PAGE]):
+                y = 40 + offset * 16
+                if isinstance(line, str):
+                    writer.append((DATE_X, y), line, font=font, fontsize=8)
+                    continue
+                operation_date, amount, operation, detail = line
+                amount_x = AMOUNT_RIGHT_X - font.text_length(amount, fontsize=8)
+                writer.append((DATE_X, y), operation_date, font=font, fontsize=8)
+                writer.append((amount_x, y), amount, font=font, fontsize=8)
+                writer.append((OPERATION_X, y), operation, font=font, fontsize=8)
+                writer.append((DETAILS_X, y), detail, font=font, fontsize=8)
+            writer.append((DATE_X, page.rect.height - 30), layout["footer"], font=font)
+            writer.write_text(page)
+        pdf.subset_fonts()
+        return pdf.tobytes(garbage=3, deflate=True)
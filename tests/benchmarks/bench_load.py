@@ -0,0 +1,489 @@
+"""
+Load-tests the parse endpoint and reports throughput, latency percentiles, errors and memory.
+
+The app runs in-process, with its lifespan, unless --url points at a running
+server. The in-process app is configured through the usual environment
+variables, e.g. DATABASE_URL, EXECUTOR_BACKEND and EXECUTOR_MAX_WORKERS.
+
+Usage:
+    python -m tests.benchmarks.bench_load --concurrency 1 4 16 --requests 200
+    python -m tests.benchmarks.bench_load --mix dry_run=3 excel=1 --sizes 1 10 50
+    python -m tests.benchmarks.bench_load --url http://127.0.0.1:8000 --server-pid 1234
+    python -m tests.benchmarks.bench_load --output new.json --compare load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+import httpx
+
+from tests.assets import statements
+from tests.benchmarks.bench_parser import get_metadata
+
+DEFAULT_CONCURRENCY = [1, 4, 16]
+DEFAULT_SIZES = [1, 10, 50]
+
+# The PDFRequest options of every request kind.
+SCENARIOS = {
+    "dry_run": {"dry_run": True},
+    "persist": {"dry_run": False},
+    "excel": {"dry_run": True, "to_excel": True},
+    "persist_excel": {"dry_run": False, "to_excel": True},
+}
+
+
+def parse_mix(items: list[str]) -> dict[str, float]:
+    """
+    Parses the request mix given on the command line.
+
+    Args:
+        items (list[str]): Items such as "dry_run=3" or "excel", which has weight 1.
+
+    Returns:
+        dict[str, float]: The weight of every scenario.
+
+    Raises:
+        ValueError: If a scenario is unknown or a weight is not positive.
+    """
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}"
+            )
+        mix[name] = float(weight or 1)
+        if mix[name] <= 0:
+            raise ValueError(f"The weight of {name!r} must be positive")
+    return mix
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """
+    Returns a percentile of sorted values by the nearest-rank method.
+
+    Args:
+        values (list[float]): The sorted values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float | None: The percentile, or None if there are no values.
+    """
+    if not values:
+        return None
+    rank = max(int(-(-q * len(values) // 100)), 1)
+    return values[rank - 1]
+
+
+def summarize(samples: list[dict], elapsed: float) -> dict:
+    """
+    Aggregates the samples of a run.
+
+    Args:
+        samples (list[dict]): One sample per request, with its "latency" in
+                              seconds and "ok" flag.
+        elapsed (float): The wall-clock duration of the run in seconds.
+
+    Returns:
+        dict: The request and error counts, error rate, throughput in requests
+              per second and latency statistics in milliseconds.
+    """
+    latencies = sorted(sample["latency"] * 1000 for sample in samples)
+    errors = sum(not sample["ok"] for sample in samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "throughput": (len(samples) - errors) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+    }
+
+
+def read_rss(pid: int) -> int:
+    """
+    Returns the resident set size of a process and all its descendants, e.g.
+    the workers of a process pool.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        int: The resident set size in bytes, or 0 if /proc is not available.
+    """
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", encoding="ascii") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            with open(
+                f"/proc/{current}/task/{current}/children", encoding="ascii"
+            ) as file:
+                pending.extend(int(child) for child in file.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class RssSampler:
+    """
+    Samples the resident set size of a process tree in the background and
+    keeps the peak.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.05) -> None:
+        """
+        Initializes a new instance of the RssSampler class.
+
+        Args:
+            pid (int): The id of the root process.
+            interval (float, optional): The number of seconds between samples.
+        """
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.task = None
+
+    async def run(self) -> None:
+        while True:
+            self.peak = max(self.peak, read_rss(self.pid))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """
+        Starts sampling on the running event loop.
+        """
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops sampling, after a last sample.
+        """
+        self.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.task
+        self.peak = max(self.peak, read_rss(self.pid))
+
+
+def build_payloads(sizes: list[int], language: str) -> dict[int, str]:
+    """
+    Generates one base64 encoded statement per size.
+
+    Args:
+        sizes (list[int]): The page counts.
+        language (str): The statement language.
+
+    Returns:
+        dict[int, str]: The base64 encoded PDF of every page count.
+    """
+    return {
+        pages: base64.b64encode(
+            statements.generate_statement(pages=pages, language=language)
+        ).decode("ascii")
+        for pages in sizes
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    payloads: dict[int, str],
+    mix: dict[str, float],
+    concurrency: int,
+    requests: int,
+    duration: float | None,
+    cache: str,
+    seed: int,
+    pid: int | None,
+) -> dict:
+    """
+    Sends requests from `concurrency` concurrent clients, until `requests` were
+    sent or `duration` seconds passed.
+
+    Args:
+        client (httpx.AsyncClient): The client bound to the app or server.
+        payloads (dict[int, str]): The base64 encoded PDF of every page count.
+        mix (dict[str, float]): The weight of every scenario.
+        concurrency (int): The number of requests in flight.
+        requests (int): The number of requests sent, if no duration is given.
+        duration (float | None): The number of seconds to send requests for.
+        cache (str): The `cache` option of the requests, "use" or "bypass".
+        seed (int): The seed choosing the scenario and size of every request.
+        pid (int | None): The id of the server process whose memory is sampled.
+
+    Returns:
+        dict: The totals, and the totals per scenario and size.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    sizes = list(payloads)
+    samples = []
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def next_request() -> tuple[str, int] | None:
+        if deadline is None and len(samples) + in_flight >= requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        return rng.choices(names, weights)[0], rng.choice(sizes)
+
+    async def worker() -> None:
+        nonlocal in_flight
+        while (chosen := next_request()) is not None:
+            scenario, pages = chosen
+            body = {
+                "base64_pdf": payloads[pages],
+                "cache": cache,
+                **SCENARIOS[scenario],
+            }
+            in_flight += 1
+            sent = time.perf_counter()
+            try:
+                response = await client.post("/parse-statement/", json=body)
+                await response.aread()
+                ok, status = response.status_code == 200, response.status_code
+            except httpx.HTTPError as error:
+                ok, status = False, type(error).__name__
+            in_flight -= 1
+            samples.append(
+                {
+                    "scenario": scenario,
+                    "pages": pages,
+                    "latency": time.perf_counter() - sent,
+                    "ok": ok,
+                    "status": status,
+                }
+            )
+
+    in_flight = 0
+    sampler = RssSampler(pid) if pid is not None else None
+    if sampler is not None:
+        sampler.start()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if sampler is not None:
+            await sampler.stop()
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        **summarize(samples, elapsed),
+        "statuses": statuses,
+        "peak_rss_bytes": sampler.peak if sampler is not None else None,
+        "scenarios": {
+            name: summarize(
+                [sample for sample in samples if sample["scenario"] == name], elapsed
+            )
+            for name in names
+        },
+        "sizes": {
+            str(pages): summarize(
+                [sample for sample in samples if sample["pages"] == pages], elapsed
+            )
+            for pages in sizes
+        },
+    }
+
+
+@contextlib.asynccontextmanager
+async def open_client(url: str | None, timeout: float):
+    """
+    Opens a client for a running server, or for the app in this process, whose
+    lifespan is run so that the executor and the queues are started.
+
+    Args:
+        url (str | None): The base URL of the server, or None to run the app in-process.
+        timeout (float): The request timeout in seconds.
+
+    Yields:
+        httpx.AsyncClient: The client.
+    """
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    from src.kaspi_parser import main
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-test", timeout=timeout
+        ) as client:
+            yield client
+
+
+def get_configuration(url: str | None) -> dict:
+    """
+    Describes the server configuration, so that runs with different worker
+    counts or executors can be told apart.
+
+    Args:
+        url (str | None): The base URL of the server, or None for the in-process app.
+
+    Returns:
+        dict: The target and, in-process, the executor and job settings.
+    """
+    if url:
+        return {"target": url}
+    from src.kaspi_parser import config
+
+    return {
+        "target": "in-process",
+        "executor_backend": config.EXECUTOR_BACKEND,
+        "executor_max_workers": config.EXECUTOR_MAX_WORKERS,
+        "database_url": config.DATABASE_URL.split("@")[-1],
+    }
+
+
+async def run(args: argparse.Namespace, mix: dict[str, float]) -> dict:
+    payloads = build_payloads(args.sizes, args.language)
+    pid = args.server_pid if args.url else os.getpid()
+    results = {
+        "metadata": get_metadata(),
+        "configuration": get_configuration(args.url),
+        "parameters": {
+            "requests": args.requests,
+            "duration": args.duration,
+            "mix": mix,
+            "sizes": args.sizes,
+            "cache": args.cache,
+            "seed": args.seed,
+        },
+        "levels": [],
+    }
+    async with open_client(args.url, args.timeout) as client:
+        for concurrency in args.concurrency:
+            level = await run_level(
+                client,
+                payloads,
+                mix,
+                concurrency,
+                args.requests,
+                args.duration,
+                args.cache,
+                args.seed,
+                pid,
+            )
+            results["levels"].append(level)
+            latency = level["latency_ms"]
+            print(
+                f"concurrency {concurrency:>3}: {level['throughput']:8.2f} req/s, "
+                f"p50 {latency['p50'] or 0:8.1f} ms, p95 {latency['p95'] or 0:8.1f} ms, "
+                f"p99 {latency['p99'] or 0:8.1f} ms, errors {level['error_rate']:.1%}",
+                file=sys.stderr,
+            )
+    if not args.url:
+        # The peak of this process over its whole life, workers excluded.
+        results["max_rss_bytes"] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        )
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares the throughput and p99 latency of every concurrency level with a baseline run.
+
+    Args:
+        results (dict): The current results.
+        baseline (dict): The results of the baseline run.
+        threshold (float): The relative degradation reported as a regression, e.g. 0.1.
+
+    Returns:
+        list[str]: One line per metric that degraded by more than the threshold.
+    """
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    regressions = []
+    for level in results["levels"]:
+        previous = baseline_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        metrics = [
+            ("throughput", previous["throughput"], level["throughput"], -1),
+            ("p99", previous["latency_ms"]["p99"], level["latency_ms"]["p99"], 1),
+        ]
+        for name, before, after, sign in metrics:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            line = (
+                f"concurrency {level['concurrency']:>3} {name:<10} "
+                f"{before:10.2f} -> {after:10.2f} ({change:+.1%})"
+            )
+            print(line)
+            if sign * change > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="The base URL of a running server.")
+    parser.add_argument(
+        "--server-pid", type=int, help="The server process to sample memory of."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY
+    )
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument(
+        "--duration", type=float, help="Seconds per level, instead of --requests."
+    )
+    parser.add_argument("--mix", nargs="+", default=["dry_run"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--language", choices=sorted(statements.LAYOUTS), default="ru")
+    parser.add_argument("--cache", choices=["use", "bypass"], default="bypass")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="The JSON file to write the results to.")
+    parser.add_argument("--compare", help="A previous JSON result to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as error:
+        parser.error(str(error))
+
+    results = asyncio.run(run(args, mix))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Times every stage of the parser on synthetic statements of growing size.
+
+Usage:
+    python -m tests.benchmarks.bench_parser --sizes 1 10 100 500 --output bench.json
+    python -m tests.benchmarks.bench_parser --output new.json --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.kaspi_parser import models, util
+from tests.assets import statements
+
+DEFAULT_SIZES = [1, 10, 100, 500]
+
+
+def timed(func, repeat: int) -> tuple[dict, object]:
+    """
+    Calls a function `repeat` times.
+
+    Args:
+        func (callable): The function to time.
+        repeat (int): The number of calls.
+
+    Returns:
+        tuple[dict, object]: The min and median durations in seconds, and the
+                             result of the last call.
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - started)
+    return {"min": min(durations), "median": statistics.median(durations)}, result
+
+
+def bench_size(pages: int, repeat: int, workdir: str, language: str = "ru") -> dict:
+    """
+    Times every parser stage on a statement with the given number of pages.
+
+    Args:
+        pages (int): The number of pages of the statement.
+        repeat (int): The number of runs per stage.
+        workdir (str): The directory for the generated PDF and export files.
+        language (str, optional): The statement language. Defaults to "ru".
+
+    Returns:
+        dict: The statement size and the timings of every stage.
+    """
+    bank_statement = util.BankStatement()
+    record = util.Record()
+    pdf_bytes = statements.generate_statement(pages=pages, language=language)
+    statement_data = bank_statement.parse_statement(file_bytes=pdf_bytes)
+    excel_path = os.path.join(workdir, f"statement_{pages}.xlsx")
+
+    stages = {}
+    stages["get_text"], text = timed(
+        lambda: bank_statement.get_text(stream=pdf_bytes), repeat
+    )
+    stages["get_header"], _ = timed(lambda: bank_statement.get_header(text), repeat)
+    stages["get_statements"], _ = timed(
+        lambda: bank_statement.get_statements(text), repeat
+    )
+    stages["get_details"], _ = timed(
+        lambda: list(bank_statement.get_details(text)), repeat
+    )
+    stages["get_table"], _ = timed(lambda: bank_statement.get_table(text), repeat)
+    stages["parse_statement"], _ = timed(
+        lambda: bank_statement.parse_statement(file_bytes=pdf_bytes, columnar=True),
+        repeat,
+    )
+    stages["parse_statement_layout"], _ = timed(
+        lambda: bank_statement.parse_statement(
+            file_bytes=pdf_bytes, columnar=True, extraction="layout"
+        ),
+        repeat,
+    )
+    stages["to_excel"], _ = timed(
+        lambda: util.FileProcessor.to_excel(statement_data, excel_path), repeat
+    )
+    stages["insert_record"], _ = timed(
+        lambda: record.insert_record(statement_data), repeat
+    )
+    return {
+        "pages": pages,
+        "transactions": len(statement_data["Details"]),
+        "pdf_bytes": len(pdf_bytes),
+        "stages": stages,
+    }
+
+
+def get_metadata() -> dict:
+    """
+    Describes the environment the benchmark ran in.
+
+    Returns:
+        dict: The git commit, Python version and platform.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Compares median stage timings with a baseline run.
+
+    Args:
+        results (dict): The current results.
+        baseline (dict): The results of the baseline run.
+        threshold (float): The relative slowdown reported as a regression, e.g. 0.1.
+
+    Returns:
+        list[str]: One line per stage that got slower than the threshold.
+    """
+    baseline_sizes = {size["pages"]: size for size in baseline["sizes"]}
+    regressions = []
+    for size in results["sizes"]:
+        previous = baseline_sizes.get(size["pages"])
+        if previous is None:
+            continue
+        for stage, timing in size["stages"].items():
+            if stage not in previous["stages"]:
+                continue
+            before = previous["stages"][stage]["median"]
+            after = timing["median"]
+            change = (after - before) / before if before else 0.0
+            line = (
+                f"{size['pages']:>4} pages {stage:<16} "
+                f"{before * 1000:10.2f} ms -> {after * 1000:10.2f} ms ({change:+.1%})"
+            )
+            print(line)
+            if change > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--language", choices=sorted(statements.LAYOUTS), default="ru")
+    parser.add_argument("--output", help="The JSON file to write the results to.")
+    parser.add_argument("--compare", help="A previous JSON result to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        models.init_engine(
+            f"sqlite:///{os.path.join(workdir, 'bench.db')}", create_schema=True
+        )
+        results = {"metadata": get_metadata(), "sizes": []}
+        for pages in args.sizes:
+            size = bench_size(pages, args.repeat, workdir, args.language)
+            results["sizes"].append(size)
+            print(
+                f"{pages:>4} pages, {size['transactions']} transactions: "
+                + ", ".join(
+                    f"{stage} {timing['median'] * 1000:.1f} ms"
+                    for stage, timing in size["stages"].items()
+                ),
+                file=sys.stderr,
+            )
+        models.dispose_engine()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} stages regressed", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
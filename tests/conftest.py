@@ -3,16 +3,42 @@ import os
 import pytest
 from dotenv import find_dotenv, load_dotenv
 
-from src.kaspi_parser import util
+from src.kaspi_parser import config, models, util
+from tests.assets import statements
 
-env_file = f'{os.path.dirname(__file__)}/../.env.test'
+env_file = f"{os.path.dirname(__file__)}/../.env.test"
 env_file_ = find_dotenv(env_file)
 load_dotenv(env_file_)
 
 
+@pytest.fixture(scope="session", autouse=True)
+def output_dir(tmp_path_factory):
+    """
+    Points the database and the exported files of the app at a temporary
+    directory, so that the tests leave nothing behind in the working directory,
+    and creates the schema there.
+    """
+    output_dir = tmp_path_factory.mktemp("output")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(
+            config, "DATABASE_URL", f"sqlite:///{output_dir / 'test.db'}"
+        )
+        monkeypatch.setattr(config, "EXPORT_DIR", str(output_dir / "exports"))
+        models.init_engine(create_schema=True)
+        yield output_dir
+        models.dispose_engine()
+
+
+@pytest.fixture(scope="session")
+def generated_file_path(tmp_path_factory):
+    file_path = tmp_path_factory.mktemp("statements") / "statement.pdf"
+    file_path.write_bytes(statements.generate_statement(pages=2))
+    yield str(file_path)
+
+
 @pytest.fixture
-def file_path():
-    yield os.getenv('TEST_FILE_PATH')
+def file_path(generated_file_path):
+    yield os.getenv("TEST_FILE_PATH") or generated_file_path
 
 
 @pytest.fixture
@@ -0,0 +1,68 @@
+import json
+import pickle
+import sqlite3
+import time
+
+from src.kaspi_parser import cache, transactions, util
+
+
+def test_parse_cache_memory_hit():
+    parse_cache = cache.ParseCache(max_bytes=1024 * 1024, ttl=60, db_path="")
+    key = parse_cache.make_key("digest", "1")
+    assert parse_cache.get(key) is None
+    parse_cache.set(key, {"FIO": "Test", "Details": []})
+    assert parse_cache.get(key) == {"FIO": "Test", "Details": []}
+    assert parse_cache.stats["memory_hits"] == 1
+    assert parse_cache.stats["misses"] == 1
+
+
+def test_parse_cache_evicts_by_size():
+    parse_cache = cache.ParseCache(max_bytes=300, ttl=60, db_path="")
+    for index in range(5):
+        parse_cache.set(str(index), {"Details": ["x" * 100]})
+    assert parse_cache.size <= 300
+    assert parse_cache.get("0") is None
+    assert parse_cache.get("4") is not None
+
+
+def test_parse_cache_ttl_and_disk_tier(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    parse_cache = cache.ParseCache(max_bytes=1024, ttl=60, db_path=db_path)
+    parse_cache.set("key", {"FIO": "Test"})
+
+    other_worker = cache.ParseCache(max_bytes=1024, ttl=60, db_path=db_path)
+    assert other_worker.get("key") == {"FIO": "Test"}
+    assert other_worker.stats["disk_hits"] == 1
+
+    expired = cache.ParseCache(max_bytes=1024, ttl=0, db_path=db_path)
+    time.sleep(0.01)
+    assert expired.get("key") is None
+
+
+def test_parse_cache_stores_json(tmp_path, file_path):
+    statement_data = util.BankStatement().parse_statement(
+        file_path=file_path, columnar=True
+    )
+    db_path = str(tmp_path / "cache.db")
+    parse_cache = cache.ParseCache(max_bytes=0, ttl=60, db_path=db_path)
+    parse_cache.set("key", statement_data)
+
+    with sqlite3.connect(db_path) as db:
+        (value,) = db.execute("SELECT value FROM parse_cache").fetchone()
+    assert json.loads(value)["IBAN"] == statement_data["IBAN"]
+
+    cached = parse_cache.get("key")
+    assert isinstance(cached["Details"], transactions.TransactionTable)
+    assert cached["Details"].to_dicts() == statement_data["Details"].to_dicts()
+
+
+def test_parse_cache_ignores_pickled_entries(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    parse_cache = cache.ParseCache(max_bytes=0, ttl=60, db_path=db_path)
+    with sqlite3.connect(db_path) as db:
+        db.execute(
+            "INSERT INTO parse_cache VALUES (?, ?, ?, ?, ?)",
+            ("key", pickle.dumps({"FIO": "Test"}), 1, time.time(), time.time()),
+        )
+    assert parse_cache.get("key") is None
+    assert parse_cache.stats["misses"] == 1
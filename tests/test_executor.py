@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.kaspi_parser import executor
+
+
+@pytest.mark.parametrize("backend", ["inline", "thread"])
+def test_executor_run(backend):
+    parse_executor = executor.Executor(backend=backend, max_workers=2)
+    try:
+        result = asyncio.run(parse_executor.run(sum, [1, 2, 3]))
+    finally:
+        parse_executor.shutdown()
+    assert result == 6
+
+
+def test_executor_unsupported_backend():
+    with pytest.raises(ValueError):
+        executor.Executor(backend="gpu")
+
+
+def test_executor_starts_off_the_event_loop(monkeypatch):
+    parse_executor = executor.Executor(backend="thread", max_workers=1)
+    threads = []
+    start = parse_executor.start
+
+    def record_start():
+        threads.append(threading.current_thread())
+        start()
+
+    monkeypatch.setattr(parse_executor, "start", record_start)
+    try:
+        assert asyncio.run(parse_executor.run(sum, [1, 2])) == 3
+        assert asyncio.run(parse_executor.run(sum, [3])) == 3
+    finally:
+        parse_executor.shutdown()
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
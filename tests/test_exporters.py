@@ -0,0 +1,65 @@
+import csv
+import io
+from datetime import datetime
+
+import pytest
+
+from src.kaspi_parser import exporters
+
+statement_data = {
+    "financialInstitutionName": "АО «Kaspi Bank»",
+    "FIO": "Иванов Иван",
+    "cardNumber": "*1234",
+    "fromDate": "01.01.24",
+    "toDate": "31.03.24",
+    "Details": [
+        {
+            "operationDate": datetime(2024, 1, index % 28 + 1),
+            "amount": -1500.0,
+            "transactionType": "Покупка",
+            "detail": f"ИП Магазин {index}",
+        }
+        for index in range(25)
+    ],
+}
+
+
+def test_csv_exporter_stream_matches_bytes():
+    exporter = exporters.get_exporter("csv")
+    streamed = b"".join(exporter.stream(statement_data, chunk_size=100))
+    assert streamed == exporter.to_bytes(statement_data)
+    rows = list(csv.reader(io.StringIO(streamed.decode("utf-8"))))
+    assert rows[0] == exporters.COLUMNS
+    assert len(rows) == 26
+
+
+def test_xlsx_exporter_to_file(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    file_path = str(tmp_path / "output" / "statement.xlsx")
+    exporters.get_exporter("xlsx").to_file(statement_data, file_path)
+    worksheet = openpyxl.load_workbook(file_path).active
+    assert worksheet.max_row == 26
+
+
+def test_parquet_exporter_to_bytes():
+    pq = pytest.importorskip("pyarrow.parquet")
+    exporter = exporters.ParquetExporter(batch_size=10)
+    table = pq.read_table(io.BytesIO(exporter.to_bytes(statement_data)))
+    assert table.num_rows == 25
+    assert table.column_names == exporters.COLUMNS
+
+
+def test_get_exporter_unsupported_format():
+    with pytest.raises(ValueError):
+        exporters.get_exporter("pdf")
+
+
+def test_exporter_is_abstract():
+    with pytest.raises(TypeError):
+        exporters.Exporter()
+
+
+def test_get_exporter_missing_dependency(monkeypatch):
+    monkeypatch.setattr(exporters.ParquetExporter, "requires", "missing_module")
+    with pytest.raises(ValueError, match="requires missing_module"):
+        exporters.get_exporter("parquet")
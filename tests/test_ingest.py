@@ -0,0 +1,69 @@
+import csv
+import json
+import logging
+
+from src.kaspi_parser import ingest
+from tests.assets import statements
+
+
+def test_ingest_shards_resume_and_errors(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    for index, language in enumerate(["ru", "kz", "ru"]):
+        pdf_bytes = statements.generate_statement(
+            language=language, transactions=5 + index
+        )
+        (archive / f"statement_{index}.pdf").write_bytes(pdf_bytes)
+    (archive / "copy.pdf").write_bytes((archive / "statement_0.pdf").read_bytes())
+    (archive / "broken.pdf").write_bytes(b"not a pdf")
+    paths = list(ingest.iter_paths([str(archive)]))
+    options = {
+        "output": "csv",
+        "output_dir": str(tmp_path / "shards"),
+        "manifest_path": str(tmp_path / "manifest.txt"),
+        "error_log_path": str(tmp_path / "errors.jsonl"),
+        "workers": 1,
+        "batch_size": 2,
+    }
+
+    summary = ingest.ingest(paths, **options)
+    assert (summary["stored"], summary["skipped"], summary["failed"]) == (3, 1, 1)
+    shards = sorted((tmp_path / "shards").iterdir())
+    assert len(shards) == 2
+    rows = 0
+    for shard in shards:
+        with open(shard, encoding="utf-8") as file:
+            rows += len(list(csv.reader(file))) - 1
+    assert rows == 5 + 6 + 7
+    with open(tmp_path / "errors.jsonl", encoding="utf-8") as file:
+        errors = [json.loads(line) for line in file]
+    assert [error["path"] for error in errors] == [str(archive / "broken.pdf")]
+
+    summary = ingest.ingest(paths, **options)
+    assert (summary["stored"], summary["skipped"], summary["failed"]) == (0, 4, 1)
+
+
+def test_parse_file_records_unexpected_errors(tmp_path, monkeypatch):
+    class UnexpectedError(Exception):
+        pass
+
+    class BrokenParser:
+        def parse_statement(self, **kwargs):
+            raise UnexpectedError("layout changed")
+
+    path = tmp_path / "statement.pdf"
+    path.write_bytes(statements.generate_statement(transactions=1))
+    monkeypatch.setattr(ingest, "_bank_statement", BrokenParser(), raising=False)
+    monkeypatch.setattr(ingest, "_processed", frozenset(), raising=False)
+
+    result = ingest.parse_file(str(path))
+    assert result["status"] == "failed"
+    assert result["error"] == "UnexpectedError: layout changed"
+
+
+def test_progress_logs_reports(caplog):
+    progress = ingest.Progress(total=2, interval=0.0)
+    with caplog.at_level(logging.INFO, logger=ingest.logger.name):
+        progress.add("parsed", size=1024)
+    assert [record.name for record in caplog.records] == [ingest.logger.name]
+    assert caplog.records[0].getMessage().startswith("1/2 files, 0 stored")
@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+import pytest
+
+from src.kaspi_parser import jobs
+
+
+class FakeUpload:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+async def handler(upload, timings, cancellation, delay=0.0, size=1, stored=None):
+    await asyncio.sleep(delay)
+    timings["parse"] = delay
+    cancellation.commit()
+    if stored is not None:
+        stored.append(upload)
+    return {"success": True, "excel_path": "", "data": "x" * size}
+
+
+async def wait_for_job(manager, job):
+    while not job.done:
+        await asyncio.sleep(0.01)
+    return json.loads(manager.get(job.id).render())
+
+
+def test_job_succeeds_and_spills_large_results(tmp_path):
+    manager = jobs.JobManager(
+        handler, workers=1, max_memory_result=100, spill_dir=str(tmp_path)
+    )
+
+    async def main():
+        small = manager.submit(FakeUpload(), size=10)
+        large = manager.submit(FakeUpload(), size=1000)
+        results = [await wait_for_job(manager, job) for job in (small, large)]
+        assert small.result_path is None
+        assert large.result_path is not None
+        assert large.upload is None
+        await manager.stop()
+        return results
+
+    small, large = asyncio.run(main())
+    assert small["status"] == "succeeded"
+    assert small["result"]["data"] == "x" * 10
+    assert large["result"]["data"] == "x" * 1000
+    assert "total" in large["timings"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_job_timeout():
+    manager = jobs.JobManager(handler, workers=1, timeout=0.05)
+    upload = FakeUpload()
+    stored = []
+
+    async def main():
+        job = manager.submit(upload, delay=0.2, stored=stored)
+        result = await wait_for_job(manager, job)
+        assert upload.closed is False
+        await asyncio.sleep(0.3)
+        assert upload.closed is True
+        assert not manager.abandoned
+        await manager.stop()
+        return result
+
+    result = asyncio.run(main())
+    assert result["status"] == "timeout"
+    assert result["result"] is None
+    assert stored == []
+
+
+def test_job_timeout_keeps_the_worker_busy():
+    running = []
+    peak = []
+
+    async def tracking_handler(upload, timings, cancellation, delay):
+        running.append(upload)
+        peak.append(len(running))
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            running.remove(upload)
+        cancellation.commit()
+        return {"success": True, "excel_path": "", "data": "x"}
+
+    manager = jobs.JobManager(tracking_handler, workers=1, timeout=0.05)
+
+    async def main():
+        slow = manager.submit(FakeUpload(), delay=0.3)
+        fast = manager.submit(FakeUpload(), delay=0.0)
+        slow_result = await wait_for_job(manager, slow)
+        assert fast.status == "queued"
+        fast_result = await wait_for_job(manager, fast)
+        await manager.stop()
+        return slow_result, fast_result
+
+    slow, fast = asyncio.run(main())
+    assert slow["status"] == "timeout"
+    assert fast["status"] == "succeeded"
+    assert max(peak) == 1
+
+
+def test_job_committed_before_timeout_completes():
+    async def committing_handler(upload, timings, cancellation):
+        cancellation.commit()
+        await asyncio.sleep(0.1)
+        return {"success": True, "excel_path": "", "data": "x"}
+
+    manager = jobs.JobManager(committing_handler, workers=1, timeout=0.01)
+
+    async def main():
+        job = manager.submit(FakeUpload())
+        result = await wait_for_job(manager, job)
+        await manager.stop()
+        return result
+
+    assert asyncio.run(main())["status"] == "succeeded"
+
+
+def test_job_queue_full():
+    manager = jobs.JobManager(handler, workers=1, max_queued=1)
+
+    async def main():
+        manager.submit(FakeUpload(), delay=1)
+        await asyncio.sleep(0.01)
+        manager.submit(FakeUpload(), delay=1)
+        with pytest.raises(jobs.JobQueueFullError):
+            manager.submit(FakeUpload())
+        await manager.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+import fitz
+import pytest
+
+from src.kaspi_parser import layouts, util
+from tests.assets import statements
+
+
+@pytest.mark.parametrize(
+    "language, layout",
+    [("ru", layouts.KASPI_GOLD_RU), ("kz", layouts.KASPI_GOLD_KZ)],
+)
+def test_detect_layout(language, layout):
+    pdf_bytes = statements.generate_statement(language=language)
+    first_page = next(util.BankStatement.iter_pages(stream=pdf_bytes))
+    assert layouts.detect(first_page) is layout
+
+
+def test_detect_rejects_other_documents():
+    with pytest.raises(layouts.UnsupportedStatementError):
+        layouts.detect("Invoice No. 42 Total due: 1 000,00 ₸")
+
+
+def test_parse_statement_rejects_other_pdfs():
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((50, 50), "Quarterly report")
+        pdf_bytes = pdf.tobytes()
+    with pytest.raises(layouts.UnsupportedStatementError):
+        util.BankStatement().parse_statement(file_bytes=pdf_bytes)
+
+
+def test_layout_grammar_is_language_specific():
+    row = "05.01.24 - 1 000,00 ₸ Аударым Ерлан Б."
+    assert layouts.KASPI_GOLD_RU.statement_pattern.search(row) is None
+    assert layouts.KASPI_GOLD_KZ.statement_pattern.search(row) is not None
+    assert layouts.any_layout().statement_pattern.search(row) is not None
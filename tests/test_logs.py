@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+
+from fastapi.testclient import TestClient
+
+from src.kaspi_parser import executor, logs
+from src.kaspi_parser.main import app
+
+
+def test_queue_handler_formats_json_with_request_fields():
+    records = queue.SimpleQueue()
+    handler = logs.QueueHandler(records)
+    handler.addFilter(logs.ContextFilter())
+    logger = logging.getLogger("test_logs")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    token = logs._request.set({"request_id": "abc", "timings": {}})
+    try:
+        logs.bind(pages=3, rows=120)
+        logs.add_timing("parse", 0.5)
+        logger.info("Parsed %s rows", 120, extra={"statement_id": 7})
+    finally:
+        logs._request.reset(token)
+        logger.removeHandler(handler)
+    entry = json.loads(logs.JsonFormatter().format(records.get_nowait()))
+    assert entry["message"] == "Parsed 120 rows"
+    assert entry["request_id"] == "abc"
+    assert (entry["pages"], entry["rows"]) == (3, 120)
+    assert entry["timings"] == {"parse": 0.5}
+    assert entry["statement_id"] == 7
+
+
+def test_lazy_formatting_skips_disabled_levels():
+    class Exploding:
+        def __str__(self):
+            raise AssertionError("formatted")
+
+    logging.getLogger("test_logs.lazy").debug("Value: %s", Exploding())
+
+
+def test_request_id_header():
+    client = TestClient(app)
+    response = client.get("/", headers={"x-request-id": "req-1"})
+    assert response.headers["x-request-id"] == "req-1"
+    assert client.get("/").headers["x-request-id"]
+
+
+def test_rotating_file_handler(tmp_path):
+    handler = logs.create_file_handler(
+        str(tmp_path / "app.log"), "size", max_bytes=200, backup_count=2, when=""
+    )
+    handler.setFormatter(logs.JsonFormatter())
+    logger = logging.getLogger("test_logs.rotation")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for index in range(20):
+        logger.info("Message %s", index)
+    handler.close()
+    logger.removeHandler(handler)
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "app.log",
+        "app.log.1",
+        "app.log.2",
+    ]
+
+
+def log_from_worker() -> int:
+    logging.getLogger("test_logs.worker").warning("Logged from a worker")
+    return os.getpid()
+
+
+def test_pool_workers_log_through_the_parent(tmp_path):
+    logs.shutdown()
+    logs.setup(filename=str(tmp_path / "app.log"), rotation="none")
+    parse_executor = executor.Executor(backend="process", max_workers=1)
+    try:
+        parse_executor.start()
+        worker_pid = asyncio.run(parse_executor.run(log_from_worker))
+    finally:
+        parse_executor.shutdown()
+        logs.shutdown()
+    assert worker_pid != os.getpid()
+    entries = [
+        json.loads(line) for line in (tmp_path / "app.log").read_text().splitlines()
+    ]
+    assert "Logged from a worker" in [entry["message"] for entry in entries]
+    assert [path.name for path in tmp_path.iterdir()] == ["app.log"]
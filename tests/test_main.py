@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+# Seconds allowed for `import src.kaspi_parser.main` in a fresh interpreter.
+IMPORT_TIME_BUDGET = 2.0
+LAZY_MODULES = ["fitz", "pymupdf", "numpy", "pandas", "openpyxl", "pyarrow"]
+
+
+def test_import_time_budget():
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import src.kaspi_parser.main\n"
+        "print(json.dumps({'seconds': time.perf_counter() - started, "
+        f"'loaded': [name for name in {LAZY_MODULES!r} if name in sys.modules]}}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    assert result["loaded"] == []
+    assert result["seconds"] < IMPORT_TIME_BUDGET
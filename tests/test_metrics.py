@@ -0,0 +1,53 @@
+from src.kaspi_parser import metrics
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("test_seconds", "Test.", (0.1, 1.0), ("stage",))
+    histogram.observe(0.05, stage="parse")
+    histogram.observe(0.5, stage="parse")
+    histogram.observe(5, stage="parse")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="parse",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="parse"} 3' in lines
+
+
+def test_collect_and_replay():
+    def work():
+        with metrics.stage("test_stage"):
+            return 42
+
+    histogram = metrics.HISTOGRAMS["kaspi_parser_stage_seconds"]
+    result, observations = metrics.collect(work)
+    assert result == 42
+    assert [(name, labels) for name, _, labels in observations] == [
+        ("kaspi_parser_stage_seconds", {"stage": "test_stage"})
+    ]
+    assert ("test_stage",) not in histogram.series
+    metrics.replay(observations)
+    assert histogram.series[("test_stage",)][2] == 1
+
+
+def test_metrics_disabled(monkeypatch):
+    monkeypatch.setattr(metrics.config, "METRICS_ENABLED", False)
+    _, observations = metrics.collect(
+        metrics.observe, "kaspi_parser_statement_pages", 1
+    )
+    assert observations == []
+
+
+def test_render_cache_counters():
+    text = metrics.render(
+        cache_stats={"memory_hits": 3, "disk_hits": 1, "misses": 2, "evictions": 0}
+    )
+    assert "# TYPE kaspi_parser_parse_cache_hits_total counter" in text
+    assert 'kaspi_parser_parse_cache_hits_total{tier="memory"} 3' in text
+    assert "kaspi_parser_parse_cache_misses_total 2" in text
+    assert "kaspi_parser_parse_cache_evictions_total 0" in text
+
+
+def test_render_write_behind_counters():
+    text = metrics.render(write_behind_stats={"written": 5, "failed": 1})
+    assert "# TYPE kaspi_parser_write_behind_statements_total counter" in text
+    assert 'kaspi_parser_write_behind_statements_total{outcome="failed"} 1' in text
@@ -0,0 +1,11 @@
+from sqlalchemy import text
+
+from src.kaspi_parser import models
+
+
+def test_create_db_engine_sqlite_pragmas(tmp_path):
+    engine = models.create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+    engine.dispose()
@@ -0,0 +1,201 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import inspect, update
+from sqlalchemy.orm import Session
+
+from src.kaspi_parser import models, queries, util
+from tests.assets import statements
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = models.create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def statement_data():
+    pdf_bytes = statements.generate_statement(transactions=25)
+    return util.BankStatement().parse_statement(file_bytes=pdf_bytes)
+
+
+def test_indexes_created(db):
+    indexes = {
+        index["name"] for index in inspect(db.bind).get_indexes("transaction_details")
+    }
+    assert "ix_transaction_details_statement_date" in indexes
+
+
+def test_list_statements_keyset(db, statement_data):
+    record = util.Record()
+    ids = [record.add_statement(db, statement_data) for _ in range(3)]
+    record.add_statement(db, {**statement_data, "IBAN": "KZ000"})
+    first = queries.list_statements(db, limit=2, iban=statement_data["IBAN"])
+    second = queries.list_statements(
+        db, limit=2, iban=statement_data["IBAN"], after=first["next_cursor"]
+    )
+    assert [item["id"] for item in first["items"] + second["items"]] == ids
+    assert second["next_cursor"] is None
+    assert (
+        queries.list_statements(db, limit=10, date_to=date(2020, 1, 1))["items"] == []
+    )
+
+
+def test_list_transactions_keyset(db, statement_data):
+    statement_id = util.Record().add_statement(db, statement_data)
+    items, after = [], None
+    while True:
+        page = queries.list_transactions(db, statement_id, limit=10, after=after)
+        items += page["items"]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert len(items) == len(statement_data["Details"])
+    assert [item["operationDate"] for item in items] == sorted(
+        detail["operationDate"] for detail in statement_data["Details"]
+    )
+    purchases = queries.list_transactions(
+        db, statement_id, limit=100, transaction_type="Покупка"
+    )
+    assert all(item["transactionType"] == "Покупка" for item in purchases["items"])
+
+
+def test_get_totals(db, statement_data):
+    statement_id = util.Record().add_statement(db, statement_data)
+    totals = {
+        total["transactionType"]: total
+        for total in queries.get_totals(db, statement_id)
+    }
+    assert sum(total["count"] for total in totals.values()) == len(
+        statement_data["Details"]
+    )
+    assert round(sum(total["amount"] for total in totals.values()), 2) == round(
+        statement_data["cardBalanceDateUntil"] - statement_data["cardBalanceDateFrom"],
+        2,
+    )
+
+
+def test_decode_cursor_invalid():
+    with pytest.raises(ValueError):
+        queries.decode_cursor("not a cursor", (int,))
+
+
+@pytest.mark.parametrize("values", [5, ["x"], [1, 2], [True], None])
+def test_decode_cursor_wrong_shape(values):
+    with pytest.raises(ValueError):
+        queries.decode_cursor(queries.encode_cursor(values), (int,))
+
+
+def test_list_transactions_invalid_cursor_date(db, statement_data):
+    bank_statement_id = util.Record().add_statement(db, statement_data)
+    with pytest.raises(ValueError):
+        queries.list_transactions(
+            db,
+            bank_statement_id,
+            limit=5,
+            after=queries.encode_cursor(["not a date", 1]),
+        )
+
+
+def test_incremental_ingestion_links_overlapping_transactions(db, statement_data):
+    record = util.Record()
+    details = statement_data["Details"]
+    first = record.add_statement_delta(db, {**statement_data, "Details": details[:15]})
+    second = record.add_statement_delta(db, statement_data)
+    assert (first["new"], first["deduplicated"]) == (15, 0)
+    assert (second["new"], second["deduplicated"]) == (len(details) - 15, 15)
+    assert db.query(models.TransactionDetail).count() == len(details)
+
+    page = queries.list_transactions(db, second["id"], limit=100)
+    assert len(page["items"]) == len(details)
+    totals = queries.get_totals(db, second["id"])
+    assert sum(total["count"] for total in totals) == len(details)
+
+
+def test_list_transactions_linked_only_statement(db, statement_data):
+    record = util.Record()
+    first = record.add_statement_delta(db, statement_data)
+    second = record.add_statement_delta(db, statement_data)
+    assert second["deduplicated"] == len(statement_data["Details"])
+    assert second["new"] == 0
+
+    def page_through(statement_id, **filters):
+        items, after = [], None
+        while True:
+            page = queries.list_transactions(
+                db, statement_id, limit=4, after=after, **filters
+            )
+            items += page["items"]
+            after = page["next_cursor"]
+            if after is None:
+                return items
+
+    expected = page_through(first["id"])
+    assert len(expected) == len(statement_data["Details"])
+    assert page_through(second["id"]) == expected
+    assert page_through(second["id"], transaction_type="Покупка") == [
+        item for item in expected if item["transactionType"] == "Покупка"
+    ]
+    assert queries.get_totals(db, second["id"]) == queries.get_totals(db, first["id"])
+
+
+def test_backfill_link_dates(db, statement_data):
+    record = util.Record()
+    record.add_statement_delta(db, statement_data)
+    second = record.add_statement_delta(db, statement_data)
+    db.execute(update(models.StatementTransaction).values(operation_date=None))
+    db.commit()
+    models.backfill_link_dates(db.bind)
+    db.expire_all()
+    assert len(queries.list_transactions(db, second["id"], limit=100)["items"]) == len(
+        statement_data["Details"]
+    )
+
+
+def test_rollups_reconcile_with_statement_totals(db, statement_data):
+    statement_id = util.Record().add_statement(db, statement_data)
+    summary = queries.get_rollups(db, statement_id)
+    assert sum(month["count"] for month in summary["monthly"]) == len(
+        statement_data["Details"]
+    )
+    assert {
+        total["transactionType"]: (total["count"], total["amount"])
+        for total in summary["totals"]
+    } == {
+        total["transactionType"]: (total["count"], round(total["amount"], 2))
+        for total in queries.get_totals(db, statement_id)
+    }
+    assert all(entry["reconciled"] for entry in summary["reconciliation"])
+
+
+def test_rebuild_rollups_matches_ingest(db, statement_data):
+    record = util.Record()
+    details = statement_data["Details"]
+    record.add_statement_delta(db, {**statement_data, "Details": details[:15]})
+    statement_id = record.add_statement_delta(db, statement_data)["id"]
+    expected = queries.get_rollups(db, statement_id)
+    record.rebuild_rollups(db, statement_id)
+    assert queries.get_rollups(db, statement_id) == expected
+    assert queries.get_rollups(db, statement_id + 1) is None
+
+
+def test_add_missing_columns_upgrades_old_tables(tmp_path):
+    engine = models.create_db_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE transaction_details (id INTEGER PRIMARY KEY, "
+            "operation_date DATETIME NOT NULL, amount FLOAT NOT NULL, "
+            "transaction_type VARCHAR(50) NOT NULL, detail VARCHAR(256), "
+            "bank_statement_id INTEGER)"
+        )
+    models.Base.metadata.create_all(bind=engine)
+    models.add_missing_columns(engine)
+    columns = {
+        column["name"] for column in inspect(engine).get_columns("transaction_details")
+    }
+    assert {"iban", "fingerprint"} <= columns
+    engine.dispose()
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import orjson
+
+from src.kaspi_parser import responses, transactions
+
+
+def test_dumps_transaction_table():
+    table = transactions.TransactionTable.from_statements(
+        [["31.12.24", "+ 1 500,00 ₸", "Пополнение", "С Kaspi Депозита"]]
+    )
+    content = {"fromDate": "01.12.24", "Details": table}
+    assert orjson.loads(responses.dumps(content)) == {
+        "fromDate": "01.12.24",
+        "Details": [
+            {
+                "operationDate": "2024-12-31T00:00:00",
+                "amount": 1500.0,
+                "transactionType": "Пополнение",
+                "detail": "С Kaspi Депозита",
+            }
+        ],
+    }
+    assert responses.dumps({"date": datetime(2024, 1, 2)}, newline=True) == (
+        b'{"date":"2024-01-02T00:00:00"}\n'
+    )
+
+
+def test_accepts_ndjson():
+    assert responses.accepts_ndjson("application/x-ndjson, application/json")
+    assert not responses.accepts_ndjson("application/json")
+    assert not responses.accepts_ndjson(None)
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from src.kaspi_parser import rollups
+
+
+def test_build_fills_every_month_of_the_period():
+    builder = rollups.RollupBuilder(top_counterparties=2)
+    builder.add(
+        [
+            (datetime(2024, 1, 5), 5000.0, "Пополнение", "С Kaspi Депозита"),
+            (datetime(2024, 1, 6), -1000.0, "Покупка", "Магазин"),
+            (datetime(2024, 3, 7), -1500.0, "Покупка", "Магазин"),
+            (datetime(2024, 3, 8), -200.0, "Перевод", "Айгерим Б."),
+        ]
+    )
+    summary = builder.build(datetime(2024, 1, 1), datetime(2024, 3, 31), 100.0)
+
+    assert [row["month"].isoformat() for row in summary["monthly"]] == [
+        "2024-01-01",
+        "2024-02-01",
+        "2024-03-01",
+    ]
+    assert [row["transactions"] for row in summary["monthly"]] == [2, 0, 2]
+    assert summary["monthly"][0]["inflow"] == 5000.0
+    assert summary["monthly"][0]["outflow"] == -1000.0
+    assert [row["closing_balance"] for row in summary["monthly"]] == [
+        4100.0,
+        4100.0,
+        2400.0,
+    ]
+    assert {row["transaction_type"]: row["total"] for row in summary["types"]} == {
+        "Перевод": -200.0,
+        "Покупка": -2500.0,
+        "Пополнение": 5000.0,
+    }
+    assert [row["counterparty"] for row in summary["counterparties"]] == [
+        "С Kaspi Депозита",
+        "Магазин",
+    ]
+
+
+def test_build_without_transactions():
+    summary = rollups.RollupBuilder().build(
+        datetime(2024, 1, 1), datetime(2024, 1, 31), 10.0
+    )
+    assert summary["monthly"][0]["closing_balance"] == 10.0
+    assert summary["types"] == summary["counterparties"] == []
+
+
+def test_reconcile_reports_differences():
+    statement = {
+        "Replenishments": 5000.0,
+        "Transfers": 0.0,
+        "Purchases": -1000.0,
+        "Withdrawals": 0.0,
+        "Others": 0.0,
+        "cardBalanceDateUntil": 4000.0,
+    }
+    types = [
+        {"category": "Replenishments", "total": 5000.0},
+        {"category": "Purchases", "total": -900.0},
+    ]
+    monthly = [{"closing_balance": 4100.0}]
+    reconciliation = {
+        entry["category"]: entry
+        for entry in rollups.reconcile(statement, types, monthly)
+    }
+    assert reconciliation["Replenishments"]["reconciled"] is True
+    assert reconciliation["Purchases"]["difference"] == 100.0
+    assert reconciliation["Purchases"]["reconciled"] is False
+    assert reconciliation["Balance"]["reconciled"] is False
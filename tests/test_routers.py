@@ -1,4 +1,12 @@
+import base64
+import json
+import os
+import time
+
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from src.kaspi_parser import config, executor, routers
 from src.kaspi_parser.main import app
 
 client = TestClient(app)
@@ -15,8 +23,312 @@ def test_parse_statement(sample_pdf_base64):
 
 def test_parse_statement_to_excel(sample_pdf_base64):
     assert isinstance(sample_pdf_base64, str)
-    response = client.post("/parse-statement/", json={"base64_pdf": sample_pdf_base64, 'to_excel': True})
+    response = client.post(
+        "/parse-statement/", json={"base64_pdf": sample_pdf_base64, "to_excel": True}
+    )
     assert response.status_code == 200
     json_response = response.json()
     assert json_response["success"] is True
     assert "data" in json_response
+
+
+def test_parse_statement_upload_multipart(file_path):
+    with open(file_path, "rb") as file:
+        response = client.post(
+            "/parse-statement/upload",
+            params={"dry_run": True},
+            files={"file": ("statement.pdf", file, "application/pdf")},
+        )
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+
+
+def test_parse_statement_upload_raw(file_path):
+    with open(file_path, "rb") as file:
+        response = client.post(
+            "/parse-statement/upload",
+            params={"dry_run": True},
+            content=file.read(),
+            headers={"content-type": "application/pdf"},
+        )
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+
+
+def test_parse_statements_batch(sample_pdf_base64):
+    response = client.post(
+        "/parse-statements/batch",
+        json={
+            "documents": [
+                {"base64_pdf": sample_pdf_base64},
+                {"base64_pdf": "bm90IGEgcGRm"},
+            ],
+            "single_transaction": True,
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["success"] is True
+    assert results[1]["success"] is False
+    assert results[0]["status"] == "persisted"
+    assert "total" in results[0]["timings"]
+
+
+def test_parse_statement_database_error(monkeypatch, sample_pdf_base64):
+    def insert_record(statement_data):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(routers.record, "insert_record", insert_record)
+    response = client.post("/parse-statement/", json={"base64_pdf": sample_pdf_base64})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "Error storing statement"
+
+
+def test_parse_statements_batch_single_transaction_rejects_flags(sample_pdf_base64):
+    response = client.post(
+        "/parse-statements/batch",
+        json={
+            "documents": [{"base64_pdf": sample_pdf_base64, "write_behind": True}],
+            "single_transaction": True,
+        },
+    )
+    assert response.status_code == 400
+
+
+def test_parse_statements_batch_single_transaction_rollback(
+    monkeypatch, sample_pdf_base64
+):
+    def insert_records(statements):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(routers.record, "insert_records", insert_records)
+    response = client.post(
+        "/parse-statements/batch",
+        json={
+            "documents": [
+                {"base64_pdf": sample_pdf_base64},
+                {"base64_pdf": sample_pdf_base64, "dry_run": True},
+            ],
+            "single_transaction": True,
+        },
+    )
+    assert response.status_code == 500
+    assert response.json()["success"] is False
+    results = response.json()["results"]
+    assert results[0]["status"] == "failed"
+    assert results[0]["success"] is False
+    assert results[1]["status"] is None
+    assert results[1]["success"] is True
+
+
+def test_parse_statement_cache_bypass(sample_pdf_base64):
+    for cache in ["use", "use", "bypass"]:
+        response = client.post(
+            "/parse-statement/",
+            json={"base64_pdf": sample_pdf_base64, "dry_run": True, "cache": cache},
+        )
+        assert response.status_code == 200
+        assert response.json()["success"] is True
+
+
+def test_parse_statement_page_ranges(monkeypatch, sample_pdf_base64):
+    body = {"base64_pdf": sample_pdf_base64, "dry_run": True, "cache": "bypass"}
+    expected = client.post("/parse-statement/", json=body).json()["data"]
+    monkeypatch.setattr(config, "PARALLEL_PARSE_MIN_PAGES", 2)
+    monkeypatch.setattr(config, "PARALLEL_PARSE_MIN_RANGE_PAGES", 1)
+    monkeypatch.setattr(config, "EXTRACTION_MODE", "text")
+    page_counts = []
+    parse_page_ranges = routers.parse_page_ranges
+
+    async def spy(source, page_count):
+        page_counts.append(page_count)
+        return await parse_page_ranges(source, page_count)
+
+    monkeypatch.setattr(routers, "parse_page_ranges", spy)
+    parse_executor = executor.Executor(backend="process", max_workers=2)
+    monkeypatch.setattr(routers, "parse_executor", parse_executor)
+    try:
+        parse_executor.start()
+        response = client.post("/parse-statement/", json=body)
+    finally:
+        parse_executor.shutdown()
+    assert response.status_code == 200
+    assert response.json()["data"] == expected
+    assert len(page_counts) == 1 and page_counts[0] >= 2
+
+
+def test_parse_statement_write_behind(sample_pdf_base64):
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post(
+            "/parse-statement/",
+            json={"base64_pdf": sample_pdf_base64, "write_behind": True},
+        )
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+
+
+def test_export_statement_csv(sample_pdf_base64):
+    response = client.post(
+        "/parse-statement/export",
+        json={"base64_pdf": sample_pdf_base64, "dry_run": True, "export_format": "csv"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.startswith("FROM_DATE,")
+
+
+def test_export_statement_missing_dependency(monkeypatch, sample_pdf_base64):
+    monkeypatch.setattr(routers.exporters.ParquetExporter, "requires", "missing_module")
+    for path, body in [
+        ("/parse-statement/export", {"export_format": "parquet"}),
+        ("/parse-statement/", {"to_excel": True, "export_format": "parquet"}),
+    ]:
+        response = client.post(
+            path, json={"base64_pdf": sample_pdf_base64, "dry_run": True, **body}
+        )
+        assert response.status_code == 400
+        assert "requires missing_module" in response.json()["detail"]
+
+
+def test_server_timing_and_metrics(sample_pdf_base64):
+    response = client.post(
+        "/parse-statement/",
+        json={"base64_pdf": sample_pdf_base64, "dry_run": True, "cache": "bypass"},
+    )
+    assert response.status_code == 200
+    stages = [
+        item.split(";")[0] for item in response.headers["server-timing"].split(", ")
+    ]
+    assert {"decode", "parse", "extract", "header", "total"} <= set(stages)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'kaspi_parser_stage_seconds_count{stage="extract"}' in response.text
+    assert 'path="/parse-statement/"' in response.text
+    assert "kaspi_parser_parse_cache_misses_total" in response.text
+
+
+def test_parse_statement_ndjson(sample_pdf_base64):
+    response = client.post(
+        "/parse-statement/",
+        json={"base64_pdf": sample_pdf_base64, "dry_run": True, "cache": "bypass"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert "FIO" in lines[0] and "Details" not in lines[0]
+    assert all("operationDate" in line for line in lines[1:-1])
+    assert lines[-1] == {"success": True, "status": None, "excel_path": ""}
+
+    response = client.post(
+        "/parse-statement/", json={"base64_pdf": sample_pdf_base64, "dry_run": True}
+    )
+    assert response.json()["data"]["Details"] == lines[1:-1]
+
+
+def test_parse_statement_ndjson_persists_and_exports(sample_pdf_base64):
+    response = client.post(
+        "/parse-statement/",
+        json={"base64_pdf": sample_pdf_base64, "to_excel": True, "cache": "bypass"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["success"] is True
+    assert lines[-1]["status"] == "persisted"
+    assert os.path.isfile(lines[-1]["excel_path"])
+
+    response = client.get("/statements", params={"iban": lines[0]["IBAN"], "limit": 1})
+    statement_id = response.json()["items"][0]["id"]
+    response = client.get(
+        f"/statements/{statement_id}/transactions",
+        params={"limit": config.READ_MAX_PAGE_SIZE},
+    )
+    assert len(response.json()["items"]) == len(lines) - 2
+
+
+def test_parse_statement_ndjson_rejects_write_behind(sample_pdf_base64):
+    response = client.post(
+        "/parse-statement/",
+        json={"base64_pdf": sample_pdf_base64, "write_behind": True},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 400
+
+
+def test_read_statement_api(sample_pdf_base64):
+    response = client.post("/parse-statement/", json={"base64_pdf": sample_pdf_base64})
+    iban = response.json()["data"]["IBAN"]
+    response = client.get("/statements", params={"iban": iban, "limit": 1})
+    assert response.status_code == 200
+    statement_id = response.json()["items"][0]["id"]
+
+    response = client.get(f"/statements/{statement_id}")
+    assert response.status_code == 200
+    assert response.json()["totals"]
+
+    response = client.get(
+        f"/statements/{statement_id}/transactions", params={"limit": 5}
+    )
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 5
+    assert client.get("/statements/0").status_code == 404
+    assert client.get("/statements", params={"after": "bad"}).status_code == 400
+    assert client.get("/statements", params={"after": "NQ=="}).status_code == 400
+    response = client.get(
+        f"/statements/{statement_id}/transactions", params={"after": "WyJ4Il0="}
+    )
+    assert response.status_code == 400
+
+
+def test_job_api(sample_pdf_base64):
+    with TestClient(app) as lifespan_client:
+        response = lifespan_client.post(
+            "/jobs", json={"base64_pdf": sample_pdf_base64, "dry_run": True}
+        )
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        for _ in range(500):
+            job = lifespan_client.get(f"/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.02)
+    assert job["status"] == "succeeded"
+    assert job["result"]["success"] is True
+    assert "parse" in job["timings"]
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_statement_rollups_api(sample_pdf_base64):
+    response = client.post("/parse-statement/", json={"base64_pdf": sample_pdf_base64})
+    iban = response.json()["data"]["IBAN"]
+    response = client.get("/statements", params={"iban": iban, "limit": 1})
+    statement_id = response.json()["items"][0]["id"]
+
+    response = client.get(f"/statements/{statement_id}/rollups")
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["monthly"] and summary["totals"] and summary["counterparties"]
+    assert all(entry["reconciled"] for entry in summary["reconciliation"])
+    assert client.get("/statements/0/rollups").status_code == 404
+
+
+def test_statement_rollups_rebuild(monkeypatch, sample_pdf_base64):
+    monkeypatch.setattr(config, "ROLLUPS_ENABLED", False)
+    statement_data = routers.bank_statement.parse_statement(
+        file_bytes=base64.b64decode(sample_pdf_base64)
+    )
+    statement_id = routers.record.insert_record(statement_data)
+
+    for _ in range(2):
+        response = client.get(f"/statements/{statement_id}/rollups")
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Rollups not computed"
+
+    response = client.post(f"/statements/{statement_id}/rollups")
+    assert response.status_code == 200
+    assert response.json()["monthly"]
+    assert client.post(f"/statements/{statement_id}/rollups").json() == response.json()
+    response = client.get(f"/statements/{statement_id}/rollups")
+    assert response.status_code == 200
+    assert client.post("/statements/0/rollups").status_code == 404
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine, inspect
+
+from src.kaspi_parser import models, schema
+
+
+def test_schema_main_creates_schema(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema.logs, "setup", lambda: None)
+    database_url = f"sqlite:///{tmp_path / 'schema.db'}"
+    assert schema.main(["--database-url", database_url]) == 0
+
+    inspector = inspect(create_engine(database_url))
+    assert set(models.Base.metadata.tables) <= set(inspector.get_table_names())
+    indexes = {index["name"] for index in inspector.get_indexes("transaction_details")}
+    assert indexes
+
+
+def test_schema_main_upgrades_old_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema.logs, "setup", lambda: None)
+    database_url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_engine(database_url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE transaction_details (id INTEGER PRIMARY KEY, "
+            "operation_date DATETIME NOT NULL, amount FLOAT NOT NULL, "
+            "transaction_type VARCHAR(50) NOT NULL, detail VARCHAR(256), "
+            "bank_statement_id INTEGER)"
+        )
+    assert schema.main(["--database-url", database_url]) == 0
+    columns = {
+        column["name"] for column in inspect(engine).get_columns("transaction_details")
+    }
+    assert "fingerprint" not in columns
+
+    assert schema.main(["--database-url", database_url, "--upgrade"]) == 0
+    inspector = inspect(engine)
+    columns = {
+        column["name"] for column in inspector.get_columns("transaction_details")
+    }
+    assert {"iban", "fingerprint"} <= columns
+    expected = {index.name for index in models.TransactionDetail.__table__.indexes}
+    assert expected <= {
+        index["name"] for index in inspector.get_indexes("transaction_details")
+    }
+    engine.dispose()
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+from src.kaspi_parser import transactions
+
+
+def test_transaction_table_from_statements():
+    table = transactions.TransactionTable.from_statements(
+        [
+            ["05.01.24", "+ 50 000,00 ₸", "Пополнение", "С Kaspi Депозита"],
+            ["29.02.24", "- 1 234,56 ₸", "Покупка", "ИП Магазин"],
+            ["31.12.23", "- 0,05 ₸", "Əртүрлі", "Комиссия"],
+        ]
+    )
+    assert table.to_dicts() == [
+        {
+            "operationDate": datetime(2024, 1, 5),
+            "amount": 50000.0,
+            "transactionType": "Пополнение",
+            "detail": "С Kaspi Депозита",
+        },
+        {
+            "operationDate": datetime(2024, 2, 29),
+            "amount": -1234.56,
+            "transactionType": "Покупка",
+            "detail": "ИП Магазин",
+        },
+        {
+            "operationDate": datetime(2023, 12, 31),
+            "amount": -0.05,
+            "transactionType": "Əртүрлі",
+            "detail": "Комиссия",
+        },
+    ]
+
+
+def test_transaction_table_empty():
+    table = transactions.TransactionTable.from_statements([])
+    assert len(table) == 0
+    assert table.to_dicts() == []
+
+
+def test_iter_fingerprinted_rows_counts_ordinals_per_date():
+    purchase = {
+        "operationDate": datetime(2024, 1, 5),
+        "amount": -500.0,
+        "transactionType": "Покупка",
+        "detail": "ИП Магазин",
+    }
+    later = {**purchase, "operationDate": datetime(2024, 1, 6)}
+    rows = list(transactions.iter_fingerprinted_rows([later, purchase, purchase]))
+    assert [row[-1] for row in rows] == [
+        transactions.fingerprint(*rows[0][:-1]),
+        transactions.fingerprint(*rows[1][:-1]),
+        transactions.fingerprint(*rows[2][:-1], ordinal=1),
+    ]
+
+    with pytest.raises(ValueError, match="not grouped by date"):
+        list(transactions.iter_fingerprinted_rows([purchase, later, purchase]))
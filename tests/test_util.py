@@ -1,6 +1,13 @@
+import itertools
 import os
+import threading
 
-from src.kaspi_parser import util
+import fitz
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from src.kaspi_parser import layouts, util, warmup
+from tests.assets import statements
 
 
 def test_encode_file(capsys, file_path):
@@ -8,3 +15,192 @@ def test_encode_file(capsys, file_path):
     assert os.path.isfile(file_path)
     encoded_file = util.encode_file(file_path=file_path)
     assert encoded_file and isinstance(encoded_file, str)
+
+
+def test_spooled_upload_rolls_over_to_disk(file_path):
+    encoded_file = util.encode_file(file_path=file_path)
+    with open(file_path, "rb") as file:
+        content = file.read()
+    with util.SpooledUpload(max_size=1024) as upload:
+        upload.write_base64(encoded_file, chunk_size=1001)
+        source = upload.as_source()
+        assert "file_path" in source
+        with open(source["file_path"], "rb") as file:
+            assert file.read() == content
+    assert not os.path.exists(source["file_path"])
+
+
+def test_get_header(file_path):
+    bank_statement = util.BankStatement()
+    text = bank_statement.get_text(file_path=file_path)
+    header = bank_statement.get_header(text=text)
+    assert isinstance(header, util.StatementHeader)
+    assert header.full_name
+    assert header.from_date <= header.to_date
+
+
+def test_get_header_not_found():
+    with pytest.raises(ValueError):
+        util.BankStatement().get_header(text="not a bank statement")
+
+
+def test_iter_statements_carries_rows_across_pages():
+    pages = [
+        "Дата Сумма Операция Детали 05.01.24 + 5 000,00 ₸ Пополнение С Kaspi",
+        "06.01.24 - 1 000,00 ₸ Покупка Магазин очень",
+        "длинное описание",
+        "07.01.24 - 2 000,00 ₸ Перевод Айгерим",
+    ]
+    statements = list(util.BankStatement().iter_statements(pages))
+    assert statements == util.BankStatement().get_statements(" ".join(pages))
+    assert statements[1] == [
+        "06.01.24",
+        "- 1 000,00 ₸",
+        "Покупка",
+        "Магазин очень длинное описание",
+    ]
+
+
+def test_merge_page_ranges_matches_sequential_scan():
+    pages = [
+        "Дата Сумма Операция Детали 05.01.24 + 5 000,00 ₸ Пополнение С Kaspi",
+        "06.01.24 - 1 000,00 ₸ Покупка Магазин очень",
+        "длинное",
+        "описание",
+        "07.01.24 - 2 000,00 ₸ Перевод Айгерим",
+        "08.01.24 - 500,00 ₸ Покупка Кафе",
+    ]
+    bank_statement = util.BankStatement()
+    layout = layouts.KASPI_GOLD_RU
+    expected = list(bank_statement.iter_statements(pages, layout=layout))
+    for size in range(1, len(pages) + 1):
+        for cuts in itertools.combinations(range(1, len(pages)), size - 1):
+            bounds = [0, *cuts, len(pages)]
+            ranges = [
+                bank_statement.scan_pages(pages[start:stop], layout)
+                for start, stop in itertools.pairwise(bounds)
+            ]
+            assert list(bank_statement.merge_page_ranges(ranges, layout)) == expected
+
+
+def test_scan_page_range_matches_parse_statement():
+    pdf_bytes = statements.generate_statement(pages=5)
+    bank_statement = util.BankStatement()
+    layout, header = bank_statement.read_header(file_bytes=pdf_bytes)
+    ranges = [
+        bank_statement.scan_page_range(start, stop, layout.name, file_bytes=pdf_bytes)
+        for start, stop in bank_statement.plan_page_ranges(5, workers=3, min_pages=1)
+    ]
+    statement_data = bank_statement.make_result(
+        header, list(bank_statement.merge_page_ranges(ranges, layout))
+    )
+    expected = bank_statement.parse_statement(file_bytes=pdf_bytes)
+    assert statement_data == {
+        **expected,
+        "Details": list(
+            bank_statement.iter_statements(
+                bank_statement.iter_pages(stream=pdf_bytes), layout=layout
+            )
+        ),
+    }
+    assert len(statement_data["Details"]) == len(expected["Details"])
+
+
+def test_insert_record(file_path):
+    statement_data = util.BankStatement().parse_statement(file_path=file_path)
+    record = util.Record()
+    bank_statement_id = record.insert_record(statement_data, chunk_size=7)
+    assert isinstance(bank_statement_id, int)
+    with pytest.raises(IntegrityError):
+        record.insert_record({**statement_data, "FIO": None})
+
+
+def test_get_table_matches_get_details(file_path):
+    bank_statement = util.BankStatement()
+    text = bank_statement.get_text(file_path=file_path)
+    table = bank_statement.get_table(text=text)
+    assert len(table) > 0
+    assert table.to_dicts() == list(bank_statement.get_details(text=text))
+
+
+@pytest.mark.parametrize("language", ["ru", "kz"])
+def test_parse_generated_statement(language):
+    pdf_bytes = statements.generate_statement(pages=3, language=language)
+    statement_data = util.BankStatement().parse_statement(file_bytes=pdf_bytes)
+    details = statement_data["Details"]
+    assert len(details) == 3 * statements.ROWS_PER_PAGE - statements.HEADER_ROWS
+    assert round(sum(detail["amount"] for detail in details), 2) == round(
+        statement_data["cardBalanceDateUntil"] - statement_data["cardBalanceDateFrom"],
+        2,
+    )
+
+
+@pytest.mark.parametrize("language", ["ru", "kz"])
+def test_layout_extraction_matches_text(language):
+    pdf_bytes = statements.generate_statement(pages=3, language=language)
+    bank_statement = util.BankStatement()
+    assert bank_statement.parse_statement(
+        file_bytes=pdf_bytes, extraction="layout"
+    ) == bank_statement.parse_statement(file_bytes=pdf_bytes, extraction="text")
+
+
+def test_layout_extraction_joins_wrapped_details():
+    font = fitz.Font("cjk")
+    columns = (
+        statements.DATE_X,
+        statements.AMOUNT_RIGHT_X - 40,
+        statements.OPERATION_X,
+        statements.DETAILS_X,
+    )
+    rows = [
+        ("Дата", "Сумма", "Операция", "Детали"),
+        ("31.12.24", "+ 500,00 ₸", "Пополнение", "Перевод на карту"),
+        ("", "", "", "Иванову И."),
+        ("15.12.24", "- 100,00 ₸", "Покупка", "Magnum"),
+        ("", "", "", "- Сумма заблокирована. Банк ожидает подтверждения"),
+        ("", "", "", "от платежной системы."),
+        ("АО «Kaspi Bank», БИК CASPKZKA, www.kaspi.kz", "", "", ""),
+    ]
+    with fitz.open() as pdf:
+        page = pdf.new_page()
+        writer = fitz.TextWriter(page.rect)
+        for offset, line in enumerate(warmup.SAMPLE_LINES[:10]):
+            writer.append((statements.DATE_X, 40 + offset * 16), line, font=font)
+        for offset, row in enumerate(rows):
+            for x, text in zip(columns, row):
+                if text:
+                    writer.append((x, 200 + offset * 16), text, font=font, fontsize=8)
+        writer.write_text(page)
+        pdf_bytes = pdf.tobytes()
+
+    statement_data = util.BankStatement().parse_statement(
+        file_bytes=pdf_bytes, extraction="layout"
+    )
+    assert [detail["detail"] for detail in statement_data["Details"]] == [
+        "Перевод на карту Иванову И.",
+        "Magnum",
+    ]
+    assert statement_data["cardBalanceDateUntil"] == 1400.0
+
+
+def test_batch_channel():
+    def read_details(statement_data):
+        return list(statement_data["Details"])
+
+    results = []
+    channel = util.BatchChannel(max_batches=1)
+    consumer = threading.Thread(
+        target=lambda: results.append(channel.consume(read_details, {}))
+    )
+    consumer.start()
+    channel.put([1, 2])
+    channel.put([3])
+    channel.close()
+    consumer.join()
+    assert results == [[1, 2, 3]]
+
+    channel = util.BatchChannel()
+    channel.put([1])
+    channel.abort(ValueError("stream ended"))
+    with pytest.raises(ValueError):
+        channel.consume(read_details, {})
@@ -0,0 +1,8 @@
+from src.kaspi_parser import metrics, warmup
+
+
+def test_warm_up():
+    histogram = metrics.HISTOGRAMS["kaspi_parser_statement_transactions"]
+    count = sum(series[2] for series in histogram.series.values())
+    assert warmup.warm_up() == 2
+    assert sum(series[2] for series in histogram.series.values()) == count
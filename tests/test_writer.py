@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from src.kaspi_parser import writer
+
+
+class FakeRecord:
+    def __init__(self):
+        self.batches = []
+
+    def insert_records(self, statements):
+        if any(statement.get("invalid") for statement in statements):
+            raise ValueError("Invalid statement")
+        self.batches.append(list(statements))
+
+    def insert_record(self, statement_data):
+        self.insert_records([statement_data])
+
+
+def test_write_behind_queue_batches_and_drains():
+    record = FakeRecord()
+    write_queue = writer.WriteBehindQueue(
+        record=record, max_size=10, batch_size=3, flush_interval=60, put_timeout=1
+    )
+
+    async def main():
+        write_queue.start()
+        for index in range(7):
+            await write_queue.put({"id": index})
+        await write_queue.stop()
+
+    asyncio.run(main())
+    assert [len(batch) for batch in record.batches] == [3, 3, 1]
+
+
+def test_write_behind_queue_backpressure():
+    write_queue = writer.WriteBehindQueue(
+        record=FakeRecord(),
+        max_size=1,
+        batch_size=1,
+        flush_interval=0,
+        put_timeout=0.01,
+    )
+
+    async def main():
+        write_queue.start()
+        write_queue.task.cancel()
+        await write_queue.put({"id": 0})
+        try:
+            await write_queue.put({"id": 1})
+        except writer.QueueFullError:
+            return True
+        return False
+
+    assert asyncio.run(main()) is True
+
+
+def test_write_behind_queue_retries_failed_batch(tmp_path):
+    record = FakeRecord()
+    dead_letter_path = tmp_path / "dead_letter.jsonl"
+    write_queue = writer.WriteBehindQueue(
+        record=record,
+        max_size=10,
+        batch_size=3,
+        flush_interval=60,
+        put_timeout=1,
+        dead_letter_path=str(dead_letter_path),
+    )
+
+    async def main():
+        write_queue.start()
+        for index in range(3):
+            await write_queue.put({"id": index, "invalid": index == 1})
+        await write_queue.stop()
+
+    asyncio.run(main())
+    assert record.batches == [
+        [{"id": 0, "invalid": False}],
+        [{"id": 2, "invalid": False}],
+    ]
+    assert write_queue.stats == {"written": 2, "failed": 1}
+    with open(dead_letter_path, encoding="utf-8") as file:
+        assert [json.loads(line) for line in file] == [{"id": 1, "invalid": True}]